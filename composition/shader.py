@@ -1,7 +1,12 @@
-import re
 import os
+import sys
 import os.path
 
+# Declarations are parsed by the gloo GLSL parser (cached)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'nr_gloo', 'gloo'))
+import glsl
+
 
 
 # --------------------------------------------------- ShaderException class ---
@@ -30,84 +35,30 @@ class Shader(object):
         Try to parse shader source into known entities
         """
 
-        code = self._source
-        code = self.get_uniforms(code)
-        code = self.get_attributes(code)
-        code = self.get_varyings(code)
-        code = self.get_functions(code)
-        code = '\n'.join([line for line in code.splitlines() if line.strip()])
-        self._unknown = code
-        
-
-    # ---------------------------------
-    def get_uniforms(self, code):
-        """
-        Extract uniforms (name and type)
-        """
-
-        self._uniforms = []
-        regex = re.compile('\s*uniform\s+(?P<type>\w+)\s+(?P<name>\w+)\s*;')
-        m = re.search(regex,code)
-        while m:
-            self._uniforms.append((m.group('name'), m.group('type')))
-            code = code[:m.start()] + code[m.end():]
-            m = re.search(regex,code)
-        return code
-
-    # ---------------------------------
-    def get_attributes(self, code):
-        """
-        Extract attributes (name and type)
-        """
-
-        self._attributes = []
-        regex = re.compile('\s*attribute\s+(?P<type>\w+)\s+(?P<name>\w+)\s*;')
-        m = re.search(regex,code)
-        while m:
-            self._attributes.append((m.group('name'), m.group('type')))
-            code = code[:m.start()] + code[m.end():]
-            m = re.search(regex,code)
-        return code
-
-
-    # ---------------------------------
-    def get_varyings(self, code):
-        """
-        Extract varyings  (name and type)
-        """
-
-        self._varyings = []
-        regex = re.compile('\s*varying\s+(?P<type>\w+)\s+(?P<name>\w+)\s*;')
-        m = re.search(regex,code)
-        while m:
-            self._varyings.append((m.group('name'), m.group('type')))
-            code = code[:m.start()] + code[m.end():]
-            m = re.search(regex,code)
-        return code
-
-
-    # ---------------------------------
-    def get_functions(self, code):
-        """
-        Extract functions (name, return type, args and code)
-        """
+        declarations = glsl.parse(self._source)
+        def variables(key):
+            return [(name if size is None else '%s[%d]' % (name,size), vtype)
+                    for (name,vtype,size) in declarations[key]]
+        self._uniforms = variables('uniforms')
+        self._attributes = variables('attributes')
+        self._varyings = variables('varyings')
 
         self._functions = []
-        regex = re.compile("""(?P<rtype>\w+)\s+"""
-                           """(?P<name>\w+)\s*"""
-                           """\((?P<args>.*?)\)\s*"""
-                           """\{(?P<code>.*?)\}""", re.DOTALL)
-        m = re.search(regex,code)
-        while m:
-            if m.group('name') == 'main':
-                self._main = m.group('code')
+        self._main = ""
+        for (rtype,name,args,code) in declarations['functions']:
+            if name == 'main':
+                self._main = code
             else:
-                self._functions.append( (m.group('name'), m.group('rtype'),
-                                         m.group('args'), m.group('code')) )
-            code = code[:m.start()] + code[m.end():]
-            m = re.search(regex,code)
+                self._functions.append( (name,rtype,args,code) )
 
-        return code
+        # Unknown code is what remains once declarations and functions removed
+        code, start = "", 0
+        for (begin,end) in sorted(declarations['spans']):
+            code += self._source[start:begin]
+            start = end
+        code += self._source[start:]
+        code = '\n'.join([line for line in code.splitlines() if line.strip()])
+        self._unknown = code
  
 
     # ---------------------------------
@@ -8,6 +8,8 @@ class DashAtlas(object):
         self._data      = np.zeros(shape, dtype=np.float32)
         self._index      = 0
         self._atlas      = {}
+        self._rows       = {}
+        self._free       = []
 
         self['solid']                 = (1e20,0),      (1,1)
         self['densely dotted']        = (0,1),         (1,1)
@@ -30,12 +32,31 @@ class DashAtlas(object):
 
     def __setitem__(self, key, value):
         data, period = self.make_pattern( value[0], value[1] )
-        self._data[self._index] = data
-        self._atlas[key] = [self._index/float(self._data.shape[0]), period]
-        self._index += 1
+        index = self._row(key)
+        self._data[index] = data
+        self._atlas[key] = [index/float(self._data.shape[0]), period]
         self._dirty = True
         #self.add_pattern(value)
 
+    def __delitem__(self, key):
+        """ Remove a pattern (its row can be reused) """
+        del self._atlas[key]
+        self._free.append(self._rows.pop(key))
+
+    def _row(self, key):
+        """ Row of a pattern (existing, freed or next unused row) """
+        if key in self._rows:
+            return self._rows[key]
+        if self._free:
+            index = self._free.pop()
+        elif self._index < self._data.shape[0]:
+            index = self._index
+            self._index += 1
+        else:
+            raise ValueError("Dash atlas is full")
+        self._rows[key] = index
+        return index
+
     def make_pattern(self, pattern, caps=[1,1]):
         """ """
 
@@ -81,7 +81,7 @@ class ArrayList(object):
             self._size = self._data.size
 
             # Default is one group with all data inside
-            _itemsize = np.ones(1) * self._data.size
+            _itemsize = np.ones(1, dtype=int) * self._data.size
 
             # Check item sizes and get items count
             if itemsize is not None:
@@ -255,12 +255,12 @@ class ArrayList(object):
         self._size -= dstop - dstart
 
         # Remove corresponding items
-        size = self._count - istop
-        self._items[istart:istart + size] = self._items[istop:istop + size]
+        count = self._count - istop
+        self._items[istart:istart + count] = self._items[istop:istop + count]
 
         # Update other items
         size = dstop - dstart
-        self._items[istart:istop + size + 1] -= size, size
+        self._items[istart:istart + count] -= size
         self._count -= istop - istart
 
     def insert(self, index, data, itemsize=None):
@@ -394,3 +394,146 @@ class ArrayList(object):
         """
 
         self.insert(len(self), data, itemsize)
+
+    def delete_many(self, keys):
+        """ Delete several (scattered) items at once
+
+        Items are removed using a single pass over data and items located
+        after the first deleted item (instead of one pass per item).
+
+        Parameters
+        ----------
+
+        keys : int or 1-D array
+            Indices of items to be deleted (in any order, duplicates are
+            ignored).
+        """
+
+        if not self._sizeable:
+            raise AttributeError("List is not sizeable")
+
+        keys = np.array(keys, dtype=int).ravel()
+        keys[keys < 0] += len(self)
+        if len(keys) and (keys.min() < 0 or keys.max() >= len(self)):
+            raise IndexError("List deletion index out of range")
+        keys = np.unique(keys)
+        if not len(keys):
+            return
+
+        # Items after the first deleted one (others are left untouched)
+        first = keys[0]
+        items = self._items[first:self._count]
+        sizes = items[:, 1] - items[:, 0]
+        keep = np.ones(len(items), dtype=bool)
+        keep[keys - first] = False
+
+        # Compact data
+        dstart = items[0, 0]
+        data = self._data[dstart:self._size][np.repeat(keep, sizes)]
+        self._data[dstart:dstart + len(data)] = data
+        self._size = dstart + len(data)
+
+        # Compact items
+        sizes = sizes[keep]
+        self._count = first + len(sizes)
+        stops = dstart + sizes.cumsum()
+        self._items[first:self._count, 0] = stops - sizes
+        self._items[first:self._count, 1] = stops
+
+    def insert_many(self, keys, data, itemsize=None):
+        """ Insert several items at once, each one before the given index
+
+        Items are inserted using a single pass over data and items located
+        after the first insertion index (instead of one pass per item).
+        Indices refer to the list before insertion and items inserted at
+        the same index are kept in the given order.
+
+        Parameters
+        ----------
+
+        keys : 1-D array
+            Indices before which items will be inserted (one per item).
+
+        data : array_like
+            An array, any object exposing the array interface, an object
+            whose __array__ method returns an array, or any (nested) sequence.
+
+        itemsize:  int or 1-D array
+            If `itemsize is an integer, N, the array will be divided
+            into elements of size N. If such partition is not possible,
+            an error is raised.
+
+            If `itemsize` is 1-D array, the array will be divided into
+            elements whose succesive sizes will be picked from itemsize.
+            If the sum of itemsize values is different from array size,
+            an error is raised.
+
+            If `itemsize` is None, data is divided into as many elements of
+            same size as there are keys.
+        """
+
+        if not self._sizeable:
+            raise AttributeError("List is not sizeable")
+
+        keys = np.array(keys, dtype=int).ravel()
+        keys[keys < 0] += len(self)
+        if len(keys) and (keys.min() < 0 or keys.max() > len(self)):
+            raise IndexError("List insertion index out of range")
+        if not len(keys):
+            return
+
+        if type(data) in [list, tuple] and type(data[0]) in [list, tuple]:
+            itemsize = [len(l) for l in data]
+            data = [item for sublist in data for item in sublist]
+
+        data = np.array(data, copy=False, dtype=self._data.dtype).ravel()
+        size = data.size
+
+        # Check item sizes
+        if itemsize is None:
+            itemsize = size // len(keys)
+        if type(itemsize) is int:
+            if size != itemsize * len(keys):
+                raise ValueError("Cannot partition data as requested")
+            _itemsize = np.ones(len(keys), dtype=int) * itemsize
+        else:
+            _itemsize = np.array(itemsize, dtype=int).ravel()
+            if len(_itemsize) != len(keys) or _itemsize.sum() != size:
+                raise ValueError("Cannot partition data as requested")
+
+        # Check if data array is big enough and resize it if necessary
+        if self._size + size >= self._data.size:
+            capacity = int(2 ** np.ceil(np.log2(self._size + size)))
+            self._data = np.resize(self._data, capacity)
+
+        # Check if item array is big enough and resize it if necessary
+        if self._count + len(keys) >= len(self._items):
+            capacity = int(2 ** np.ceil(np.log2(self._count + len(keys))))
+            self._items = np.resize(self._items, (capacity, 2))
+
+        # Items after the first insertion index (others are left untouched)
+        first = keys.min()
+        items = self._items[first:self._count]
+        dstart = items[0, 0] if len(items) else self._size
+
+        # Final order of (old, new) items: an item inserted at index i comes
+        # before old item i and after items inserted before at same index
+        rank = np.concatenate((2 * np.arange(len(items)) + 1,
+                               2 * (keys - first)))
+        order = np.argsort(rank, kind='mergesort')
+
+        # Gather old and new data in final order
+        source = np.concatenate((self._data[dstart:self._size], data))
+        starts = np.concatenate((items[:, 0] - dstart, self._size - dstart +
+                                 _itemsize.cumsum() - _itemsize))[order]
+        sizes = np.concatenate((items[:, 1] - items[:, 0], _itemsize))[order]
+        stops = sizes.cumsum()
+        gather = np.repeat(starts - stops + sizes, sizes)
+        gather += np.arange(len(source))
+        self._data[dstart:dstart + len(source)] = source[gather]
+        self._size += size
+
+        # Store items
+        self._count += len(keys)
+        self._items[first:self._count, 0] = dstart + stops - sizes
+        self._items[first:self._count, 1] = dstart + stops
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Benchmark of random insertions and deletions in ArrayList (contiguous
+storage) and ChunkedArrayList (chunked storage).
+
+A list of float32 items (4 elements each) is edited at random positions (one
+item inserted or deleted per operation). We report the time per operation and
+the time to get contiguous data (for upload) after a batch of edits. The
+same edits are then made at once using insert_many/delete_many.
+
+Usage: bench_array_list.py [elements] [operations]
+"""
+import sys
+import time
+import numpy as np
+from array_list import ArrayList
+from chunked_array_list import ChunkedArrayList
+
+
+def build(cls, count):
+    """ List of count items of 4 elements """
+
+    L = cls(dtype=np.float32)
+    L.append(np.zeros(4*count, np.float32), 4)
+    return L
+
+
+def run(name, L, operations):
+    """ Random insertions/deletions then contiguous data """
+
+    np.random.seed(1)
+    item = np.ones(4, np.float32)
+    keys = np.random.randint(0, len(L)-operations, operations)
+    t0 = time.time()
+    for key in keys[:operations//2]:
+        L.insert(int(key), item)
+    t1 = time.time()
+    for key in keys[operations//2:]:
+        del L[int(key)]
+    t2 = time.time()
+    L.data.sum()
+    t3 = time.time()
+    n = operations//2
+    print("%-18s insert %10.1f us/op   delete %10.1f us/op   data %8.2f ms"
+          % (name, 1e6*(t1-t0)/n, 1e6*(t2-t1)/n, 1e3*(t3-t2)))
+
+
+def run_many(name, L, operations):
+    """ Random insertions/deletions made in a single batch each """
+
+    np.random.seed(1)
+    items = np.ones(4*(operations//2), np.float32)
+    keys = np.random.randint(0, len(L)-operations, operations)
+    t0 = time.time()
+    L.insert_many(keys[:operations//2], items, 4)
+    t1 = time.time()
+    L.delete_many(keys[operations//2:])
+    t2 = time.time()
+    n = operations//2
+    print("%-18s insert %10.1f us/op   delete %10.1f us/op"
+          % (name, 1e6*(t1-t0)/n, 1e6*(t2-t1)/n))
+
+
+if __name__ == '__main__':
+    elements = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10000000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    count = elements // 4
+    print("%d items (%d elements, %.1f MB)"
+          % (count, elements, elements*4/1024.0**2))
+    run("ArrayList", build(ArrayList, count), operations)
+    run("ChunkedArrayList", build(ChunkedArrayList, count), operations)
+    run_many("ArrayList (many)", build(ArrayList, count), operations)
+    run_many("Chunked (many)", build(ChunkedArrayList, count), operations)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Benchmark of random insertions and deletions in a Collection of quads.
+
+Quads (4 vertices, 6 indices) are inserted or deleted at random positions
+(one per operation). We report the time per operation and the time to get
+up to date indices (for upload) after a batch of edits.
+
+The same edits are made on a collection in 'slots' mode (deleted slots are
+recycled) where we report the number of changed slots to be uploaded.
+
+Finally, a GPU collection is drawn (null GL backend) after editing uniforms
+of a few items (packed mode) or replacing a few items (slots mode) and we
+report the time and the number of bytes uploaded per frame.
+
+Usage: bench_collection.py [items] [operations]
+"""
+import os
+import sys
+import time
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'nr_gloo'))
+from gloo import backend, Program
+from collection import Collection, SlotCollection
+from gpu_collection import GPUCollection
+
+
+vtype = [('position', 'f4', 2)]
+utype = [('color',    'f4', 4)]
+indices = np.array([0, 1, 2, 0, 2, 3], np.uint32)
+
+
+def build(count):
+    """ Collection of count quads """
+
+    C = Collection(vtype, utype)
+    C.insert_many(np.zeros(count, int), np.zeros(4*count, vtype),
+                  np.resize(indices, 6*count), itemsize=(4, 6))
+    C.indices
+    return C
+
+
+def run(C, operations):
+    """ Random insertions/deletions then up to date indices """
+
+    np.random.seed(1)
+    vertices = np.zeros(4, vtype)
+    keys = np.random.randint(0, len(C)-operations, operations)
+    t0 = time.time()
+    for key in keys[:operations//2]:
+        C.insert(int(key), vertices, indices)
+    t1 = time.time()
+    for key in keys[operations//2:]:
+        del C[int(key)]
+    t2 = time.time()
+    C.indices.data.sum()
+    t3 = time.time()
+    n = operations//2
+    print("insert %10.1f us/op   delete %10.1f us/op   indices %8.2f ms"
+          % (1e6*(t1-t0)/n, 1e6*(t2-t1)/n, 1e3*(t3-t2)))
+
+
+def run_slots(count, operations):
+    """ Random deletions/appends in slots mode then changed slots """
+
+    C = SlotCollection(vtype, utype, slotsize=(4, 6))
+    C.append(np.zeros(4*count, vtype), indices, itemsize=4)
+    C.changes()
+
+    np.random.seed(1)
+    vertices = np.zeros(4, vtype)
+    keys = np.random.choice(count, operations//2, replace=False)
+    t0 = time.time()
+    for key in keys:
+        del C[int(key)]
+    t1 = time.time()
+    for key in keys:
+        C.append(vertices, indices)
+    t2 = time.time()
+    changes = C.changes()
+    t3 = time.time()
+    n = operations//2
+    print("slots: append %4.1f us/op   delete %4.1f us/op   changes %8.2f ms"
+          "   (%d slots changed)" % (1e6*(t2-t1)/n, 1e6*(t1-t0)/n,
+          1e3*(t3-t2), sum(stop-start for start, stop in changes)))
+
+
+def run_gpu(name, C, frames, edits):
+    """ Frames of a few edits followed by a draw """
+
+    vertex = """
+    uniform sampler2D u_uniforms;
+    attribute vec2 position;
+    attribute float a_index;
+    void main() { gl_Position = vec4(position, a_index, 1.0); }
+    """
+    fragment = "void main() { gl_FragColor = vec4(1.0); }"
+
+    G = backend.NullGL()
+    previous = backend.use(G)
+    try:
+        program = Program(vertex, fragment)
+        collection = GPUCollection(C)
+        collection.draw(program)
+        np.random.seed(1)
+        vertices = np.zeros(4, vtype)
+        G.reset()
+        for i in range(frames):
+            keys = np.random.randint(0, C.slots if name == "slots" else len(C),
+                                     edits)
+            with G.frame():
+                if name == "slots":
+                    C.delete_many(keys)
+                    for key in keys:
+                        C.append(vertices, indices)
+                else:
+                    for key in keys:
+                        C[int(key)]["color"] = i
+                collection.draw(program)
+    finally:
+        backend.use(previous)
+    times = sorted([f["time"] for f in G.frames])
+    nbytes = sum([f["bytes"] for f in G.frames]) / float(frames)
+    print("gpu %-6s %8.2f ms/frame %10.1f KB/frame (%d edits)"
+          % (name, 1e3*times[len(times)//2], nbytes/1024.0, edits))
+
+
+if __name__ == '__main__':
+    count = int(float(sys.argv[1])) if len(sys.argv) > 1 else 250000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print("%d quads (%d vertices, %d indices)" % (count, 4*count, 6*count))
+    run(build(count), operations)
+    run_slots(count, operations)
+
+    C = build(count)
+    run_gpu("packed", C, 10, operations//2)
+    C = SlotCollection(vtype, utype, slotsize=(4, 6))
+    C.append(np.zeros(4*count, vtype), indices, itemsize=4)
+    run_gpu("slots", C, 10, operations//2)
@@ -0,0 +1,665 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+A ChunkedArrayList is an ArrayList whose items are stored in chunks (of about
+`chunksize` items each) such that inserting or deleting an item only moves
+the data of one chunk instead of the whole tail of the list.
+
+Chunks are located using two Fenwick trees (item counts and data sizes per
+chunk) giving the chunk holding an item and its data offset in O(log n).
+Contiguous data (e.g. for upload) is materialized by `compact()` which
+concatenates chunks once and makes them views on the resulting array, such
+that it is only done again after insertions or deletions.
+
+A ChunkedArrayList has the same API as ArrayList (it can be used in place of
+it) except that a slice spanning several chunks is a copy (the concatenation
+of the spanned chunks) instead of a view: use `compact()` to get a view.
+
+Example
+-------
+
+>>> L = ChunkedArrayList(np.arange(10), [3,3,4], chunksize=2)
+>>> print L
+[ [0 1 2] [3 4 5] [6 7 8 9] ]
+>>> L.insert(1, [-1,-1])
+>>> print L.compact()
+[ 0  1  2 -1 -1  3  4  5  6  7  8  9]
+"""
+import numpy as np
+
+
+class FenwickTree(object):
+    """
+    A Fenwick tree (binary indexed tree) holds integer values and gives
+    prefix sums, updates and searches in O(log n).
+    """
+
+    def __init__(self, values=()):
+        """ Build the tree from given values (in O(n)) """
+
+        n = len(values)
+        tree = [0] + [int(value) for value in values]
+        for i in range(1, n+1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+        self._n = n
+        self._step = 1 << (n.bit_length()-1) if n else 0
+
+
+    def __len__(self):
+        return self._n
+
+
+    def add(self, index, delta):
+        """ Add delta to value at index """
+
+        tree, n = self._tree, self._n
+        index += 1
+        while index <= n:
+            tree[index] += delta
+            index += index & -index
+
+
+    def prefix(self, index):
+        """ Sum of values before index """
+
+        tree, total = self._tree, 0
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+
+    def search(self, value):
+        """
+        Index of the value holding the given position (0 <= value < sum of
+        values) and the position within this value.
+        """
+
+        tree, n = self._tree, self._n
+        index, step = 0, self._step
+        while step:
+            if index + step <= n and tree[index+step] <= value:
+                index += step
+                value -= tree[index]
+            step >>= 1
+        return index, value
+
+
+
+class ChunkedArrayList(object):
+    """
+    A ChunkedArrayList is a strongly typed list whose type can be anything
+    that can be interpreted as a numpy data type and whose items are stored
+    in chunks.
+    """
+
+    def __init__(self, data=None, itemsize=None, dtype=float,
+                 sizeable=True, writeable=True, chunksize=1024):
+        """ Create a new list using given data and sizes or dtype
+
+        Parameters
+        ----------
+
+        data : array_like
+            An array, any object exposing the array interface, an object
+            whose __array__ method returns an array, or any (nested) sequence.
+
+        itemsize:  int or 1-D array
+            If `itemsize is an integer, N, the array will be divided
+            into elements of size N. If such partition is not possible,
+            an error is raised.
+
+            If `itemsize` is 1-D array, the array will be divided into
+            elements whose succesive sizes will be picked from itemsize.
+            If the sum of itemsize values is different from array size,
+            an error is raised.
+
+        dtype: np.dtype
+            Any object that can be interpreted as a numpy data type.
+
+        sizeable : boolean
+            Indicate whether item can be appended/inserted/deleted
+
+        writeable : boolean
+            Indicate whether content can be changed
+
+        chunksize : int
+            Number of items per chunk (chunks are split when they reach twice
+            this size)
+        """
+
+        self._sizeable = sizeable
+        self._writeable = writeable
+        self._chunksize = max(1, int(chunksize))
+        self._chunks = []
+        self._count = 0
+        self._size = 0
+        self._flat = None
+
+        if data is not None:
+            if type(data) in [list, tuple]:
+                if len(data) and type(data[0]) in [list, tuple]:
+                    itemsize = [len(l) for l in data]
+                    data = [item for sublist in data for item in sublist]
+            data = np.array(data, copy=False)
+            self._dtype = data.dtype
+            if itemsize is None:
+                itemsize = data.size
+            data, sizes = self._partition(data, itemsize)
+            self._chunks = self._split(data, sizes)
+            self._count = len(sizes)
+            self._size = data.size
+        else:
+            self._dtype = np.dtype(dtype)
+        self._build()
+
+
+    @property
+    def data(self):
+        """ The array's elements, in memory (contiguous, see compact). """
+        return self.compact()
+
+    @property
+    def size(self):
+        """ Number of base elements, in memory. """
+        return self._size
+
+    @property
+    def itemsize(self):
+        """ Individual item sizes """
+        if not self._chunks:
+            return np.zeros(0, int)
+        return np.concatenate([chunk[1] for chunk in self._chunks])
+
+    @property
+    def dtype(self):
+        """ Describes the format of the elements in the buffer. """
+        return self._dtype
+
+    def __len__(self):
+        """ x.__len__() <==> len(x) """
+        return self._count
+
+    def __str__(self):
+        s = '[ '
+        for item in self:
+            s += str(item) + ' '
+        s += ']'
+        return s
+
+
+    # --- Chunks --------------------------------------------------------------
+    def _partition(self, data, itemsize):
+        """ Data (raveled, list dtype) and item sizes """
+
+        data = np.asarray(data, dtype=self._dtype).ravel()
+        size = data.size
+        if isinstance(itemsize, (int, np.integer)):
+            if itemsize <= 0 or (size % itemsize) != 0:
+                raise ValueError("Cannot partition data as requested")
+            sizes = np.ones(size // itemsize, dtype=int) * itemsize
+        else:
+            sizes = np.array(itemsize, dtype=int).ravel()
+            if sizes.sum() != size:
+                raise ValueError("Cannot partition data as requested")
+        return data, sizes
+
+
+    def _split(self, data, sizes):
+        """ Chunks of (about) chunksize items from data and item sizes """
+
+        chunks, n = [], self._chunksize
+        stops = sizes.cumsum()
+        start = 0
+        for i in range(0, len(sizes), n):
+            stop = stops[min(i+n, len(sizes))-1]
+            chunks.append([data[start:stop], sizes[i:i+n], None])
+            start = stop
+        return chunks
+
+
+    def _build(self):
+        """ Build chunk trees (item counts and data sizes) """
+
+        self._counts = FenwickTree([len(chunk[1]) for chunk in self._chunks])
+        self._sizes = FenwickTree([len(chunk[0]) for chunk in self._chunks])
+
+
+    def _starts(self, chunk):
+        """ Data offsets of chunk items (within chunk) """
+
+        if chunk[2] is None:
+            starts = np.zeros(len(chunk[1])+1, dtype=int)
+            np.cumsum(chunk[1], out=starts[1:])
+            chunk[2] = starts
+        return chunk[2]
+
+
+    def _locate(self, key):
+        """ Chunk index and item index in chunk of given item """
+
+        return self._counts.search(key)
+
+
+    def _offset(self, key):
+        """ Data offset of given item (size for key = len(self)) """
+
+        if key >= self._count:
+            return self._size
+        c, j = self._locate(key)
+        return self._sizes.prefix(c) + self._starts(self._chunks[c])[j]
+
+
+    def _pieces(self, istart, istop):
+        """ Data of items in [istart,istop) as a list of views on chunks """
+
+        pieces = []
+        c, j = self._locate(istart)
+        count = istop - istart
+        while count:
+            chunk = self._chunks[c]
+            k = min(len(chunk[1]) - j, count)
+            starts = self._starts(chunk)
+            pieces.append(chunk[0][starts[j]:starts[j+k]])
+            count -= k
+            c, j = c + 1, 0
+        return pieces
+
+
+    def compact(self):
+        """
+        Contiguous array of all elements. Chunks are concatenated (and
+        rebalanced) only if items have been inserted or deleted since last
+        time, chunks (and items) becoming views on the returned array.
+        """
+
+        if self._flat is None:
+            if self._chunks:
+                data = np.concatenate([chunk[0] for chunk in self._chunks])
+                self._chunks = self._split(data, self.itemsize)
+            else:
+                data = np.zeros(0, dtype=self._dtype)
+            self._build()
+            self._flat = data
+        return self._flat
+
+
+    # --- Access --------------------------------------------------------------
+    def __getitem__(self, key):
+        """ x.__getitem__(y) <==> x[y] """
+
+        if type(key) is int:
+            if key < 0:
+                key += len(self)
+            if key < 0 or key >= len(self):
+                raise IndexError("Tuple index out of range")
+            c, j = self._locate(key)
+            chunk = self._chunks[c]
+            starts = self._starts(chunk)
+            return chunk[0][starts[j]:starts[j+1]]
+
+        elif type(key) is slice:
+            istart, istop, step = key.indices(len(self))
+            if istart > istop:
+                istart, istop = istop, istart
+            if istart == istop:
+                return self.compact()[:0]
+            # Items within a single chunk are a view on it
+            pieces = self._pieces(istart, istop)
+            if len(pieces) == 1:
+                return pieces[0]
+            return np.concatenate(pieces)
+
+        elif isinstance(key, str):
+            return self.compact()[key]
+
+        elif key is Ellipsis:
+            return self.data
+
+        else:
+            raise TypeError("List indices must be integers")
+
+
+    def __setitem__(self, key, data):
+        """ x.__setitem__(i, y) <==> x[i]=y """
+
+        if not self._writeable:
+            raise AttributeError("List is not writeable")
+
+        if type(key) is int:
+            self[key][...] = data
+        elif type(key) is slice:
+            istart, istop, step = key.indices(len(self))
+            if istart > istop:
+                istart, istop = istop, istart
+            if istart == istop:
+                return
+            pieces = self._pieces(istart, istop)
+            data = np.asarray(data)
+            if data.ndim and len(data) == sum([len(p) for p in pieces]):
+                offset = 0
+                for piece in pieces:
+                    piece[...] = data[offset:offset+len(piece)]
+                    offset += len(piece)
+            else:
+                for piece in pieces:
+                    piece[...] = data
+        elif key is Ellipsis:
+            self.data[...] = data
+        elif type(key) is str:
+            self.compact()[key] = data
+        else:
+            raise TypeError("List assignment indices must be integers")
+
+
+    # --- Edition -------------------------------------------------------------
+    def __delitem__(self, key):
+        """ x.__delitem__(y) <==> del x[y] """
+
+        if not self._sizeable:
+            raise AttributeError("List is not sizeable")
+
+        if type(key) is int:
+            if key < 0:
+                key += len(self)
+            if key < 0 or key >= len(self):
+                raise IndexError("List deletion index out of range")
+            istart, istop = key, key + 1
+        elif type(key) is slice:
+            istart, istop, step = key.indices(len(self))
+            if istart > istop:
+                istart, istop = istop, istart
+        elif key is Ellipsis:
+            istart, istop = 0, len(self)
+        else:
+            raise TypeError("List deletion indices must be integers")
+        if istart == istop:
+            return
+
+        c, j = self._locate(istart)
+        count = istop - istart
+        removed = False
+        while count:
+            chunk = self._chunks[c]
+            k = min(len(chunk[1]) - j, count)
+            starts = self._starts(chunk)
+            dstart, dstop = starts[j], starts[j+k]
+            if k == len(chunk[1]):
+                self._chunks[c] = None
+                removed = True
+            else:
+                data = chunk[0]
+                chunk[0] = np.concatenate((data[:dstart], data[dstop:]))
+                chunk[1] = np.concatenate((chunk[1][:j], chunk[1][j+k:]))
+                chunk[2] = None
+                self._counts.add(c, -k)
+                self._sizes.add(c, dstart - dstop)
+            self._count -= k
+            self._size -= dstop - dstart
+            count -= k
+            c, j = c + 1, 0
+
+        if removed:
+            self._chunks = [chunk for chunk in self._chunks if chunk is not None]
+            self._build()
+        self._flat = None
+
+
+    def insert(self, index, data, itemsize=None):
+        """ Insert data before index
+
+        Parameters
+        ----------
+
+        index : int
+            Index before which data will be inserted.
+
+        data : array_like
+            An array, any object exposing the array interface, an object
+            whose __array__ method returns an array, or any (nested) sequence.
+
+        itemsize:  int or 1-D array
+            If `itemsize is an integer, N, the array will be divided
+            into elements of size N. If such partition is not possible,
+            an error is raised.
+
+            If `itemsize` is 1-D array, the array will be divided into
+            elements whose succesive sizes will be picked from itemsize.
+            If the sum of itemsize values is different from array size,
+            an error is raised.
+        """
+
+        if not self._sizeable:
+            raise AttributeError("List is not sizeable")
+
+        if type(data) in [list, tuple] and len(data) \
+           and type(data[0]) in [list, tuple]:
+            itemsize = [len(l) for l in data]
+            data = [item for sublist in data for item in sublist]
+        data = np.asarray(data, dtype=self._dtype).ravel()
+        if itemsize is None:
+            itemsize = data.size
+        data, sizes = self._partition(data, itemsize)
+
+        # Check index
+        if index < 0:
+            index += len(self)
+        if index < 0 or index > len(self):
+            raise IndexError("List insertion index out of range")
+
+        # Empty list
+        if not self._chunks:
+            self._chunks = self._split(data, sizes)
+            self._count, self._size = len(sizes), data.size
+            self._build()
+            self._flat = None
+            return
+
+        # Inserting (or appending to last chunk)
+        if index < self._count:
+            c, j = self._locate(index)
+        else:
+            c = len(self._chunks) - 1
+            j = len(self._chunks[c][1])
+        chunk = self._chunks[c]
+        at = self._starts(chunk)[j]
+        chunk_data = np.concatenate((chunk[0][:at], data, chunk[0][at:]))
+        chunk_sizes = np.concatenate((chunk[1][:j], sizes, chunk[1][j:]))
+        self._count += len(sizes)
+        self._size += data.size
+        self._flat = None
+
+        # Split chunk if too big
+        if len(chunk_sizes) >= 2*self._chunksize:
+            self._chunks[c:c+1] = self._split(chunk_data, chunk_sizes)
+            self._build()
+        else:
+            self._chunks[c] = [chunk_data, chunk_sizes, None]
+            self._counts.add(c, len(sizes))
+            self._sizes.add(c, data.size)
+
+
+    def append(self, data, itemsize=None):
+        """
+        Append data to the end.
+
+        Parameters
+        ----------
+
+        data : array_like
+            An array, any object exposing the array interface, an object
+            whose __array__ method returns an array, or any (nested) sequence.
+
+        itemsize:  int or 1-D array
+            If `itemsize is an integer, N, the array will be divided
+            into elements of size N. If such partition is not possible,
+            an error is raised.
+
+            If `itemsize` is 1-D array, the array will be divided into
+            elements whose succesive sizes will be picked from itemsize.
+            If the sum of itemsize values is different from array size,
+            an error is raised.
+        """
+
+        self.insert(len(self), data, itemsize)
+
+
+    def delete_many(self, keys):
+        """ Delete several (scattered) items at once
+
+        Only the chunks holding deleted items are modified (each one once).
+
+        Parameters
+        ----------
+
+        keys : int or 1-D array
+            Indices of items to be deleted (in any order, duplicates are
+            ignored).
+        """
+
+        if not self._sizeable:
+            raise AttributeError("List is not sizeable")
+
+        keys = np.array(keys, dtype=int).ravel()
+        keys[keys < 0] += len(self)
+        if len(keys) and (keys.min() < 0 or keys.max() >= len(self)):
+            raise IndexError("List deletion index out of range")
+        keys = np.unique(keys)
+        if not len(keys):
+            return
+
+        # Deleted items of each chunk
+        groups = {}
+        for key in keys:
+            c, j = self._locate(key)
+            groups.setdefault(c, []).append(j)
+
+        for c, items in groups.items():
+            chunk = self._chunks[c]
+            keep = np.ones(len(chunk[1]), dtype=bool)
+            keep[items] = False
+            self._size -= chunk[1][~keep].sum()
+            if not keep.any():
+                self._chunks[c] = None
+            else:
+                self._chunks[c] = [chunk[0][np.repeat(keep, chunk[1])],
+                                   chunk[1][keep], None]
+        self._count -= len(keys)
+        self._chunks = [chunk for chunk in self._chunks if chunk is not None]
+        self._build()
+        self._flat = None
+
+
+    def insert_many(self, keys, data, itemsize=None):
+        """ Insert several items at once, each one before the given index
+
+        Only the chunks receiving new items are modified (each one once).
+        Indices refer to the list before insertion and items inserted at the
+        same index are kept in the given order.
+
+        Parameters
+        ----------
+
+        keys : 1-D array
+            Indices before which items will be inserted (one per item).
+
+        data : array_like
+            An array, any object exposing the array interface, an object
+            whose __array__ method returns an array, or any (nested) sequence.
+
+        itemsize:  int or 1-D array
+            If `itemsize is an integer, N, the array will be divided
+            into elements of size N. If such partition is not possible,
+            an error is raised.
+
+            If `itemsize` is 1-D array, the array will be divided into
+            elements whose succesive sizes will be picked from itemsize.
+            If the sum of itemsize values is different from array size,
+            an error is raised.
+
+            If `itemsize` is None, data is divided into as many elements of
+            same size as there are keys.
+        """
+
+        if not self._sizeable:
+            raise AttributeError("List is not sizeable")
+
+        keys = np.array(keys, dtype=int).ravel()
+        keys[keys < 0] += len(self)
+        if len(keys) and (keys.min() < 0 or keys.max() > len(self)):
+            raise IndexError("List insertion index out of range")
+        if not len(keys):
+            return
+
+        if type(data) in [list, tuple] and len(data) \
+           and type(data[0]) in [list, tuple]:
+            itemsize = [len(l) for l in data]
+            data = [item for sublist in data for item in sublist]
+        data = np.asarray(data, dtype=self._dtype).ravel()
+        if itemsize is None:
+            itemsize = data.size // len(keys)
+        data, sizes = self._partition(data, itemsize)
+        if len(sizes) != len(keys):
+            raise ValueError("Cannot partition data as requested")
+
+        # Empty list (all keys are 0)
+        if not self._chunks:
+            self.insert(0, data, sizes)
+            return
+
+        # New items of each chunk (in key order, stable)
+        groups = {}
+        last = len(self._chunks) - 1
+        for i in np.argsort(keys, kind='mergesort'):
+            if keys[i] < self._count:
+                c, j = self._locate(keys[i])
+            else:
+                c, j = last, len(self._chunks[last][1])
+            groups.setdefault(c, []).append((j, i))
+
+        stops = sizes.cumsum()
+        chunks = []
+        for c, chunk in enumerate(self._chunks):
+            if c not in groups:
+                chunks.append(chunk)
+                continue
+            positions = np.array([j for j, i in groups[c]], dtype=int)
+            new = np.array([i for j, i in groups[c]], dtype=int)
+
+            # Data of new items (in key order) after chunk data
+            new_sizes = sizes[new]
+            new_stops = new_sizes.cumsum()
+            gather = np.repeat(stops[new] - new_stops, new_sizes)
+            gather += np.arange(new_stops[-1])
+            source = np.concatenate((chunk[0], data[gather]))
+
+            # Final order of (old, new) items (see ArrayList.insert_many)
+            rank = np.concatenate((2 * np.arange(len(chunk[1])) + 1,
+                                   2 * positions))
+            order = np.argsort(rank, kind='mergesort')
+            starts = np.concatenate((self._starts(chunk)[:-1],
+                                     len(chunk[0]) + new_stops - new_sizes))
+            starts = starts[order]
+            item_sizes = np.concatenate((chunk[1], new_sizes))[order]
+            item_stops = item_sizes.cumsum()
+            gather = np.repeat(starts - item_stops + item_sizes, item_sizes)
+            gather += np.arange(len(source))
+            chunk_data = source[gather]
+
+            # Split chunk if too big
+            if len(item_sizes) >= 2*self._chunksize:
+                chunks.extend(self._split(chunk_data, item_sizes))
+            else:
+                chunks.append([chunk_data, item_sizes, None])
+
+        self._chunks = chunks
+        self._count += len(sizes)
+        self._size += data.size
+        self._build()
+        self._flat = None
@@ -10,6 +10,16 @@ vertex structure (vtype) and same uniforms type (utype). A collection allows to
 manipulate objects individually but they can be rendered at once (single call).
 Each object can have its own set of uniforms provided they are a combination of
 floats.
+
+Indices of an item are stored relative to the item (from 0 to the number of
+vertices of the item) such that inserting or deleting an item does not rewrite
+indices of subsequent items. Absolute indices (for rendering) are rebased when
+accessed, in a single pass starting at the first modified item (see
+`Collection.rebase`).
+
+A collection created with mode='slots' (see `SlotCollection`) stores items in
+fixed size slots instead: item handles are stable, deleted slots are recycled
+and only modified slots need to be uploaded.
 """
 import math
 import numpy as np
@@ -17,6 +27,27 @@ from util import dtype_reduce
 from array_list import ArrayList
 
 
+def _runs(keys):
+    """ Ranges (start, stop) of consecutive values of sorted keys """
+
+    if not len(keys):
+        return []
+    runs = np.flatnonzero(np.diff(keys) > 1)
+    starts = keys[np.append(0, runs + 1)]
+    stops = keys[np.append(runs, len(keys) - 1)] + 1
+    return zip(starts, stops)
+
+
+def _readonly(L):
+    """ Read-only list sharing the items and data of L (no copy) """
+
+    R = ArrayList(dtype=L.dtype, sizeable=False, writeable=False)
+    R._data = L._data.view()
+    R._data.flags.writeable = False
+    R._items, R._size, R._count = L._items, L._size, L._count
+    return R
+
+
 class Item(object):
     """
     An item represent an object within a collection and is created on demand
@@ -59,6 +90,7 @@ class Item(object):
     def _set_vertices(self, data):
         data = np.array(data)
         self._vertices[...] = data
+        self._parent._changed(self._key)
     vertices = property(_get_vertices, _set_vertices)
 
 
@@ -67,8 +99,7 @@ class Item(object):
     def _set_indices(self, data):
         data = np.array(data)
         # assert 0 <= data.min() <= data.max() < len(self._vertices)
-        start = self._parent.vertices._items[self._key][0]
-        self._indices[...] = data + start
+        self._parent._set_indices(self._key, data)
     indices = property(_get_indices, _set_indices)
 
 
@@ -76,6 +107,7 @@ class Item(object):
         return self._uniforms
     def _set_uniforms(self, data):
         self._uniforms[...] = data
+        self._parent._changed(self._key)
     uniforms = property(_get_uniforms, _set_uniforms)
 
 
@@ -87,6 +119,7 @@ class Item(object):
     def __setitem__(self, key, value):
         """ Set a specific uniform value """
         self._uniforms[key] = value
+        self._parent._changed(self._key)
 
 
     def __str__(self):
@@ -103,7 +136,17 @@ class Collection(object):
     combination of floats.
     """
 
-    def __init__(self, vtype, utype, itype=np.uint32 ):
+    def __new__(cls, *args, **kwargs):
+        """ Create a SlotCollection when mode is 'slots' """
+
+        mode = kwargs.get("mode", args[3] if len(args) > 3 else "packed")
+        if cls is Collection and mode == "slots":
+            cls = SlotCollection
+        return object.__new__(cls)
+
+
+    def __init__(self, vtype, utype, itype=np.uint32, mode="packed",
+                 slotsize=None):
         """
 
         Parameters
@@ -117,8 +160,18 @@ class Collection(object):
 
         itype: np.dtype
             Indices data type
+
+        mode: str
+            'packed' (default) stores items contiguously, in order.
+            'slots' stores items in fixed size slots (see SlotCollection).
+
+        slotsize: tuple
+            Vertices and indices count of a slot ('slots' mode only)
         """
 
+        if mode not in ["packed", "slots"]:
+            raise ValueError("mode must be 'packed' or 'slots'")
+
         vtype = np.dtype(vtype)
         if vtype.names is None:
             raise ValueError("vtype must be a structured dtype")
@@ -155,6 +208,16 @@ class Collection(object):
         self._indices = ArrayList(dtype=itype)
         self._uniforms = ArrayList(dtype=utype)
 
+        # Absolute indices (rebased from item relative indices) and first
+        # item whose absolute indices are not up to date
+        self._absolute = ArrayList(dtype=itype)
+        self._dirty = None
+
+        # Items modified in place and first item from which all items have
+        # been modified (see `changes`)
+        self._changes = set()
+        self._changed_from = None
+
 
     @property
     def u_shape(self):
@@ -162,7 +225,7 @@ class Collection(object):
         # max_texsize = gl.glGetInteger(gl.GL_MAX_TEXTURE_SIZE)
         max_texsize = 4096
         cols = max_texsize//(self._u_float_count/4)
-        rows = (len(self) // cols)+1
+        rows = (len(self._uniforms) // cols)+1
         return rows, cols*(self._u_float_count/4), self._u_float_count
 
 
@@ -175,9 +238,10 @@ class Collection(object):
 
     @property
     def indices(self):
-        """ Indices buffer """
+        """ Indices buffer (absolute indices, read-only) """
 
-        return self._indices
+        self.rebase()
+        return _readonly(self._absolute)
 
 
     @property
@@ -190,7 +254,8 @@ class Collection(object):
     def u_indices(self):
         """ Uniform texture indices """
 
-        return np.repeat(np.arange(len(self)), self._vertices.itemsize)
+        V = self._vertices
+        return np.repeat(np.arange(len(V)), V.itemsize)
 
 
 
@@ -203,13 +268,16 @@ class Collection(object):
     def __getitem__(self, key):
         """ """
 
-        V, U, I = self._vertices, self._uniforms, self._indices
+        self.rebase()
+        V, U, I = self._vertices, self._uniforms, self._absolute
         if V.dtype.names and key in V.dtype.names:
             return V[key]
         elif U.dtype.names and key in U.dtype.names:
             return U[key]
         else:
-            return Item(self, key, V[key], I[key], U[key])
+            indices = I[key]
+            indices.flags.writeable = False
+            return Item(self, key, V[key], indices, U[key])
 
 
 
@@ -219,10 +287,12 @@ class Collection(object):
         # Setting vertices field at once
         if self._vertices.dtype.names and key in self._vertices.dtype.names:
             self._vertices.data[key] = data
+            self._changed_from = 0
 
         # Setting uniforms field at once
         elif self._uniforms.dtype.names and key in self._uniforms.dtype.names:
             self._uniforms.data[key] = data
+            self._changed_from = 0
 
         # Setting individual item
         else:
@@ -255,11 +325,10 @@ class Collection(object):
         else:
             raise TypeError("Collection deletion indices must be integers")
 
-        vsize = len(self._vertices[key])
         del self._indices[key]
-        self._indices[key] -= vsize
         del self._vertices[key]
         del self._uniforms[key]
+        self._invalidate(kstart)
 
         # Update a_index at once
         # I = np.repeat(np.arange(len(self)), self._vertices.itemsize)
@@ -304,9 +373,8 @@ class Collection(object):
         itype = self._indices.dtype
         indices  = np.array(indices,copy=False).astype(itype).ravel()
 
-        utype = self._uniforms.dtype
         if uniforms is not None:
-            uniforms = np.array(uniforms,copy=False).astype(utype).ravel()
+            uniforms = self._as_uniforms(uniforms)
 
         # Check index
         if index < 0:
@@ -314,20 +382,9 @@ class Collection(object):
         if index < 0 or index > len(self):
             raise IndexError("Collection insertion index out of range")
 
-        # Inserting
-        if index < len(self._vertices):
-            vstart = self._vertices._items[index][0]
-            istart = self._indices._items[index][0]
-            ustart = self._uniforms._items[index][0]
-        # Appending
-        else:
-            vstart = self._vertices.size
-            istart = self._indices.size
-            ustart = self._uniforms.size
-
-        # Updating indices
-        self._indices._data[istart:] += len(vertices)
-        indices += vstart
+        # Indices are stored relative to the item and absolute indices of
+        # subsequent items are rebased lazily
+        self._invalidate(index)
 
         # Inserting one item
         if itemsize is None:
@@ -388,8 +445,6 @@ class Collection(object):
         if v_itemcount != i_itemcount:
             raise ValueError("Vertices/Indices item size not compatible")
 
-        I = np.repeat(v_itemsize.cumsum(),i_itemsize)
-        indices[i_itemsize[0]:] += I[:-i_itemsize[0]]
         self._vertices.insert(index, vertices, v_itemsize)
         self._indices.insert(index, indices, i_itemsize)
         if uniforms is None:
@@ -405,10 +460,6 @@ class Collection(object):
             else:
                 self._uniforms.insert(index, uniforms, itemsize=1)
 
-        # Update a_index at once
-        I = np.repeat(np.arange(len(self)), self._vertices.itemsize)
-        self._vertices['a_index'] = I
-
 
 
     def append(self, vertices, indices, uniforms=None, itemsize=None):
@@ -441,6 +492,529 @@ class Collection(object):
         self.insert(len(self), vertices, indices, uniforms, itemsize)
 
 
+    def delete_many(self, keys):
+        """
+        Delete several (scattered) items at once.
+
+        Vertices, indices and uniforms are compacted in a single pass
+        (instead of one pass per deleted item).
+
+        Parameters
+        ----------
+
+        keys : int or 1-D array
+            Indices of items to be deleted (in any order, duplicates are
+            ignored)
+        """
+
+        keys = np.array(keys, dtype=int).ravel()
+        keys[keys < 0] += len(self)
+        if len(keys) and (keys.min() < 0 or keys.max() >= len(self)):
+            raise IndexError("Collection deletion index out of range")
+        keys = np.unique(keys)
+        if not len(keys):
+            return
+
+        self._vertices.delete_many(keys)
+        self._indices.delete_many(keys)
+        self._uniforms.delete_many(keys)
+        self._invalidate(keys[0])
+
+
+    def insert_many(self, keys, vertices, indices, uniforms=None, itemsize=None):
+        """
+        Insert several items at once, each one before the given index.
+
+        Vertices, indices and uniforms are inserted in a single pass
+        (instead of one pass per inserted item).
+
+        Parameters
+        ----------
+
+        keys : 1-D array
+            Indices before which items are inserted (one per item). Indices
+            refer to the collection before insertion and items inserted at
+            the same index are kept in the given order.
+
+        vertices : list or numpy array
+            Vertices of each item (list of arrays) or vertices of all items
+            (array partitioned according to itemsize)
+
+        indices : list or numpy array
+            Indices of each item (list of arrays) or indices of all items
+            (array partitioned according to itemsize). Index values of an
+            item must be between 0 and the number of vertices of this item.
+
+        uniforms: numpy array
+            Uniforms of each item (or of all items if only one is given)
+
+        itemsize: tuple or 2-D array
+            If vertices and indices are given as single arrays, `itemsize`
+            is either a tuple (vertices size, indices size) common to all
+            items or an array of shape (n,2) giving individual sizes.
+        """
+
+        keys = np.array(keys, dtype=int).ravel()
+        keys[keys < 0] += len(self)
+        if len(keys) and (keys.min() < 0 or keys.max() > len(self)):
+            raise IndexError("Collection insertion index out of range")
+        n = len(keys)
+        if not n:
+            return
+
+        # Make sure vertices/indices/uniforms are of the right dtype
+        V, I, U = self._vertices, self._indices, self._uniforms
+        if itemsize is None:
+            vertices = [np.array(v, copy=False).astype(V.dtype).ravel()
+                        for v in vertices]
+            indices = [np.array(i, copy=False).astype(I.dtype).ravel()
+                       for i in indices]
+            v_itemsize = np.array([len(v) for v in vertices], dtype=int)
+            i_itemsize = np.array([len(i) for i in indices], dtype=int)
+            vertices = np.concatenate(vertices)
+            indices = np.concatenate(indices)
+        else:
+            vertices = np.array(vertices, copy=False).astype(V.dtype).ravel()
+            indices = np.array(indices, copy=False).astype(I.dtype).ravel()
+            if isinstance(itemsize, tuple):
+                v_itemsize = np.ones(n, dtype=int) * itemsize[0]
+                i_itemsize = np.ones(n, dtype=int) * itemsize[1]
+            else:
+                itemsize = np.array(itemsize, dtype=int).reshape(-1, 2)
+                v_itemsize, i_itemsize = itemsize[:, 0], itemsize[:, 1]
+
+        # Sanity check
+        if len(v_itemsize) != n or v_itemsize.sum() != vertices.size:
+            raise ValueError("Cannot partition vertices data as requested")
+        if len(i_itemsize) != n or i_itemsize.sum() != indices.size:
+            raise ValueError("Cannot partition indices data as requested")
+        if uniforms is None:
+            uniforms = np.zeros(n, dtype=U.dtype)
+        else:
+            uniforms = self._as_uniforms(uniforms)
+            if len(uniforms) == 1:
+                uniforms = np.resize(uniforms, n)
+            elif len(uniforms) != n:
+                raise ValueError("Vertices/Uniforms item number not compatible")
+
+        V.insert_many(keys, vertices, v_itemsize)
+        I.insert_many(keys, indices, i_itemsize)
+        U.insert_many(keys, uniforms, 1)
+        self._invalidate(keys.min())
+
+
+    def _as_uniforms(self, uniforms):
+        """ Uniforms converted to the uniform type (padded to full texels) """
+
+        dtype = self._uniforms.dtype
+        uniforms = np.array(uniforms, copy=False).ravel()
+        if uniforms.dtype == dtype or uniforms.dtype.names is None:
+            return uniforms.astype(dtype)
+        U = np.zeros(len(uniforms), dtype=dtype)
+        for name in uniforms.dtype.names:
+            U[name] = uniforms[name]
+        return U
+
+
+    def _changed(self, key):
+        """ Called when an item has been modified in place """
+
+        self._changes.add(key)
+
+
+    def _set_indices(self, key, data):
+        """ Set (relative) indices of an item """
+
+        self.rebase()
+        self._indices[key] = data
+        self._absolute[key] = data + self._vertices._items[key][0]
+        self._changed(key)
+
+
+    def _invalidate(self, key):
+        """ Mark items from key to the end as moved (stale indices) """
+
+        if self._dirty is None or key < self._dirty:
+            self._dirty = key
+        if self._changed_from is None or key < self._changed_from:
+            self._changed_from = key
+
+
+    def changes(self):
+        """
+        Get items modified since last call.
+
+        Items are modified in place (e.g. when setting item vertices or
+        uniforms) or moved when an item is inserted or deleted before them.
+
+        Returns
+        -------
+
+        List of (start, stop) item ranges (slot ranges in slots mode). Use
+        `vertices._items` or `indices._items` to get vertices or indices
+        ranges.
+        """
+
+        count = len(self._vertices)
+        first, self._changed_from = self._changed_from, None
+        if first is None:
+            first = count
+        keys = np.array(sorted(self._changes), dtype=int)
+        self._changes = set()
+        ranges = _runs(keys[keys < min(first, count)])
+        if first < count:
+            ranges.append((first, count))
+        return ranges
+
+
+    def rebase(self):
+        """
+        Rebase absolute indices from item relative indices.
+
+        Items are stored with relative indices such that inserting or
+        deleting an item does not modify other items. Absolute indices are
+        computed here for all modified items at once, in a single pass
+        starting at the first modified item. This is done automatically
+        when indices are accessed.
+
+        Returns
+        -------
+
+        List of (start, stop) ranges of the indices buffer whose values have
+        been modified (e.g. to be uploaded).
+        """
+
+        I, A = self._indices, self._absolute
+        first, self._dirty = self._dirty, None
+        if first is None:
+            return []
+
+        # Item sizes have changed (items inserted or deleted)
+        if A._data.size < I._data.size:
+            A._data = np.resize(A._data, I._data.size)
+        A._items, A._size, A._count = I._items.copy(), I._size, I._count
+        if first >= len(self):
+            return []
+        start = I._items[first][0]
+        base = np.repeat(self._vertices._items[first:len(self), 0],
+                         I.itemsize[first:])
+        np.add(I._data[start:I.size], base, out=A._data[start:I.size],
+               casting='unsafe')
+        return [(start, I.size)]
+
+
+
+class SlotCollection(Collection):
+    """
+    A slot collection is a collection whose items are stored in fixed size
+    slots (same maximum number of vertices and indices for all items). Items
+    are never moved such that an item handle (slot index) remains valid until
+    the item is deleted. A deleted item leaves a free slot that is recycled by
+    next append and modified slots are tracked such that only those need to
+    be uploaded. Compaction is explicit (see `compact`).
+
+    Free slots (and unused indices of a slot) are degenerated: all their
+    indices refer to the first vertex of the slot.
+    """
+
+    def __init__(self, vtype, utype, itype=np.uint32, mode="slots",
+                 slotsize=(4, 6)):
+        """
+
+        Parameters
+        ----------
+
+        vtype: np.dtype
+            Vertices data type
+
+        utype: np.dtype
+            Uniforms data type
+
+        itype: np.dtype
+            Indices data type
+
+        mode: str
+            Must be 'slots'
+
+        slotsize: tuple
+            Vertices and indices count of a slot
+        """
+
+        Collection.__init__(self, vtype, utype, itype, "slots")
+        self._vsize, self._isize = slotsize
+
+        # Indices are stored as absolute indices
+        self._absolute = self._indices
+
+        # Vertices and indices count of each slot (-1 for free slots), free
+        # slots and modified slots
+        self._sizes = np.zeros((64, 2), dtype=int)
+        self._free = []
+
+
+    @property
+    def slots(self):
+        """ Number of slots (used or free) """
+
+        return len(self._vertices)
+
+
+    @property
+    def slotsize(self):
+        """ Vertices and indices count of a slot """
+
+        return self._vsize, self._isize
+
+
+    def __len__(self):
+        """ Number of items """
+
+        return len(self._vertices) - len(self._free)
+
+
+    def __getitem__(self, key):
+        """ """
+
+        V, U, I = self._vertices, self._uniforms, self._indices
+        if V.dtype.names and key in V.dtype.names:
+            return V[key]
+        elif U.dtype.names and key in U.dtype.names:
+            return U[key]
+        vsize, isize = self._sizes[self._check(key)]
+        indices = I[key][:isize]
+        indices.flags.writeable = False
+        return Item(self, key, V[key][:vsize], indices, U[key])
+
+
+    def __setitem__(self, key, data):
+        """ """
+
+        V, U = self._vertices, self._uniforms
+        if (V.dtype.names and key in V.dtype.names or
+            U.dtype.names and key in U.dtype.names):
+            Collection.__setitem__(self, key, data)
+        else:
+            vertices, indices, uniforms = data
+            self._write(np.array([self._check(key)]),
+                        vertices, indices, uniforms)
+
+
+    def __delitem__(self, key):
+        """ x.__delitem__(y) <==> del x[y] """
+
+        self.delete_many([key])
+
+
+    def _check(self, key):
+        """ Check key is the handle of an item """
+
+        if type(key) is not int and not isinstance(key, np.integer):
+            raise TypeError("Collection handles must be integers")
+        if key < 0 or key >= self.slots or self._sizes[key, 0] < 0:
+            raise IndexError("Collection handle is not valid")
+        return key
+
+
+    def _set_indices(self, key, data):
+        """ Set (relative) indices of an item """
+
+        if len(data) > self._isize:
+            raise ValueError("Item indices do not fit in a slot")
+        I = self._indices[key]
+        base = key * self._vsize
+        np.add(data, base, out=I[:len(data)], casting='unsafe')
+        I[len(data):] = base
+        self._sizes[key, 1] = len(data)
+        self._changes.add(key)
+
+
+    def _allocate(self, count):
+        """ Get count slots, recycling free slots first """
+
+        n = min(count, len(self._free))
+        slots = self._free[len(self._free) - n:]
+        del self._free[len(self._free) - n:]
+
+        # New (degenerated) slots
+        if count > n:
+            start, stop = self.slots, self.slots + count - n
+            vsize, isize = self._vsize, self._isize
+            V, I, U = self._vertices, self._indices, self._uniforms
+            V.append(np.zeros((stop - start) * vsize, dtype=V.dtype), vsize)
+            I.append(np.repeat(vsize * np.arange(start, stop), isize), isize)
+            U.append(np.zeros(stop - start, dtype=U.dtype), 1)
+            if stop > len(self._sizes):
+                capacity = int(2 ** np.ceil(np.log2(stop)))
+                self._sizes = np.resize(self._sizes, (capacity, 2))
+            slots += range(start, stop)
+        return np.array(slots, dtype=int)
+
+
+    def _prepare_uniforms(self, uniforms, count):
+        """ Uniforms of count items (default uniforms if None) """
+
+        dtype = self._uniforms.dtype
+        if uniforms is None:
+            return np.zeros(count, dtype=dtype)
+        uniforms = self._as_uniforms(uniforms)
+        if len(uniforms) == 1:
+            return np.resize(uniforms, count)
+        elif len(uniforms) != count:
+            raise ValueError("Vertices/Uniforms item number not compatible")
+        return uniforms
+
+
+    def _write(self, slots, vertices, indices, uniforms=None):
+        """ Write items (of same size) into slots """
+
+        n = len(slots)
+        V, I, U = self._vertices, self._indices, self._uniforms
+        vertices = np.array(vertices, copy=False).astype(V.dtype).reshape(n, -1)
+        indices = np.array(indices, copy=False).astype(int).reshape(n, -1)
+        vsize, isize = vertices.shape[1], indices.shape[1]
+        if vsize > self._vsize or isize > self._isize:
+            raise ValueError("Items do not fit in a slot")
+        uniforms = self._prepare_uniforms(uniforms, n)
+
+        base = (slots * self._vsize)[:, np.newaxis]
+        V.data.reshape(-1, self._vsize)[slots, :vsize] = vertices
+        I.data.reshape(-1, self._isize)[slots, :isize] = indices + base
+        I.data.reshape(-1, self._isize)[slots, isize:] = base
+        U.data[slots] = uniforms
+        self._sizes[slots] = vsize, isize
+        self._changes.update(slots.tolist())
+
+
+    def append(self, vertices, indices, uniforms=None, itemsize=None):
+        """
+        Append items into free slots (or new slots)
+
+        Parameters
+        ----------
+
+        vertices : numpy array
+            An array whose dtype is compatible with self.vertices.dtype
+
+        indices : numpy array
+            An array whose dtype is compatible with self.indices.dtype
+            All index values must be between 0 and len(vertices)
+
+        uniforms: numpy array
+            An array whose dtype is compatible with self.uniforms.dtype
+
+        itemsize: int or tuple
+            If `itemsize is an integer, N, vertices are divided into items
+            of size N sharing the same indices. If `itemsize` is a tuple,
+            vertices and indices are divided into items of given sizes.
+
+        Returns
+        -------
+
+        Handle of the item (or array of handles if itemsize is given)
+        """
+
+        vertices = np.array(vertices, copy=False).ravel()
+        indices = np.array(indices, copy=False).ravel()
+
+        single = itemsize is None
+        if single:
+            itemsize = vertices.size, indices.size
+        elif type(itemsize) is int:
+            itemsize = itemsize, indices.size
+            indices = np.resize(indices, indices.size * (vertices.size //
+                                                         itemsize[0]))
+        count = vertices.size // itemsize[0]
+        if vertices.size != count * itemsize[0]:
+            raise ValueError("Cannot partition vertices data as requested")
+        if indices.size != count * itemsize[1]:
+            raise ValueError("Vertices/Indices item size not compatible")
+        if itemsize[0] > self._vsize or itemsize[1] > self._isize:
+            raise ValueError("Items do not fit in a slot")
+
+        uniforms = self._prepare_uniforms(uniforms, count)
+        slots = self._allocate(count)
+        self._write(slots, vertices, indices, uniforms)
+        if single:
+            return int(slots[0])
+        return slots
+
+
+    def insert(self, index, vertices, indices, uniforms=None, itemsize=None):
+        """ Items cannot be inserted at a given index (use append) """
+
+        raise AttributeError("Slot collection is not insertable")
+
+
+    def insert_many(self, keys, vertices, indices, uniforms=None,
+                    itemsize=None):
+        """ Items cannot be inserted at a given index (use append) """
+
+        raise AttributeError("Slot collection is not insertable")
+
+
+    def delete_many(self, keys):
+        """
+        Delete several items at once.
+
+        Slots are degenerated and made available for next insertions, other
+        items are left untouched.
+
+        Parameters
+        ----------
+
+        keys : int or 1-D array
+            Handles of items to be deleted
+        """
+
+        keys = np.unique(np.array(keys, dtype=int).ravel())
+        for key in keys[:1].tolist() + keys[-1:].tolist():
+            self._check(key)
+        if (self._sizes[keys, 0] < 0).any():
+            raise IndexError("Collection handle is not valid")
+
+        base = (keys * self._vsize)[:, np.newaxis]
+        self._indices.data.reshape(-1, self._isize)[keys] = base
+        self._sizes[keys] = -1
+        self._free.extend(keys.tolist())
+        self._changes.update(keys.tolist())
+
+
+    def compact(self):
+        """
+        Move items stored after the first len(self) slots into free slots and
+        release remaining slots. Handles of moved items are changed.
+
+        Returns
+        -------
+
+        Array giving the new handle of each former slot (-1 for free slots)
+        """
+
+        count, slots = len(self), self.slots
+        used = self._sizes[:slots, 0] >= 0
+        remap = np.where(used, np.arange(slots), -1)
+        holes = np.flatnonzero(~used[:count])
+        moved = np.flatnonzero(used[count:]) + count
+
+        vsize, isize = self._vsize, self._isize
+        V = self._vertices.data.reshape(-1, vsize)
+        I = self._indices.data.reshape(-1, isize)
+        U = self._uniforms.data
+        V[holes] = V[moved]
+        I[holes] = I[moved] - ((moved - holes) * vsize)[:, np.newaxis]
+        U[holes] = U[moved]
+        self._sizes[holes] = self._sizes[moved]
+        remap[moved] = holes
+
+        del self._vertices[count:]
+        del self._indices[count:]
+        del self._uniforms[count:]
+        self._free = []
+        self._changes = set(key for key in self._changes if key < count)
+        self._changes.update(holes.tolist())
+        return remap
+
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+A GPU collection keeps the GPU objects of a collection in sync with it: a
+vertex buffer (collection vertices), an item buffer (item index of each
+vertex, used to fetch item uniforms), an index buffer (absolute indices) and
+a uniform texture (item uniforms as float texels, `n` RGBA texels per item).
+
+The collection tracks the items that are modified (inserted, deleted, moved,
+set or modified through an `Item`) and only their ranges are uploaded when the
+GPU collection is flushed (at draw time). GPU objects grow by doubling their
+capacity such that they are not reallocated on every append.
+
+Example
+-------
+
+>>> C = Collection(vtype, utype)
+>>> G = GPUCollection(C)
+>>> C.append(vertices, indices, uniforms)
+>>> G.draw(program, gl.GL_TRIANGLES)
+>>> C[0]["color"] = 1,0,0
+>>> G.draw(program, gl.GL_TRIANGLES)   # uploads item 0 only
+"""
+import os, sys
+import weakref
+import numpy as np
+import OpenGL.GL as gl
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'nr_gloo'))
+from gloo import VertexBuffer, IndexBuffer, Texture2D
+
+
+def _capacity(size, capacity):
+    """ Capacity (power of two) needed to store size elements """
+
+    if size <= capacity:
+        return capacity
+    return int(2 ** np.ceil(np.log2(size)))
+
+
+class GPUCollection(object):
+    """
+    A GPU collection owns the vertex, item, index buffers and the uniform
+    texture of a collection and uploads modified items when flushed.
+    """
+
+    def __init__(self, collection, index="a_index", uniforms="u_uniforms",
+                 width=4096):
+        """
+        Create the GPU objects of a collection.
+
+        Parameters
+        ----------
+
+        collection : Collection
+            Collection (packed or slots mode) to be synced
+
+        index : str
+            Name of the (float) attribute giving the item index of a vertex
+
+        uniforms : str
+            Name of the sampler uniform giving item uniforms. If the program
+            has a vec3 uniform named uniforms+"_shape", it is set to the
+            texture (width, height) and the number of texels per item.
+
+        width : int
+            Maximum width of the uniform texture (at least the number of
+            texels per item)
+        """
+
+        self._collection = collection
+        self._index = index
+        self._uniforms = uniforms
+
+        V, I = collection._vertices, collection._indices
+        self._texels = collection._u_float_count // 4
+        if width < self._texels:
+            raise ValueError("Texture width cannot hold the uniforms of an item")
+        self._width = (width // self._texels) * self._texels
+
+        self._vbuffer = VertexBuffer(dtype=V.dtype, store=False)
+        self._abuffer = VertexBuffer(dtype=[(index, np.float32)], store=False)
+        self._ibuffer = IndexBuffer(dtype=I.dtype, store=False)
+        self._texture = Texture2D(shape=(1, self._width, 4),
+                                  dtype=np.dtype(np.float32),
+                                  store=False)
+        self._texture._internalformat = gl.GL_RGBA32F
+        self._programs = weakref.WeakKeyDictionary()
+
+
+    @property
+    def collection(self):
+        """ Synced collection """
+
+        return self._collection
+
+
+    @property
+    def vertices(self):
+        """ Vertex buffer """
+
+        return self._vbuffer
+
+
+    @property
+    def items(self):
+        """ Item buffer (item index of each vertex) """
+
+        return self._abuffer
+
+
+    @property
+    def indices(self):
+        """ Index buffer """
+
+        return self._ibuffer
+
+
+    @property
+    def texture(self):
+        """ Uniform texture """
+
+        return self._texture
+
+
+    def _reserve(self):
+        """ Grow GPU objects if necessary and tell whether they grew """
+
+        C = self._collection
+        V, I, U = C._vertices, C._absolute, C._uniforms
+        grown = False
+        for buffer, size in [(self._vbuffer, V.size), (self._abuffer, V.size),
+                             (self._ibuffer, I.size)]:
+            capacity = _capacity(size, buffer.size)
+            if capacity != buffer.size:
+                buffer.resize(capacity)
+                grown = True
+
+        height = _capacity(U.size*self._texels // self._width + 1,
+                           self._texture.height)
+        if height != self._texture.height:
+            self._texture.resize((height, self._width, 4))
+            grown = True
+        return grown
+
+
+    def _upload_uniforms(self, start, stop):
+        """ Upload uniforms of items in [start,stop) """
+
+        U = self._collection._uniforms
+        texels = U._data.view(np.float32).reshape(-1, 4)
+        width = self._width
+        tstart, tstop = start*self._texels, stop*self._texels
+        while tstart < tstop:
+            row, col = tstart // width, tstart % width
+            if col == 0 and tstop - tstart >= width:
+                rows = (tstop - tstart) // width
+                data = texels[tstart:tstart + rows*width]
+                self._texture.set_data(data.reshape(rows, width, 4),
+                                       offset=(row, 0, 0))
+                tstart += rows*width
+            else:
+                count = min(width - col, tstop - tstart)
+                data = texels[tstart:tstart + count]
+                self._texture.set_data(data.reshape(1, count, 4),
+                                       offset=(row, col, 0))
+                tstart += count
+
+
+    def flush(self):
+        """
+        Upload modified items (all items if GPU objects had to grow)
+
+        Returns
+        -------
+
+        List of (start, stop) item ranges that have been uploaded
+        """
+
+        C = self._collection
+        ranges = C.changes()
+        C.rebase()
+        V, I = C._vertices, C._absolute
+        count = len(V)
+        if self._reserve():
+            ranges = [(0, count)] if count else []
+
+        for start, stop in ranges:
+            vstart, vstop = V._items[start, 0], V._items[stop-1, 1]
+            self._vbuffer.set_data(V._data[vstart:vstop],
+                                   offset=vstart*V.dtype.itemsize)
+            items = np.repeat(np.arange(start, stop, dtype=np.float32),
+                              V.itemsize[start:stop])
+            self._abuffer.set_data(items, offset=vstart*4)
+            istart, istop = I._items[start, 0], I._items[stop-1, 1]
+            self._ibuffer.set_data(I._data[istart:istop],
+                                   offset=istart*I.dtype.itemsize)
+            self._upload_uniforms(start, stop)
+        return ranges
+
+
+    def bind(self, program):
+        """ Bind GPU objects to program attributes and uniforms """
+
+        program.bind(self._vbuffer)
+        program.bind(self._abuffer)
+        uniforms = [name for name, gtype in program.all_uniforms]
+        if self._uniforms in uniforms:
+            program[self._uniforms] = self._texture
+        self._programs[program] = True
+
+
+    def draw(self, program, mode=gl.GL_TRIANGLES):
+        """
+        Flush modified items and draw the collection.
+
+        Parameters
+        ----------
+
+        program : Program
+            Program to be used (bound on first use)
+
+        mode : GL_ENUM
+            GL_POINTS, GL_LINES, GL_LINE_STRIP, GL_LINE_LOOP,
+            GL_TRIANGLES, GL_TRIANGLE_STRIP, GL_TRIANGLE_FAN
+        """
+
+        self.flush()
+        if program not in self._programs:
+            self.bind(program)
+        shape = self._uniforms + "_shape"
+        if shape in [name for name, gtype in program.all_uniforms]:
+            program[shape] = (self._width, self._texture.height, self._texels)
+        count = self._collection._absolute.size
+        if count:
+            program.draw(mode, self._ibuffer, count=count)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+from functools import partial
+from chunked_array_list import ChunkedArrayList, FenwickTree
+import test_array_list
+
+
+class ChunkedArrayListAPI(test_array_list.ArrayListDefault):
+    """ ArrayList tests run against a ChunkedArrayList (small chunks) """
+
+    List = partial(ChunkedArrayList, chunksize=2)
+
+
+class FenwickTreeDefault(unittest.TestCase):
+
+    def test_prefix(self):
+        values = [3, 0, 2, 5, 1]
+        T = FenwickTree(values)
+        for i in range(len(values)+1):
+            assert T.prefix(i) == sum(values[:i])
+
+    def test_add(self):
+        T = FenwickTree([1, 1, 1, 1])
+        T.add(1, 3)
+        assert T.prefix(2) == 5
+        assert T.prefix(4) == 7
+
+    def test_search(self):
+        T = FenwickTree([3, 0, 2, 5])
+        assert T.search(0) == (0, 0)
+        assert T.search(2) == (0, 2)
+        assert T.search(3) == (2, 0)
+        assert T.search(9) == (3, 4)
+
+
+class ChunkedArrayListDefault(unittest.TestCase):
+
+    def test_init(self):
+        L = ChunkedArrayList()
+        assert L.dtype == float
+        assert len(L) == 0
+        assert L.data.size == 0
+
+    def test_init_from_list(self):
+        L = ChunkedArrayList([[0], [1, 2], [3, 4, 5]], chunksize=2)
+        assert L.dtype == int
+        assert len(L) == 3
+        assert np.allclose(L[2], [3, 4, 5])
+
+    def test_init_exception(self):
+        self.assertRaises(ValueError, ChunkedArrayList, [0, 1, 2, 3, 4], 3)
+        self.assertRaises(ValueError, ChunkedArrayList, [0, 1, 2, 3, 4],
+                          [1, 2, 3])
+
+    def test_itemsize(self):
+        L = ChunkedArrayList([0, 1, 2, 3, 4, 5], [1, 2, 3], chunksize=1)
+        assert L.size == 6
+        assert np.allclose(L.itemsize, [1, 2, 3])
+
+    def test_append(self):
+        L = ChunkedArrayList(chunksize=2)
+        L.append(np.arange(10), 1 + np.arange(4))
+        L.append(1)
+        assert len(L) == 5
+        assert np.allclose(L[3], [6, 7, 8, 9])
+        assert L[4] == 1
+
+    def test_insert(self):
+        L = ChunkedArrayList(np.arange(10), 2, chunksize=2)
+        L.insert(2, [-1, -1, -1])
+        L.insert(0, [-2])
+        assert len(L) == 7
+        assert np.allclose(L[0], [-2])
+        assert np.allclose(L[3], [-1, -1, -1])
+        assert np.allclose(L.data, [-2, 0, 1, 2, 3, -1, -1, -1, 4, 5, 6, 7, 8, 9])
+
+    def test_delete(self):
+        L = ChunkedArrayList(np.arange(10), 1, chunksize=3)
+        del L[0]
+        del L[2:7]
+        del L[-1]
+        assert np.allclose(L.data, [1, 2, 8])
+        del L[...]
+        assert len(L) == 0 and L.size == 0
+
+    def test_slice(self):
+        L = ChunkedArrayList(np.arange(10), 1, chunksize=3)
+        assert np.allclose(L[1:2], [1])
+        assert np.allclose(L[2:8], np.arange(2, 8))
+        L[2:8] = 0
+        assert np.allclose(L.data, [0, 1, 0, 0, 0, 0, 0, 0, 8, 9])
+
+    def test_setitem(self):
+        L = ChunkedArrayList(np.arange(10), 2, chunksize=2)
+        L[1] = 0
+        assert np.allclose(L[1], [0, 0])
+        L[...] = 1
+        assert np.allclose(L.data, 1)
+
+    def test_fields(self):
+        dtype = [("x", float), ("y", float)]
+        L = ChunkedArrayList(np.zeros(10, dtype), 2, chunksize=2)
+        L["x"] = np.arange(10)
+        assert np.allclose(L[2]["x"], [4, 5])
+        L.insert(1, np.ones(2, dtype))
+        assert np.allclose(L["y"][:4], [0, 0, 1, 1])
+
+    def test_writeable(self):
+        L = ChunkedArrayList([1, 2, 3], writeable=False)
+        with self.assertRaises(AttributeError):
+            L[0] = 0
+        L = ChunkedArrayList([1, 2, 3], sizeable=False)
+        with self.assertRaises(AttributeError):
+            del L[0]
+
+    def test_compact(self):
+        L = ChunkedArrayList(np.arange(100), 1, chunksize=4)
+        del L[10:20]
+        data = L.compact()
+        assert data is L.compact()
+        assert np.allclose(data, np.concatenate([np.arange(10),
+                                                 np.arange(20, 100)]))
+        # Items are views on compacted data
+        L[5] = -1
+        assert data[5] == -1
+        L.insert(0, [0])
+        assert L.compact() is not data
+
+    def test_numpy_itemsize(self):
+        L = ChunkedArrayList(np.arange(10), np.int64(2), chunksize=2)
+        assert len(L) == 5
+        L.insert(0, [1, 2], np.int32(1))
+        assert np.allclose(L[1], [2])
+
+    def test_slice_across_chunks(self):
+        L = ChunkedArrayList(np.arange(10), 1, chunksize=3)
+        L.insert(0, [-1])
+        assert L._flat is None
+        assert np.allclose(L[2:8], np.arange(1, 7))
+        assert L._flat is None
+        L[2:8] = np.zeros(6)
+        assert np.allclose(L.compact(), [-1, 0, 0, 0, 0, 0, 0, 0, 7, 8, 9])
+
+    def test_many_chunks(self):
+        L = ChunkedArrayList([[0], [1, 2], [3, 4, 5], [6], [7, 8]],
+                             chunksize=2)
+        L.insert_many([5, 0, 2, 2], [[-1], [-2], [-3, -3], [-4]])
+        assert np.allclose(L.data, [-2, 0, 1, 2, -3, -3, -4, 3, 4, 5,
+                                    6, 7, 8, -1])
+        L.delete_many([0, 3, 4, 8])
+        assert np.allclose(L.data, [0, 1, 2, 3, 4, 5, 6, 7, 8])
+        assert np.allclose(L.itemsize, [1, 2, 3, 1, 2])
+
+    def test_random(self):
+        np.random.seed(1)
+        L = ChunkedArrayList(dtype=np.int32, chunksize=4)
+        items = []
+        for i in range(500):
+            if items and np.random.uniform() < 0.4:
+                key = np.random.randint(len(items))
+                del L[key]
+                del items[key]
+            else:
+                key = np.random.randint(len(items)+1)
+                item = np.random.randint(0, 100, np.random.randint(1, 5))
+                L.insert(key, item)
+                items.insert(key, item)
+            if i % 50 == 0:
+                L.compact()
+        assert len(L) == len(items)
+        for key in range(len(items)):
+            assert np.array_equal(L[key], items[key])
+        assert np.array_equal(L.data, np.concatenate(items))
+        assert np.array_equal(L.itemsize, [len(item) for item in items])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,7 @@
 # -----------------------------------------------------------------------------
 import unittest
 import numpy as np
-from collection import Collection
+from collection import Collection, SlotCollection
 
 vtype = [('position', 'f4', 2)]
 utype = [('color',    'f4', 3)]
@@ -66,6 +66,165 @@ class CollectionDefault(unittest.TestCase):
         del C[:9]
         assert np.allclose(C[0].indices , indices)
 
+    def test_delete_many(self):
+        C = Collection(vtype, utype)
+        C.insert_many([0]*5, [np.zeros(i+1, vtype) for i in range(5)],
+                      [np.arange(i+1) for i in range(5)])
+        C.delete_many([3, 0])
+        assert len(C) == 3
+        assert np.allclose(C[0].indices, [0, 1])
+        assert np.allclose(C[1].indices, [2, 3, 4])
+        assert np.allclose(C[2].indices, [5, 6, 7, 8, 9])
+        assert np.allclose(C.vertices.itemsize, [2, 3, 5])
+
+    def test_insert_many(self):
+        C = Collection(vtype, utype)
+        C.insert_many([0], [vertices], [indices])
+        C.insert_many([1, 0, 0], np.zeros(12, dtype=vtype),
+                      np.zeros(3, dtype=itype), itemsize=(4, 1))
+        assert len(C) == 4
+        assert np.allclose(C[0].indices, 0)
+        assert np.allclose(C[1].indices, 4)
+        assert np.allclose(C[2].indices, 8+indices)
+        assert np.allclose(C[3].indices, 12)
+
+    def test_insert_many_uniforms(self):
+        C = Collection(vtype, utype)
+        U = np.zeros(3, dtype=C.uniforms.dtype)
+        U["color"] = np.arange(3).reshape(3, 1)
+        C.insert_many([0, 0, 0], [vertices]*3, [indices]*3, U)
+        C.delete_many([1])
+        assert np.allclose(C["color"][:, 0], [0, 2])
+        self.assertRaises(ValueError, C.insert_many, [0, 0],
+                          [vertices]*2, [indices]*2, U)
+
+    def test_rebase(self):
+        C = Collection(vtype, utype)
+        C.insert_many([0]*3, [vertices]*3, [indices]*3)
+        assert C.rebase() == [(0, 18)]
+        assert C.rebase() == []
+        C.insert(1, vertices[:3], [0, 1, 2])
+        assert np.allclose(C._indices[2], indices)
+        assert C.rebase() == [(6, 21)]
+        assert np.allclose(C[1].indices, [4, 5, 6])
+        assert np.allclose(C[2].indices, 7+indices)
+        del C[3]
+        assert C.rebase() == []
+        del C[0]
+        assert np.allclose(C.indices.data, [0, 1, 2, 3, 4, 5, 3, 5, 6])
+
+    def test_rebase_item_indices(self):
+        C = Collection(vtype, utype)
+        C.insert_many([0]*2, [vertices]*2, [indices]*2)
+        C[1].indices = [3, 2, 1, 0, 0, 0]
+        assert np.allclose(C[1].indices, [7, 6, 5, 4, 4, 4])
+        C.insert(0, vertices, indices)
+        assert np.allclose(C[2].indices, [11, 10, 9, 8, 8, 8])
+
+    def test_indices_readonly(self):
+        C = Collection(vtype, utype)
+        C.insert_many([0]*2, [vertices]*2, [indices]*2)
+        I = C.indices
+        self.assertRaises(AttributeError, I.insert, 0, indices)
+        self.assertRaises(AttributeError, I.__delitem__, 0)
+        with self.assertRaises(ValueError):
+            I.data[0] = 1
+        with self.assertRaises(ValueError):
+            C[1].indices[0] = 1
+        assert C._absolute._items is not C._indices._items
+        assert len(C._indices) == 2
+        assert np.allclose(C.indices[1], 4+indices)
+
+    def test_changes(self):
+        C = Collection(vtype, utype)
+        C.insert_many([0]*10, [vertices]*10, [indices]*10)
+        assert C.changes() == [(0, 10)]
+        assert C.changes() == []
+        C[2].vertices = np.ones(4, vtype)
+        C[3].indices = indices[::-1]
+        C[8]["color"] = 1
+        assert C.changes() == [(2, 4), (8, 9)]
+        C[1].vertices = np.ones(4, vtype)
+        C.delete_many([6])
+        assert C.changes() == [(1, 2), (6, 9)]
+        del C[8]
+        assert C.changes() == []
+
+
+
+class SlotCollectionDefault(unittest.TestCase):
+
+    def test_init(self):
+        C = Collection(vtype, utype, mode="slots", slotsize=(4, 6))
+        assert isinstance(C, SlotCollection)
+        assert len(C) == 0 and C.slotsize == (4, 6)
+        self.assertRaises(ValueError, Collection, vtype, utype, mode="none")
+
+    def test_append(self):
+        C = SlotCollection(vtype, utype, slotsize=(4, 6))
+        assert C.append(vertices, indices) == 0
+        assert C.append(vertices[:3], [0, 1, 2]) == 1
+        assert np.allclose(C.append(np.zeros(8, vtype), indices, itemsize=4),
+                           [2, 3])
+        assert len(C) == 4 and C.slots == 4
+        assert np.allclose(C[1].indices, [4, 5, 6])
+        assert np.allclose(C.indices[1], [4, 5, 6, 4, 4, 4])
+        assert np.allclose(C[3].indices, 12+indices)
+        self.assertRaises(ValueError, C.append, np.zeros(5, vtype), indices)
+
+    def test_delete(self):
+        C = SlotCollection(vtype, utype, slotsize=(4, 6))
+        C.append(np.zeros(16, vtype), indices, itemsize=4)
+        del C[1]
+        C.delete_many([3, 2])
+        assert len(C) == 1 and C.slots == 4
+        assert np.allclose(C.indices[2], 8)
+        assert np.allclose(C[0].indices, indices)
+        self.assertRaises(IndexError, C.__getitem__, 1)
+        self.assertRaises(IndexError, C.__delitem__, 1)
+        assert C.append(vertices, indices) in [1, 2, 3]
+        assert len(C) == 2 and C.slots == 4
+
+    def test_changes(self):
+        C = SlotCollection(vtype, utype, slotsize=(4, 6))
+        C.append(np.zeros(40, vtype), indices, itemsize=4)
+        assert C.changes() == [(0, 10)]
+        assert C.changes() == []
+        C[2].vertices = np.ones(4, vtype)
+        C[3].indices = [0, 1, 2]
+        del C[7]
+        assert C.changes() == [(2, 4), (7, 8)]
+        assert np.allclose(C.indices[3], [12, 13, 14, 12, 12, 12])
+
+    def test_uniforms(self):
+        C = SlotCollection(vtype, utype, slotsize=(4, 6))
+        U = np.zeros(3, dtype=C.uniforms.dtype)
+        U["color"] = np.arange(3).reshape(3, 1)
+        C.append(np.zeros(12, vtype), indices, U, itemsize=4)
+        C[1]["color"] = 5
+        assert np.allclose(C["color"][:, 0], [0, 5, 2])
+        assert C.changes() == [(0, 3)]
+
+    def test_compact(self):
+        C = SlotCollection(vtype, utype, slotsize=(4, 6))
+        C.append(np.zeros(24, vtype), indices, itemsize=4)
+        C[5].indices = [0, 1, 2]
+        C.delete_many([0, 2, 3])
+        C.changes()
+        remap = C.compact()
+        assert np.allclose(remap, [-1, 1, -1, -1, 0, 2])
+        assert len(C) == 3 and C.slots == 3
+        assert np.allclose(C[0].indices, indices)
+        assert np.allclose(C[2].indices, [8, 9, 10])
+        assert np.allclose(C.indices[2], [8, 9, 10, 8, 8, 8])
+        assert C.changes() == [(0, 1), (2, 3)]
+
+    def test_insert(self):
+        C = SlotCollection(vtype, utype)
+        self.assertRaises(AttributeError, C.insert, 0, vertices, indices)
+        self.assertRaises(AttributeError, C.insert_many, [0], [vertices],
+                          [indices])
+
 
 # -----------------------------------------------------------------------------
 if __name__ == "__main__":
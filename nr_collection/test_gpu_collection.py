@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import os
+import sys
+import unittest
+import numpy as np
+import OpenGL.GL as gl
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'nr_gloo'))
+from gloo import backend, Program
+from collection import Collection
+from gpu_collection import GPUCollection
+
+vtype = [('position', 'f4', 2)]
+utype = [('color',    'f4', 4)]
+itype = np.uint32
+
+vertices = np.zeros(4, dtype=vtype)
+indices  = np.array([0,1,2,0,2,3], dtype=itype)
+
+vertex = """
+uniform sampler2D u_uniforms;
+uniform vec3 u_uniforms_shape;
+attribute vec2 position;
+attribute float a_index;
+void main() { gl_Position = vec4(position, a_index, 1.0); }
+"""
+
+fragment = """
+void main() { gl_FragColor = vec4(1.0); }
+"""
+
+
+class GPUCollectionDefault(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = backend.RecordingGL()
+        self.previous = backend.use(self.gl)
+        self.program = Program(vertex, fragment)
+
+    def tearDown(self):
+        backend.use(self.previous)
+
+    def uploads(self):
+        """ Recorded uploads as (name, offset, bytes) """
+
+        uploads = []
+        for name, args in self.gl.calls:
+            if name == 'glBufferSubData':
+                uploads.append((name, args[1], args[2]))
+            elif name == 'glTexSubImage2D':
+                uploads.append((name, (args[3], args[2]), args[4]*args[5]))
+        return uploads
+
+    def test_init(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C)
+        G.draw(self.program)
+        assert G.flush() == []
+        assert self.gl.count('glDrawElements') == 0
+
+    def test_texture_format(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C)
+        C.insert_many([0]*5, [vertices]*5, [indices]*5)
+        G.draw(self.program)
+        name, args = [call for call in self.gl.calls
+                      if call[0] == 'glTexImage2D'][0]
+        assert args[2] == gl.GL_RGBA32F
+
+    def test_flush_all(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C)
+        C.insert_many([0]*5, [vertices]*5, [indices]*5)
+        assert G.flush() == [(0, 5)]
+        assert G.vertices.size == 32
+        assert G.items.size == 32
+        assert G.indices.size == 32
+        assert G.flush() == []
+
+    def test_draw(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C)
+        C.insert_many([0]*5, [vertices]*5, [indices]*5)
+        G.draw(self.program)
+        name, args = [call for call in self.gl.calls
+                      if call[0] == 'glDrawElements'][0]
+        assert args[1] == 30
+        assert self.gl.count('glBufferData') == 3
+        assert self.program["u_uniforms_shape"].tolist() == [4096, 1, 1]
+
+    def test_flush_item(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C)
+        C.insert_many([0]*5, [vertices]*5, [indices]*5)
+        G.draw(self.program)
+        self.gl.reset()
+        C[3]["color"] = 1
+        G.draw(self.program)
+        uploads = sorted(self.uploads())
+        assert uploads == [('glBufferSubData', 48, 16),
+                           ('glBufferSubData', 72, 24),
+                           ('glBufferSubData', 96, 32),
+                           ('glTexSubImage2D', (0, 3), 1)]
+        self.gl.reset()
+        G.draw(self.program)
+        assert self.uploads() == []
+
+    def test_flush_delete(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C)
+        C.insert_many([0]*5, [vertices]*5, [indices]*5)
+        G.draw(self.program)
+        del C[3]
+        assert G.flush() == [(3, 4)]
+        del C[3]
+        assert G.flush() == []
+
+    def test_grow(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C)
+        C.insert_many([0]*5, [vertices]*5, [indices]*5)
+        G.draw(self.program)
+        self.gl.reset()
+        C.insert_many([0], [vertices], [indices])
+        assert G.flush() == [(0, 6)]
+        assert G.vertices.size == 32
+        assert G.indices.size == 64
+        G.draw(self.program)
+        assert self.gl.count('glBufferData') == 1
+        self.gl.reset()
+        C.append(vertices, indices)
+        assert G.flush() == [(6, 7)]
+        G.draw(self.program)
+        assert self.gl.count('glBufferData') == 0
+
+    def test_texture_width(self):
+        C = Collection(vtype, [('transform', 'f4', (4,4))])
+        self.assertRaises(ValueError, GPUCollection, C, width=2)
+        G = GPUCollection(C, width=4)
+        assert G.texture.shape == (1, 4, 4)
+
+    def test_texture_rows(self):
+        C = Collection(vtype, utype)
+        G = GPUCollection(C, width=4)
+        C.insert_many([0]*10, [vertices]*10, [indices]*10)
+        G.draw(self.program)
+        assert G.texture.shape == (4, 4, 4)
+        self.gl.reset()
+        U = np.zeros(1, C.uniforms.dtype)
+        C.delete_many([2])
+        C.insert_many([2], [vertices], [indices], U)
+        G.draw(self.program)
+        uploads = [upload for upload in self.uploads()
+                   if upload[0] == 'glTexSubImage2D']
+        assert sorted(uploads) == [('glTexSubImage2D', (0, 2), 2),
+                                   ('glTexSubImage2D', (1, 0), 4),
+                                   ('glTexSubImage2D', (2, 0), 2)]
+
+    def test_slots(self):
+        C = Collection(vtype, utype, mode="slots", slotsize=(4, 6))
+        G = GPUCollection(C)
+        C.append(np.zeros(40, vtype), indices, itemsize=4)
+        G.draw(self.program)
+        self.gl.reset()
+        del C[7]
+        C.append(vertices, indices)
+        assert G.flush() == [(7, 8)]
+        G.draw(self.program)
+        name, args = [call for call in self.gl.calls
+                      if call[0] == 'glDrawElements'][0]
+        assert args[1] == 60
+
+
+if __name__ == "__main__":
+    unittest.main()
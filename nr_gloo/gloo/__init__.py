@@ -4,6 +4,10 @@
 # Distributed under the terms of the new BSD License.
 # -----------------------------------------------------------------------------
 from program import Program
+from batch import BatchProgram
+from command import CommandList
 from texture import Texture1D, Texture2D
-from buffer import VertexBuffer, IndexBuffer
+from atlas import TextureAtlas
+from buffer import VertexBuffer, IndexBuffer, MappedVertexBuffer
+from pool import BufferPool
 from shader import VertexShader, FragmentShader
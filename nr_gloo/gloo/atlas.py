@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import numpy as np
+
+from debug import log
+from texture import Texture2D
+
+
+
+# ------------------------------------------------------ TextureAtlas class ---
+class TextureAtlas(object):
+    """
+    A texture atlas packs many small images (glyphs, dash patterns, sprites)
+    into a single 2D texture.
+
+    Each allocated region is a view on the texture such that writing into it
+    only uploads the corresponding rectangle::
+
+      atlas = TextureAtlas((1024,1024,4), np.uint8)
+      R = atlas.allocate((32,16))
+      R[...] = glyph
+      program['u_atlas'] = atlas.texture
+      u0, v0, u1, v1 = atlas.texcoords(R)
+
+    Regions are packed using a skyline (bottom-left) allocator. Freed regions
+    are kept in a free list (merged with their aligned neighbours) and reused
+    first. When the atlas is too fragmented, `defragment` packs all regions
+    again and updates them in place (regions stay valid).
+    """
+
+    def __init__(self, shape=(1024,1024,4), dtype=np.uint8):
+        """
+        Initialize the atlas
+
+        Parameters
+        ----------
+
+        shape : tuple of integers
+            Texture shape (height, width[, channels])
+
+        dtype : np.dtype
+            Texture data type
+        """
+
+        self._texture = Texture2D(np.zeros(shape, dtype=dtype))
+        self._height, self._width = shape[0], shape[1]
+
+        # Skyline segments (x, y, width) sorted by x
+        self._skyline = [(0, 0, self._width)]
+
+        # Free rectangles (y, x, height, width)
+        self._free = []
+
+        # Allocated regions
+        self._regions = []
+        self._used = 0
+
+
+    @property
+    def texture(self):
+        """ Atlas texture """
+
+        return self._texture
+
+
+    @property
+    def regions(self):
+        """ Allocated regions """
+
+        return list(self._regions)
+
+
+    @property
+    def utilisation(self):
+        """ Fraction of the texture that is allocated """
+
+        return self._used / float(self._width*self._height)
+
+
+    @property
+    def stats(self):
+        """ Atlas statistics """
+
+        top = max([y for x, y, width in self._skyline])
+        return { 'regions'     : len(self._regions),
+                 'free rects'  : len(self._free),
+                 'used'        : self._used,
+                 'height'      : top,
+                 'utilisation' : self.utilisation,
+                 'packing'     : self._used / float(max(top,1)*self._width) }
+
+
+    def texcoords(self, region):
+        """ Normalized texture coordinates (u0, v0, u1, v1) of a region """
+
+        y, x = region.offset[0], region.offset[1]
+        height, width = region.shape[0], region.shape[1]
+        return ( x/float(self._width), y/float(self._height),
+                (x+width)/float(self._width), (y+height)/float(self._height) )
+
+
+    def allocate(self, shape):
+        """ Allocate a region and return a (texture) view on it
+
+        Parameters
+        ----------
+
+        shape : tuple of integers
+            Region shape (height, width)
+        """
+
+        height, width = shape[0], shape[1]
+        if height <= 0 or width <= 0:
+            raise ValueError("Region shape must be positive")
+
+        rect = self._allocate_free(height, width)
+        if rect is None:
+            rect = self._allocate_skyline(height, width)
+        if rect is None:
+            raise ValueError("Texture atlas is full")
+
+        y, x = rect
+        region = self._texture[y:y+height, x:x+width]
+        self._regions.append(region)
+        self._used += height*width
+        return region
+
+
+    def free(self, region):
+        """ Free a region (its rectangle can be reused by other regions)
+
+        Parameters
+        ----------
+
+        region : Texture2D
+            Region as returned by allocate
+        """
+
+        if region not in self._regions:
+            raise ValueError("Region has not been allocated from this atlas")
+        self._regions.remove(region)
+        self._texture._views.remove(region)
+        region._valid = False
+        height, width = region.shape[0], region.shape[1]
+        self._used -= height*width
+        self._free_rect((region.offset[0], region.offset[1], height, width))
+
+
+    def defragment(self):
+        """ Pack all regions again (tallest first) and move their data
+
+        The new packing is planned first: if regions do not fit, a ValueError
+        is raised and the atlas is left untouched.
+        """
+
+        log("GPU: Defragmenting texture atlas")
+        regions = sorted(self._regions,
+                         key=lambda R: (R.shape[0], R.shape[1]), reverse=True)
+        skyline, free = self._skyline, self._free
+        self._skyline = [(0, 0, self._width)]
+        self._free = []
+        offsets = []
+        for R in regions:
+            rect = self._allocate_skyline(R.shape[0], R.shape[1])
+            if rect is None:
+                self._skyline, self._free = skyline, free
+                raise ValueError("Texture atlas cannot be defragmented")
+            offsets.append(rect)
+
+        data = [R.data.copy() for R in regions]
+        storage = self._texture.data
+        for R, Z, (y, x) in zip(regions, data, offsets):
+            height, width = R.shape[0], R.shape[1]
+            R._offset = (y, x, 0)
+            R._data = storage[y:y+height, x:x+width]
+            R._data[...] = Z
+
+        # Regions have moved, whole texture needs to be uploaded
+        self._texture.set_data(storage)
+
+
+    def _allocate_free(self, height, width):
+        """ Allocate from the smallest free rectangle that is large enough """
+
+        best = None
+        for i, (y, x, h, w) in enumerate(self._free):
+            if h >= height and w >= width:
+                if best is None or h*w < self._free[best][2]*self._free[best][3]:
+                    best = i
+        if best is None:
+            return None
+
+        # Split remaining space (guillotine) such that the longer leftover
+        # keeps the whole extent of the free rectangle
+        y, x, h, w = self._free.pop(best)
+        if w-width > h-height:
+            rects = [(y+height, x, h-height, w), (y, x+width, height, w-width)]
+        else:
+            rects = [(y, x+width, h, w-width), (y+height, x, h-height, width)]
+        for rect in rects:
+            if rect[2] > 0 and rect[3] > 0:
+                self._free.append(rect)
+        return y, x
+
+
+    def _allocate_skyline(self, height, width):
+        """ Allocate on the skyline (lowest top, then narrowest segment) """
+
+        best, best_y, best_top, best_width = None, 0, None, None
+        for i, (x, y, w) in enumerate(self._skyline):
+            y = self._fit(i, height, width)
+            if y is None:
+                continue
+            if best is None or y+height < best_top or \
+               (y+height == best_top and w < best_width):
+                best, best_y, best_top, best_width = i, y, y+height, w
+        if best is None:
+            return None
+
+        x = self._skyline[best][0]
+        self._skyline.insert(best, (x, best_y+height, width))
+
+        # Shrink or remove segments covered by the new one
+        i = best+1
+        while i < len(self._skyline):
+            sx, sy, sw = self._skyline[i]
+            if sx >= x+width:
+                break
+            if sx+sw <= x+width:
+                del self._skyline[i]
+            else:
+                self._skyline[i] = (x+width, sy, sx+sw-x-width)
+                break
+
+        # Merge segments with same height
+        i = 0
+        while i < len(self._skyline)-1:
+            x0, y0, w0 = self._skyline[i]
+            x1, y1, w1 = self._skyline[i+1]
+            if y0 == y1:
+                self._skyline[i] = (x0, y0, w0+w1)
+                del self._skyline[i+1]
+            else:
+                i += 1
+        return best_y, x
+
+
+    def _fit(self, index, height, width):
+        """ Lowest y at which a region can start at skyline segment index """
+
+        x = self._skyline[index][0]
+        if x+width > self._width:
+            return None
+        y, remaining = 0, width
+        while remaining > 0:
+            sx, sy, sw = self._skyline[index]
+            y = max(y, sy)
+            if y+height > self._height:
+                return None
+            remaining -= sw if sx >= x else sw - (x - sx)
+            index += 1
+        return y
+
+
+    def _free_rect(self, rect):
+        """ Add a free rectangle, merging it with its aligned neighbours """
+
+        merged = True
+        while merged:
+            merged = False
+            y, x, h, w = rect
+            for i, (fy, fx, fh, fw) in enumerate(self._free):
+                if fy == y and fh == h and (fx+fw == x or x+w == fx):
+                    rect = (y, min(x, fx), h, w+fw)
+                elif fx == x and fw == w and (fy+fh == y or y+h == fy):
+                    rect = (min(y, fy), x, h+fh, w)
+                else:
+                    continue
+                del self._free[i]
+                merged = True
+                break
+        self._free.append(rect)
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+GL backends.
+
+Every gloo module issues GL calls through its module level `gl` name (the
+OpenGL.GL module by default). A backend is any object giving the GL constants
+and the gl* functions used by gloo and it is installed in every module using
+`use`::
+
+  import backend
+  gl = backend.NullGL()
+  backend.use(gl)
+  ...
+  with gl.frame():
+      program.draw(gl.GL_TRIANGLES)
+  print gl.frames[-1]      # {'time': ..., 'calls': ..., 'draws': ..., 'bytes': ...}
+  backend.use(None)        # back to OpenGL.GL
+
+The null backend does not need any GL context (nor any GPU): calls are counted
+(with the number of bytes they transfer) and never issued, objects get fake
+handles, shaders always compile and programs always link, program queries
+(active uniforms and attributes, locations) being answered from the shader
+sources. Bindings are tracked such that the state debug mode can be used. The
+recording backend also keeps the list of calls with their arguments.
+"""
+import time
+from contextlib import contextmanager
+import OpenGL.GL as GL
+
+import glsl
+import cache
+import buffer
+import shader
+import program
+import texture
+import variable
+import pool
+import batch
+import state
+
+
+# Modules issuing GL calls
+_modules = cache, buffer, shader, program, texture, variable, pool, batch, state
+
+# GL types of GLSL types
+_types = { 'float'     : GL.GL_FLOAT,
+           'vec2'      : GL.GL_FLOAT_VEC2,
+           'vec3'      : GL.GL_FLOAT_VEC3,
+           'vec4'      : GL.GL_FLOAT_VEC4,
+           'int'       : GL.GL_INT,
+           'bool'      : GL.GL_BOOL,
+           'mat2'      : GL.GL_FLOAT_MAT2,
+           'mat3'      : GL.GL_FLOAT_MAT3,
+           'mat4'      : GL.GL_FLOAT_MAT4,
+           'sampler1D' : GL.GL_SAMPLER_1D,
+           'sampler2D' : GL.GL_SAMPLER_2D }
+
+# Index of the data argument of calls transferring data
+_transfers = { 'glBufferData'    : 2,
+               'glBufferSubData' : 3,
+               'glTexImage1D'    : 7,
+               'glTexImage2D'    : 8,
+               'glTexSubImage1D' : 6,
+               'glTexSubImage2D' : 8 }
+
+# Binding queries (glGetIntegerv)
+_queries = dict([(pname, target)
+                 for target, pname in state.State._queries.items()])
+_queries[GL.GL_CURRENT_PROGRAM] = 'program'
+_queries[GL.GL_VERTEX_ARRAY_BINDING] = 'vertex array'
+
+
+
+# --------------------------------------------------------------------- use ---
+def use(backend=None):
+    """
+    Use a backend for all GL calls (OpenGL.GL if None) and return the
+    previous one. This is a context change: GL state is reset, compiled
+    shaders are forgotten and GL capabilities will be checked again. Objects
+    created with a backend must not be used with another one.
+    """
+
+    previous = program.gl
+    for module in _modules:
+        module.gl = backend or GL
+    shader.cache.clear()
+    program.cache.clear()
+    program.Program._vao_support = None
+    program.Program._instancing_support = None
+    program.Program._multidraw_support = None
+    state.state.reset()
+    return previous
+
+
+
+# ---------------------------------------------------------- NullGL class ---
+class NullGL(object):
+    """
+    Null GL backend counting calls (and transferred bytes) without issuing
+    them.
+
+    A new backend stands for a new context: the GL state shadow is reset.
+    """
+
+    def __init__(self):
+        state.state.reset()
+        self.counts = {}
+        self.nbytes = {}
+        self.frames = []
+        self._record = None
+        self._handle = 0
+        self._shaders = {}
+        self._programs = {}
+        self._bindings = {}
+        self._elements = {}
+        self._unit = 0
+
+
+    def __getattr__(self, name):
+        value = getattr(GL, name)
+        if not name.startswith('gl') or not callable(value):
+            return value
+        function = self._function(name)
+        self.__dict__[name] = function
+        return function
+
+
+    def _function(self, name):
+        """ Counting (and recording) stand-in for a GL function """
+
+        counts, nbytes, record = self.counts, self.nbytes, self._record
+        handler = getattr(self, '_' + name, None)
+        if handler is None and (name.startswith('glGen') or
+                                name.startswith('glCreate') or
+                                name == 'glFenceSync'):
+            handler = self._generate
+        index = _transfers.get(name)
+        if index is None and name.startswith('glUniform') and name[-1] == 'v':
+            index = -1
+
+        def call(*args):
+            counts[name] = counts.get(name, 0) + 1
+            if index is not None:
+                nbytes[name] = nbytes.get(name, 0) + getattr(args[index], 'nbytes', 0)
+            if record is not None:
+                record((name, args))
+            if handler is not None:
+                return handler(*args)
+        call.__name__ = name
+        return call
+
+
+    @property
+    def stats(self):
+        """ Number of calls, draw calls and transferred bytes """
+
+        draws = sum([count for name, count in self.counts.items()
+                     if name.startswith(('glDraw', 'glMultiDraw'))])
+        return { 'calls' : sum(self.counts.values()),
+                 'draws' : draws,
+                 'bytes' : sum(self.nbytes.values()) }
+
+
+    @contextmanager
+    def frame(self):
+        """
+        Time a frame (Python overhead since calls are not issued) and append
+        its time, calls, draw calls and transferred bytes to frames
+        """
+
+        before = self.stats
+        t0 = time.time()
+        yield
+        elapsed = time.time() - t0
+        after = self.stats
+        frame = dict([(key, after[key] - before[key]) for key in after])
+        frame['time'] = elapsed
+        self.frames.append(frame)
+
+
+    def reset(self):
+        """ Forget about counts and frames """
+
+        self.counts.clear()
+        self.nbytes.clear()
+        self.frames = []
+
+
+    # --- Objects -------------------------------------------------------------
+    def _generate(self, *args):
+        self._handle += 1
+        return self._handle
+
+    def _glCreateShader(self, target):
+        handle = self._generate()
+        self._shaders[handle] = [target, ""]
+        return handle
+
+    def _glShaderSource(self, handle, code):
+        if not isinstance(code, basestring):
+            code = "".join(code)
+        self._shaders.setdefault(handle, [None, ""])[1] = code
+
+    def _glGetShaderiv(self, handle, pname):
+        return 1 if pname == GL.GL_COMPILE_STATUS else 0
+
+    def _glGetShaderInfoLog(self, handle):
+        return ""
+
+    def _glDeleteShader(self, handle):
+        self._shaders.pop(handle, None)
+
+    def _glCreateProgram(self):
+        handle = self._generate()
+        self._program(handle)
+        return handle
+
+    def _program(self, handle):
+        """ Program of given handle (empty if unknown) """
+
+        if handle not in self._programs:
+            self._programs[handle] = { 'shaders'    : [],
+                                       'uniforms'   : [],
+                                       'attributes' : [],
+                                       'locations'  : {} }
+        return self._programs[handle]
+
+    def _glAttachShader(self, handle, shader):
+        self._program(handle)['shaders'].append(shader)
+
+    def _glDetachShader(self, handle, shader):
+        if shader in self._program(handle)['shaders']:
+            self._program(handle)['shaders'].remove(shader)
+
+    def _glGetAttachedShaders(self, handle):
+        return list(self._program(handle)['shaders'])
+
+    def _glDeleteProgram(self, handle):
+        self._programs.pop(handle, None)
+
+    def _glGetProgramInfoLog(self, handle):
+        return ""
+
+
+    # --- Program queries -----------------------------------------------------
+    def _glLinkProgram(self, handle):
+        """ Active uniforms and attributes are the declared ones """
+
+        program = self._program(handle)
+        uniforms, attributes, locations = [], [], {}
+        for shader in program['shaders']:
+            target, code = self._shaders.get(shader, (None, ""))
+            declarations = glsl.parse(code)
+            variables = [(uniforms, declarations['uniforms'])]
+            if target == GL.GL_VERTEX_SHADER:
+                variables.append((attributes, declarations['attributes']))
+            for items, declared in variables:
+                for name, vtype, size in declared:
+                    if vtype not in _types or name in [item[0] for item in items]:
+                        continue
+                    if size is None:
+                        items.append((name, 1, _types[vtype]))
+                    else:
+                        items.append(('%s[0]' % name, size, _types[vtype]))
+        for items in uniforms, attributes:
+            for name, size, gtype in items:
+                if size > 1 or name.endswith('[0]'):
+                    name = name[:-3]
+                    for i in range(size):
+                        locations['%s[%d]' % (name, i)] = len(locations)
+                locations.setdefault(name, len(locations))
+        program['uniforms'] = uniforms
+        program['attributes'] = attributes
+        program['locations'] = locations
+
+    def _glGetProgramiv(self, handle, pname):
+        program = self._program(handle)
+        return { GL.GL_LINK_STATUS       : 1,
+                 GL.GL_ACTIVE_UNIFORMS   : len(program['uniforms']),
+                 GL.GL_ACTIVE_ATTRIBUTES : len(program['attributes'])
+               }.get(pname, 0)
+
+    def _glGetActiveUniform(self, handle, index):
+        return self._program(handle)['uniforms'][index]
+
+    def _glGetActiveAttrib(self, handle, index):
+        return self._program(handle)['attributes'][index]
+
+    def _glGetUniformLocation(self, handle, name):
+        return self._program(handle)['locations'].get(name, -1)
+
+    def _glGetAttribLocation(self, handle, name):
+        return self._program(handle)['locations'].get(name, -1)
+
+
+    # --- Bindings ------------------------------------------------------------
+    def _glUseProgram(self, handle):
+        self._bindings['program'] = handle
+
+    def _glBindBuffer(self, target, handle):
+        self._bindings[target] = handle
+
+    def _glBindVertexArray(self, handle):
+        # Element array binding is part of vertex array state
+        target = GL.GL_ELEMENT_ARRAY_BUFFER
+        self._elements[self._bindings.get('vertex array', 0)] = \
+            self._bindings.get(target, 0)
+        self._bindings[target] = self._elements.get(handle, 0)
+        self._bindings['vertex array'] = handle
+
+    def _glActiveTexture(self, unit):
+        self._unit = unit - GL.GL_TEXTURE0
+
+    def _glBindTexture(self, target, handle):
+        self._bindings[(self._unit, target)] = handle
+
+    def _glGetIntegerv(self, pname):
+        if pname == GL.GL_ACTIVE_TEXTURE:
+            return GL.GL_TEXTURE0 + self._unit
+        key = _queries.get(pname)
+        if key in (GL.GL_TEXTURE_1D, GL.GL_TEXTURE_2D):
+            key = (self._unit, key)
+        return self._bindings.get(key, 0)
+
+    def _glClientWaitSync(self, fence, flags, timeout):
+        return GL.GL_ALREADY_SIGNALED
+
+
+
+# ----------------------------------------------------- RecordingGL class ---
+class RecordingGL(NullGL):
+    """
+    Recording GL backend keeping the list of (name, args) of calls.
+    """
+
+    def __init__(self):
+        NullGL.__init__(self)
+        self.calls = []
+        self._record = self.calls.append
+
+
+    def count(self, name=None):
+        """ Number of recorded calls (optionally for a given function) """
+
+        if name is None:
+            return len(self.calls)
+        return self.counts.get(name, 0)
+
+
+    def reset(self):
+        """ Forget about recorded calls, counts and frames """
+
+        NullGL.reset(self)
+        del self.calls[:]
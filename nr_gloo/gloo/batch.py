@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import re
+import numpy as np
+import OpenGL.GL as gl
+
+import glsl
+from debug import log
+from program import Program
+from texture import Texture2D
+from shader import VertexShader, FragmentShader
+
+
+# Uniform types that can be batched (GLSL type -> number of floats)
+_sizes = { 'float' : 1, 'vec2' : 2, 'vec3' : 3, 'vec4' : 4,
+           'mat2'  : 4, 'mat3' : 9, 'mat4' : 16 }
+
+# Main function
+_main = re.compile(r'void\s+main\s*\(\s*(void)?\s*\)')
+
+# Version directive (must come first)
+_version = re.compile(r'^\s*#version[^\n]*\n')
+
+
+
+# ----------------------------------------------------------------- declare ---
+def declare(code, fields, qualifier=None):
+    """
+    Remove the declarations of batched uniforms from code (or declare them
+    with another qualifier). Declaration spans come from the GLSL parser such
+    that qualified (e.g. highp) and multiple declarations are handled, other
+    uniforms of a multiple declaration being declared again.
+
+    Parameters
+    ----------
+
+    code : str
+        GLSL source code
+
+    fields : list of (name, gtype)
+        Batched uniforms
+
+    qualifier : str
+        Qualifier of batched uniforms (None means they are removed)
+
+    Returns
+    -------
+
+    Rewritten code and the names of batched uniforms that were declared
+    """
+
+    names = [name for name, gtype in fields]
+    chunks, declared, last = [], [], 0
+    for start, stop in glsl.parse(code)['spans']:
+        uniforms = glsl.parse(code[start:stop])['uniforms']
+        batched = [(name, vtype) for name, vtype, size in uniforms
+                   if name in names and size is None]
+        if not batched:
+            continue
+        statements = []
+        if qualifier is not None:
+            statements += ['%s %s %s;' % (qualifier, vtype, name)
+                           for name, vtype in batched]
+        for name, vtype, size in uniforms:
+            if (name, vtype) in batched:
+                continue
+            if size is not None:
+                name = '%s[%d]' % (name, size)
+            statements.append('uniform %s %s;' % (vtype, name))
+        chunks += [code[last:start], ' '.join(statements)]
+        declared += [name for name, vtype in batched]
+        last = stop
+    chunks.append(code[last:])
+    return ''.join(chunks), declared
+
+
+
+# --------------------------------------------------------------- fetchcode ---
+def fetchcode(fields, texels, varyings=()):
+    """
+    Generate the GLSL code fetching batched uniforms from a texture.
+
+    Instances are stored one after the other in texture rows, each instance
+    using `texels` consecutive RGBA texels holding the floats of its uniforms
+    (in order, without padding).
+
+    u_batch : sampler2D
+        Texture holding the uniforms of all instances
+
+    u_batch_shape : vec3
+        Texture shape (rows, columns) and number of texels per instance
+
+    a_batch : float
+        Index of the instance (row of the python-side uniform array)
+
+    Parameters
+    ----------
+
+    fields : list of (name, gtype)
+        Batched uniforms (GLSL type names)
+
+    texels : int
+        Number of texels per instance
+
+    varyings : list of str
+        Uniforms that are used by fragment shaders (declared as varyings)
+    """
+
+    code = "\n// Batched uniforms (see gloo/batch.py)\n"
+    code += "uniform sampler2D u_batch;\n"
+    code += "uniform vec3 u_batch_shape;\n"
+    code += "attribute float a_batch;\n"
+    for name, gtype in fields:
+        if name in varyings:
+            code += "varying %s %s;\n" % (gtype, name)
+        else:
+            code += "%s %s;\n" % (gtype, name)
+
+    code += """
+void fetch_batch(void)
+{
+    float count = floor(u_batch_shape.y / u_batch_shape.z);
+    float row   = floor((a_batch + 0.5) / count);
+    float col   = (a_batch - row*count) * u_batch_shape.z;
+    vec2 size   = vec2(1.0/u_batch_shape.y, 1.0/u_batch_shape.x);
+    vec2 uv     = (vec2(col, row) + 0.5) * size;
+"""
+    for i in range(texels):
+        code += "    vec4 t%d = texture2D(u_batch, uv + vec2(%d.0*size.x, 0.0));\n" % (i,i)
+
+    offset = 0
+    for name, gtype in fields:
+        size = _sizes[gtype]
+
+        # Group consecutive components from the same texel
+        groups = []
+        for i in range(offset, offset+size):
+            texel, component = i // 4, "xyzw"[i % 4]
+            if groups and groups[-1][0] == texel:
+                groups[-1][1] += component
+            else:
+                groups.append([texel, component])
+        offset += size
+        args = ["t%d.%s" % (texel, components) for texel, components in groups]
+        if len(args) == 1 and not gtype.startswith('mat'):
+            code += "    %s = %s;\n" % (name, args[0])
+        else:
+            code += "    %s = %s(%s);\n" % (name, gtype, ", ".join(args))
+    code += "}\n"
+    return code
+
+
+
+# ------------------------------------------------------ BatchProgram class ---
+class BatchProgram(Program):
+    """
+    A batch program draws many logical instances (objects) at once, each of
+    them having its own uniforms.
+
+    Uniforms declared in the vertex shader (or the given ones) are removed from
+    the shader and their values for all instances are packed into a float
+    texture. The GLSL code fetching them (using the `a_batch` attribute giving
+    the instance index of each vertex) is generated and called before `main`.
+    Batched uniforms that are also used by fragment shaders are passed as
+    varyings::
+
+      program = BatchProgram(vertex, fragment, batch=10000)
+      program.bind(vertices)              # vertices have an 'a_batch' field
+      program['u_color'] = colors         # (10000,4) colors
+      program['u_model', 10] = model      # model matrix of instance 10
+      program.draw(gl.GL_TRIANGLES, indices)
+
+    Only modified instances are uploaded (rows of the texture).
+    """
+
+    # Maximum number of texels per texture row
+    _width = 1024
+
+
+    def __init__(self, verts=[], frags=[], batch=1, uniforms=None,
+                 count=0, vao=True):
+        """
+        Initialize the program
+
+        Parameters
+        ----------
+
+        verts : list of vertex shaders
+            Vertex shaders to be used by this program
+
+        frags : list of fragment shaders
+            Fragment shaders to be used by this program
+
+        batch : int
+            Number of instances
+
+        uniforms : list of str
+            Name of the uniforms to be batched (default is all float uniforms
+            declared in vertex shaders)
+
+        count : int
+            Number of vertices this program will use
+
+        vao : bool
+            Whether to use a vertex array object (if supported)
+        """
+
+        if batch < 1:
+            raise ValueError("Batch size must be strictly positive")
+
+        verts = [self._code(shader) for shader in self._list(verts)]
+        frags = [self._code(shader) for shader in self._list(frags)]
+
+        # Find batched uniforms
+        fields = []
+        for code in verts:
+            for name, gtype, size in glsl.parse(code)['uniforms']:
+                if size is not None or name in [field[0] for field in fields]:
+                    continue
+                if uniforms is None and gtype in _sizes.keys():
+                    fields.append((name, gtype))
+                elif uniforms is not None and name in uniforms:
+                    if gtype not in _sizes.keys():
+                        raise ValueError("Cannot batch uniform %s" % name)
+                    fields.append((name, gtype))
+        if uniforms is not None:
+            missing = set(uniforms) - set([name for name, gtype in fields])
+            if missing:
+                raise ValueError("Unknown uniform(s) %s" % ", ".join(missing))
+        if not fields:
+            raise ValueError("No uniform to be batched")
+
+        # Instance layout
+        floats = sum([_sizes[gtype] for name, gtype in fields])
+        texels = (floats + 3) // 4
+        dtype = [(name, np.float32, _sizes[gtype]) for name, gtype in fields]
+        if texels*4 > floats:
+            dtype.append(('__pad__', np.float32, texels*4 - floats))
+        per_row = max(1, min(batch, BatchProgram._width // texels))
+        rows = (batch + per_row - 1) // per_row
+        shape = rows, per_row*texels, 4
+
+        # Rewrite shaders
+        varyings = []
+        for i, code in enumerate(frags):
+            frags[i], declared = declare(code, fields, 'varying')
+            varyings += [name for name in declared if name not in varyings]
+        header = fetchcode(fields, texels, varyings)
+        for i, code in enumerate(verts):
+            code, declared = declare(code, fields)
+            if _main.search(code):
+                code = _main.sub('void _batch_main(void)', code)
+                match = _version.match(code)
+                version = match.group(0) if match else ""
+                code = version + header + code[len(version):] + \
+                       "\nvoid main(void)\n{\n" \
+                       "    fetch_batch();\n    _batch_main();\n}\n"
+            verts[i] = code
+
+        Program.__init__(self, verts, frags, count=count, vao=vao)
+
+        self._batch = batch
+        self._fields = dict([(name, _sizes[gtype]) for name, gtype in fields])
+        self._per_row = per_row
+        self._texture = Texture2D(np.zeros(shape, dtype=np.float32))
+        self._texture._internalformat = gl.GL_RGBA32F
+        self._storage = self._texture.data
+        self._instances = self._storage.reshape(-1).view(dtype)[:batch]
+        log("GPU: Batching %d uniform(s) of %d instances (%dx%d texture)"
+            % (len(fields), batch, shape[0], shape[1]))
+
+        Program.__setitem__(self, 'u_batch', self._texture)
+        Program.__setitem__(self, 'u_batch_shape', (rows, shape[1], texels))
+
+
+    def _list(self, shaders):
+        """ List of shaders """
+
+        if type(shaders) in [str, VertexShader, FragmentShader]:
+            return [shaders]
+        return list(shaders)
+
+
+    def _code(self, shader):
+        """ Code of a shader (or of a string) """
+
+        if isinstance(shader, (VertexShader, FragmentShader)):
+            return shader.code
+        return shader
+
+
+    @property
+    def batch(self):
+        """ Number of instances """
+
+        return self._batch
+
+
+    @property
+    def texture(self):
+        """ Texture holding batched uniforms """
+
+        return self._texture
+
+
+    def __setitem__(self, name, data):
+        """
+        Set a uniform or an attribute. Batched uniforms can be set for all
+        instances (name) or for some of them (name, index) where index is an
+        integer, a slice or an array of indices.
+        """
+
+        index = slice(None)
+        if isinstance(name, tuple):
+            name, index = name
+        if name not in self._fields:
+            Program.__setitem__(self, name, data)
+            return
+
+        field = self._instances[name]
+        data = np.asarray(data, dtype=np.float32).ravel()
+        if data.size == self._fields[name]:
+            field[index] = data
+        else:
+            field[index] = data.reshape(field[index].shape)
+
+        # Rows to be uploaded
+        if isinstance(index, (int, np.integer)):
+            start = stop = index % self._batch
+        else:
+            if isinstance(index, slice):
+                indices = np.arange(*index.indices(self._batch))
+            else:
+                indices = np.arange(self._batch)[index]
+            if not len(indices):
+                return
+            start, stop = indices.min(), indices.max()
+        start, stop = start // self._per_row, stop // self._per_row + 1
+        self._texture.set_data(self._storage[start:stop], offset=(start,0,0))
+
+
+    def __getitem__(self, name):
+        """ Uniform or attribute (batched uniforms are read-only) """
+
+        if name in self._fields:
+            field = self._instances[name]
+            field.flags.writeable = False
+            return field
+        return Program.__getitem__(self, name)
@@ -3,13 +3,91 @@
 # Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
 # Distributed under the terms of the new BSD License.
 # -----------------------------------------------------------------------------
+import bisect
 import numpy as np
+from collections import OrderedDict
 import OpenGL.GL as gl
 
 from debug import log
+from state import state
+from memory import registry
 from globject import GLObject
 
 
+
+# ------------------------------------------------------------------- array ---
+def array(data, dtype=None, copy=False):
+    """
+    Same as np.array(data, dtype=dtype, copy=copy, subok=True) but keeps track
+    of actual copies (Buffer._copycount and Buffer._copybytes) such that
+    hidden copies can be detected.
+    """
+
+    result = np.array(data, dtype=dtype, copy=copy, subok=True)
+    if not isinstance(data, np.ndarray) or not np.may_share_memory(data, result):
+        Buffer._copycount += 1
+        Buffer._copybytes += result.nbytes
+    return result
+
+
+
+# ---------------------------------------------------------------- coalesce ---
+def coalesce(pending):
+    """
+    Merge pending (data, nbytes, offset) writes into contiguous intervals.
+
+    Writes are walked from the most recent to the oldest such that any write
+    fully covered by later writes can be dropped. Overlapping and adjacent
+    writes are then gathered into the same interval.
+
+    Parameters
+    ----------
+
+    pending : list of (data, nbytes, offset)
+        Pending writes, oldest first
+
+    Returns
+    -------
+
+    A list of (start, stop, writes) sorted by start where writes is the list
+    of (data, nbytes, offset) falling into [start,stop), oldest first.
+    """
+
+    starts, stops = [], []
+    kept = []
+    for index in range(len(pending)-1, -1, -1):
+        data, nbytes, offset = pending[index]
+        if nbytes <= 0:
+            continue
+        start, stop = offset, offset+nbytes
+
+        # Check if this write is hidden by later writes
+        i = bisect.bisect_right(starts, start) - 1
+        if i >= 0 and stops[i] >= stop:
+            continue
+        kept.append(index)
+
+        # Insert [start,stop) and merge it with overlapping/adjacent intervals
+        if i >= 0 and stops[i] >= start:
+            start = starts[i]
+        else:
+            i += 1
+        j = i
+        while j < len(starts) and starts[j] <= stop:
+            stop = max(stop, stops[j])
+            j += 1
+        starts[i:j] = [start]
+        stops[i:j] = [stop]
+
+    intervals = [(start, stop, []) for start, stop in zip(starts, stops)]
+    for index in reversed(kept):
+        data, nbytes, offset = pending[index]
+        i = bisect.bisect_right(starts, offset) - 1
+        intervals[i][2].append(pending[index])
+    return intervals
+
+
+
 # ------------------------------------------------------------ Buffer class ---
 class Buffer(GLObject):
     """
@@ -22,9 +100,23 @@ class Buffer(GLObject):
     The `set_data` is a deferred operation: you can call it even if an OpenGL
     context is not available. The `update` function is responsible to upload
     pending data to GPU memory and requires an active GL context.
+
+    A 'stream' buffer is meant to be entirely rewritten at each frame. To
+    avoid waiting for the GPU to be done with previous content, new content
+    is either written to a new region of a ring of regions (regions > 1) or
+    to a new storage, the previous one being orphaned (regions = 1).
     """
 
-    def __init__(self, data=None, target=gl.GL_ARRAY_BUFFER, nbytes=0, resizeable=True):
+    _usages = { 'static'  : gl.GL_STATIC_DRAW,
+                'dynamic' : gl.GL_DYNAMIC_DRAW,
+                'stream'  : gl.GL_STREAM_DRAW }
+
+    # Number of copies (and copied bytes) made by buffers (see `array`)
+    _copycount = 0
+    _copybytes = 0
+
+    def __init__(self, data=None, target=gl.GL_ARRAY_BUFFER, nbytes=0, resizeable=True,
+                 usage='dynamic', regions=1):
         """ Initialize buffer
 
         Parameters
@@ -41,6 +133,12 @@ class Buffer(GLObject):
 
         resizeable : boolean
             Indicates whether buffer is resizeable
+
+        usage : str
+            'static', 'dynamic' or 'stream'
+
+        regions : int
+            Number of regions used in turn by a 'stream' buffer
         """
 
         GLObject.__init__(self)
@@ -49,6 +147,9 @@ class Buffer(GLObject):
         self._views = []
         self._valid = True
 
+        # Number of times the buffer has been created on GPU
+        self._generation = 0
+
         # Store and check target
         if target not in (gl.GL_ARRAY_BUFFER, gl.GL_ELEMENT_ARRAY_BUFFER):
             raise ValueError("Invalid target for buffer object")
@@ -58,14 +159,32 @@ class Buffer(GLObject):
         self._nbytes = nbytes
 
         # Buffer usage (GL_STATIC_DRAW, G_STREAM_DRAW or GL_DYNAMIC_DRAW)
-        self._usage = gl.GL_DYNAMIC_DRAW
+        if usage not in Buffer._usages.keys():
+            raise ValueError("Invalid usage for buffer object")
+        self._usage = Buffer._usages[usage]
+
+        # Ring of regions (stream buffer only), current region is the last
+        # one such that first upload goes to region 0
+        if regions < 1 or (regions > 1 and usage != 'stream'):
+            raise ValueError("Invalid number of regions for buffer object")
+        self._regions = regions
+        self._region = regions-1
+
+        # Dirty fraction above which pending writes are uploaded at once
+        # (glBufferData) instead of using several glBufferSubData. This is
+        # only possible if whole buffer content is known (CPU storage).
+        self._full_upload = 0.5
+
+        # Maximum gap (bytes) between two dirty intervals for them to be
+        # uploaded at once when the buffer content is known (CPU storage).
+        self._merge_gap = 4096
 
         # Set data
         self._pending_data = []
         if data is not None:
-            data = np.array(data,copy=True)
+            data = array(data,copy=True)
             self._nbytes = data.nbytes
-            self.set_data(data,copy=True)
+            self.set_data(data,copy=False)
 
 
     @property
@@ -75,6 +194,20 @@ class Buffer(GLObject):
         return self._nbytes
 
 
+    @property
+    def base(self):
+        """ Buffer base (a generic buffer is never a view) """
+
+        return None
+
+
+    @property
+    def gpu_offset(self):
+        """ Byte offset of current buffer content in GPU memory """
+
+        return self._region * self._nbytes
+
+
     def set_data(self, data, offset=0, copy=False):
         """ Set data (deferred operation)
 
@@ -94,9 +227,9 @@ class Buffer(GLObject):
         """
 
         if not data.flags["C_CONTIGUOUS"]:
-            data = np.array(data,copy=True)
+            data = array(data,copy=True)
         else:
-            data = np.array(data,copy=copy)
+            data = array(data,copy=copy)
         nbytes = data.nbytes
 
         if offset < 0:
@@ -128,6 +261,7 @@ class Buffer(GLObject):
 
         log("GPU: Creating buffer")
         self._handle = gl.glGenBuffers(1)
+        self._generation += 1
 
 
     def _delete(self):
@@ -135,13 +269,17 @@ class Buffer(GLObject):
 
         log("GPU: Deleting buffer")
         gl.glDeleteBuffers(1 , [self._handle])
+        state.delete_buffers([self._handle])
+        registry.release(self)
 
 
     def _resize(self):
         """ """
 
         log("GPU: Resizing buffer(%d bytes)"% self._nbytes)
-        gl.glBufferData(self._target, self._nbytes, None, self._usage)
+        registry.allocate(self, self._regions*self._nbytes)
+        gl.glBufferData(self._target, self._regions*self._nbytes, None, self._usage)
+        self._region = self._regions-1
         self._need_resize = False
 
 
@@ -149,39 +287,124 @@ class Buffer(GLObject):
         """ Bind the buffer to some target """
 
         log("GPU: Activating buffer")
-        gl.glBindBuffer(self._target, self._handle)
+        if state.bind_buffer(self._target, self._handle):
+            gl.glBindBuffer(self._target, self._handle)
 
 
     def _deactivate(self):
         """ Unbind the current bound buffer """
 
         log("GPU: Deactivating buffer")
-        gl.glBindBuffer(self._target, 0)
+        if state.unbind_buffer(self._target):
+            gl.glBindBuffer(self._target, 0)
+
+
+    def _storage(self, pending):
+        """ CPU storage holding the whole content of the buffer (if any). """
+
+        return None
 
 
     def _update(self):
-        """ Upload all pending data to GPU. """
+        """ Upload all pending data to GPU.
+
+        Pending writes are first coalesced into a minimal set of contiguous
+        intervals such that each interval is uploaded using a single
+        glBufferSubData. If the whole buffer needs to be uploaded (or a large
+        enough part of it and buffer content is known), a single glBufferData
+        is issued instead.
+
+        A 'stream' buffer with known content is always entirely uploaded,
+        either in the next region of the ring or using glBufferData (which
+        orphans the previous storage).
+        """
 
         if self.base is not None:
             return
 
+        pending, self._pending_data = self._pending_data, []
+        log("GPU: Updating buffer (%d pending operation(s))" % len(pending))
+
+        storage = self._storage(pending)
+        intervals = coalesce(pending)
+
+        # When content is known, close intervals are merged since it is
+        # cheaper to upload a few unchanged bytes than to issue a new call.
+        if storage is not None and len(intervals) > 1:
+            merged = intervals[:1]
+            for start, stop, writes in intervals[1:]:
+                if start - merged[-1][1] <= self._merge_gap:
+                    merged[-1] = merged[-1][0], stop, merged[-1][2]+writes
+                else:
+                    merged.append((start, stop, writes))
+            intervals = merged
+
+        dirty = sum([stop-start for start, stop, _ in intervals])
+
+        # Whole buffer is dirty or dirty enough and we know its content
+        data = None
+        if self._nbytes > 0 and dirty > 0:
+            if storage is not None and dirty == self._nbytes:
+                data = storage
+            elif dirty == self._nbytes:
+                data = self._gather(*intervals[0])
+            elif storage is not None and (self._usage == gl.GL_STREAM_DRAW or
+                                          dirty >= self._full_upload*self._nbytes):
+                data = storage
+
+        if data is not None:
+            log("GPU: Uploading whole buffer (%d bytes)" % self._nbytes)
+            if self._regions > 1:
+                if self._need_resize:
+                    self._resize()
+                self._region = (self._region+1) % self._regions
+                gl.glBufferSubData(self._target, self.gpu_offset, self._nbytes, data)
+            else:
+                if self._need_resize:
+                    registry.allocate(self, self._nbytes)
+                gl.glBufferData(self._target, self._nbytes, data, self._usage)
+                self._need_resize = False
+            return
+
         if self._need_resize:
             self._resize()
             self._need_resize = False
 
-        log("GPU: Updating buffer (%d pending operation(s))" % len(self._pending_data))
-        while self._pending_data:
-            data, nbytes, offset = self._pending_data.pop(0)
-            gl.glBufferSubData(self._target, offset, nbytes, data)
+        for start, stop, writes in intervals:
+            if storage is not None:
+                data = storage[start:stop]
+            else:
+                data = self._gather(start, stop, writes)
+            gl.glBufferSubData(self._target, self.gpu_offset+start, stop-start, data)
+
+
+    def _gather(self, start, stop, writes):
+        """ Gather writes (oldest first) into a single [start,stop) chunk """
+
+        if len(writes) == 1 and writes[0][1] == stop-start:
+            return writes[0][0]
+        chunk = np.empty(stop-start, dtype=np.uint8)
+        for data, nbytes, offset in writes:
+            chunk[offset-start:offset-start+nbytes] = data.reshape(-1).view(np.uint8)
+        return chunk
 
 
 
 # -------------------------------------------------------- DataBuffer class ---
 class DataBuffer(Buffer):
-    """ GPU data buffer """
+    """
+    GPU data buffer
+
+    When created from data with CPU storage (store=True, copy=False), data is
+    used as CPU storage without any copy provided it is C-contiguous (and a
+    np.memmap stays a np.memmap). Views on a buffer (fields or items) do not
+    hold any data, they only describe an offset and a stride within their base
+    buffer.
+    """
 
     def __init__(self, data=None, dtype=None, target=gl.GL_ARRAY_BUFFER,
-                 size=0, base=None, offset=0, store=True, copy=False, resizeable=True):
+                 size=0, base=None, offset=0, store=True, copy=False, resizeable=True,
+                 usage='dynamic', regions=1):
         """
         Initialize the buffer
 
@@ -214,9 +437,16 @@ class DataBuffer(Buffer):
 
         resizeable : boolean
             Indicates whether buffer is resizeable
+
+        usage : str
+            'static', 'dynamic' or 'stream'
+
+        regions : int
+            Number of regions used in turn by a 'stream' buffer
         """
 
-        Buffer.__init__(self, target=target, resizeable=resizeable)
+        Buffer.__init__(self, target=target, resizeable=resizeable,
+                        usage=usage, regions=regions)
         self._base = base
         self._offset = offset
         self._data = None
@@ -234,21 +464,19 @@ class DataBuffer(Buffer):
             #self._size = size or base.size
 
         # Create buffer from data
+        # Data is used as CPU storage (no copy) if contiguous and not copy
         elif data is not None:
-            if dtype is not None:
-                data = np.array(data,dtype=dtype,copy=False)
-            else:
-                data = np.array(data,copy=False)
+            data = array(data,dtype=dtype,copy=False)
             self._dtype = data.dtype
             self._size = data.size
-            self._stride = data.strides[-1]
+            self._stride = self._dtype.itemsize
             self._nbytes = data.nbytes
             if self._store:
                 if not data.flags["C_CONTIGUOUS"]:
                     if self._copy == False:
                         log("WARNING: cannot use non contiguous data as CPU storage")
                     self._copy = True
-                self._data = np.array(data,copy=self._copy).ravel()
+                self._data = array(data,copy=self._copy).reshape(-1)
                 self.set_data(self._data,copy=False)
             else:
                 self.set_data(data,copy=True)
@@ -291,6 +519,15 @@ class DataBuffer(Buffer):
             return self._target
 
 
+    @property
+    def gpu_offset(self):
+        """ Byte offset of current buffer content in GPU memory """
+
+        if self._base is not None:
+            return self._base.gpu_offset + self._offset
+        return Buffer.gpu_offset.fget(self)
+
+
     def activate(self):
         """ Activate the object on GPU """
 
@@ -319,6 +556,22 @@ class DataBuffer(Buffer):
             GLObject.update(self)
 
 
+    def _evictable(self):
+        """ Whether GPU memory can be freed and restored later """
+
+        return self._base is None and self._store and self._data is not None
+
+
+    def _evict(self):
+        """ Free GPU memory, content is uploaded again on next activation """
+
+        self._delete()
+        self._handle = -1
+        self._need_create = True
+        self._need_resize = True
+        Buffer.set_data(self, self._data, copy=False)
+
+
     def set_data(self, data, offset=0, copy=False):
         """ Set data (deferred operation)
 
@@ -342,6 +595,45 @@ class DataBuffer(Buffer):
             Buffer.set_data(self, data=data, offset=offset, copy=copy)
 
 
+    def _set_dirty(self, start, stop):
+        """ Mark some items of the CPU storage as dirty (deferred upload)
+
+        Parameters
+        ----------
+
+        start : int
+            First dirty item
+
+        stop : int
+            Last dirty item (excluded)
+        """
+
+        if stop > start:
+            self._set_dirty_range(start, stop)
+
+
+    def _set_dirty_range(self, start, stop):
+        """ Mark [start,stop) items of the CPU storage as dirty """
+
+        Buffer.set_data(self, self._data[start:stop],
+                        offset=start*self._itemsize, copy=False)
+
+
+    def _storage(self, pending):
+        """ CPU storage holding the whole content of the buffer (if any).
+
+        CPU storage can only be used as upload source when it is up to date
+        with pending writes, i.e. when they all come from the storage itself.
+        """
+
+        if self._data is None or self._data.nbytes != self._nbytes:
+            return None
+        for data, nbytes, offset in pending:
+            if not np.may_share_memory(data, self._data):
+                return None
+        return self._data.reshape(-1).view(np.uint8)
+
+
     @property
     def dtype(self):
         """ Buffer dtype """
@@ -424,6 +716,7 @@ class DataBuffer(Buffer):
         self._need_update = False
         self._need_resize = True
         self._size = size
+        self._nbytes = size * self._itemsize
         if self._data is not None and self._store:
             self._data = np.resize(self._data, self._size)
         else:
@@ -497,10 +790,9 @@ class DataBuffer(Buffer):
                 raise ValueError(
                     "Cannot set non contiguous data on buffer without CPU storage")
 
-            # WARNING: do we check data size
-            #          or do we let numpy raises an error ?
+            # Every item is touched by the field write
             self._data[key] = data
-            self.set_data(self._data, offset=0,copy=False)
+            self._set_dirty(0, self.size)
             return
 
         elif key == Ellipsis and self.base is not None:
@@ -531,10 +823,15 @@ class DataBuffer(Buffer):
             if base.data is not None:
                 # WARNING: do we check data size
                 #          or do we let numpy raises an error ?
-                base.data[key] = data
-                offset = start*base.itemsize
-                data = base.data[start:stop]
-                base.set_data(data=data, offset=offset, copy=False)
+                # Field view: items are base items
+                if isinstance(self._key, str):
+                    base.data[self._key][key] = data
+                    base._set_dirty(start, stop)
+                # Items view: items are shifted
+                else:
+                    first = self._offset // base.itemsize
+                    base.data[first:first+self.size][key] = data
+                    base._set_dirty(first+start, first+stop)
             # Base buffer has no CPU storage, we cannot do operation
             else:
                 raise ValueError(
@@ -545,8 +842,7 @@ class DataBuffer(Buffer):
             # WARNING: do we check data size
             #          or do we let numpy raises an error ?
             self.data[key] = data
-            offset = start*self.itemsize
-            self.set_data(data=self.data[start:stop], offset=offset, copy=False)
+            self._set_dirty(start, stop)
 
         # Buffer is a base buffer but we do not have CPU storage
         # If 'key' points to a contiguous chunk of buffer, it's ok
@@ -555,7 +851,7 @@ class DataBuffer(Buffer):
 
             # Make sure data is an array
             if not isinstance(data,np.ndarray):
-                data = np.array(data,dtype=self.dtype,copy=False)
+                data = array(data,dtype=self.dtype,copy=False)
 
             # Make sure data is big enough
             if data.size != stop-start:
@@ -577,7 +873,8 @@ class VertexBuffer(DataBuffer):
     """
 
     def __init__(self, data=None, dtype=None, size=0, store=True,
-                       copy=False, resizeable=True, *args, **kwargs):
+                       copy=False, resizeable=True, usage='dynamic', regions=1,
+                       divisor=0, *args, **kwargs):
         """
         Initialize the buffer
 
@@ -601,6 +898,17 @@ class VertexBuffer(DataBuffer):
 
         resizeable : boolean
             Indicates whether buffer is resizeable
+
+        usage : str
+            'static', 'dynamic' or 'stream'
+
+        regions : int
+            Number of regions used in turn by a 'stream' buffer
+
+        divisor : int or dict
+            Instance divisor of all fields or of some fields (name: divisor).
+            Attributes of a field with a non-zero divisor advance once per
+            divisor instances instead of once per vertex.
         """
 
         # We don't want these two parameters to be seen from outside
@@ -628,10 +936,13 @@ class VertexBuffer(DataBuffer):
 
         DataBuffer.__init__(self, data=data, dtype=dtype, size=size, base=base,
                             offset = offset, target = gl.GL_ARRAY_BUFFER, store=store,
-                            copy = copy, resizeable = resizeable)
+                            copy = copy, resizeable = resizeable,
+                            usage = usage, regions = regions)
 
         # Check base type and count for each dtype fields (if buffer is a base)
         if base is None:
+            self._divisors = dict.fromkeys(self.dtype.names, 0)
+            self.divisor = divisor
             for name in self.dtype.names:
                 from operator import mul
                 btype = self.dtype[name].base
@@ -648,6 +959,208 @@ class VertexBuffer(DataBuffer):
                     raise TypeError(msg)
 
 
+    @property
+    def divisor(self):
+        """ Instance divisor (of the field this buffer is a view on) """
+
+        base = self if self.base is None else self.base
+        key = getattr(self, '_key', None)
+        name = key if isinstance(key, str) else self.dtype.names[0]
+        return base._divisors.get(name, 0)
+
+
+    @divisor.setter
+    def divisor(self, value):
+        """ Instance divisor of all fields or of some fields (dict) """
+
+        base = self if self.base is None else self.base
+        key = getattr(self, '_key', None)
+        if isinstance(key, str):
+            value = { key : value }
+        elif not isinstance(value, dict):
+            value = dict.fromkeys(base.dtype.names, value)
+        for name, divisor in value.items():
+            if name not in base._divisors:
+                raise ValueError("Unknown field %s" % name)
+            if divisor < 0:
+                raise ValueError("Divisor must be positive")
+            base._divisors[name] = int(divisor)
+
+
+
+# ------------------------------------------------ MappedVertexBuffer class ---
+class MappedVertexBuffer(VertexBuffer):
+    """
+    MappedVertexBuffer represents vertex data stored in a (possibly huge) file
+    that is only partially uploaded to GPU memory.
+
+    The CPU storage is a np.memmap over the whole file while the GPU buffer has
+    a fixed size (budget). Only requested windows of items are uploaded: the
+    file is divided into pages of `pagesize` items and each page of a window is
+    uploaded into one of the GPU buffer slots. Pages are paged out (least
+    recently used first) when new windows are requested. Each page is read
+    through its own short-lived mapping such that resident memory stays bounded
+    by the budget.
+
+    Since pages are scattered into GPU memory, windows must be drawn using the
+    GPU ranges given by the `ranges` property.
+    """
+
+    def __init__(self, filename=None, dtype=None, budget=64*1024*1024,
+                       pagesize=65536, mode='r', *args, **kwargs):
+        """
+        Initialize the buffer
+
+        Parameters
+        ----------
+
+        filename : str
+            Raw file made of structured items
+
+        dtype : np.dtype
+            Structured item type
+
+        budget : int
+            GPU memory (bytes) allocated for pages
+
+        pagesize : int
+            Number of items per page
+
+        mode : str
+            'r' (read only) or 'r+' (read-write) memory map mode
+        """
+
+        # Views on a mapped buffer are regular buffer views
+        if kwargs.get("base", None) is not None:
+            VertexBuffer.__init__(self, dtype=dtype, *args, **kwargs)
+            return
+
+        dtype = np.dtype(dtype)
+        VertexBuffer.__init__(self, dtype=dtype, size=0, store=False,
+                              resizeable=False)
+
+        self._filename = filename
+        self._mode = mode
+        self._data = np.memmap(filename, dtype=self._dtype, mode=mode)
+        self._size = len(self._data)
+        self._store = True
+
+        self._pagesize = pagesize
+        self._pagebytes = pagesize * self._itemsize
+        slots = budget // self._pagebytes
+        if slots < 1:
+            raise ValueError("Budget is too small for a single page")
+        self._nbytes = slots * self._pagebytes
+
+        # Resident pages (page -> slot, least recently used first)
+        self._pages = OrderedDict()
+        self._free = list(range(slots-1, -1, -1))
+        self._windows = []
+
+        # Number of pages uploaded so far
+        self._paged = 0
+
+
+    @property
+    def windows(self):
+        """ Windows (start,stop) of items currently requested """
+
+        return list(self._windows)
+
+
+    @property
+    def ranges(self):
+        """ GPU item ranges (first,count) to be drawn for current windows """
+
+        ranges = []
+        size = self._pagesize
+        for start, stop in self._windows:
+            for page in range(start//size, (stop-1)//size+1):
+                first = max(start, page*size)
+                count = min(stop, (page+1)*size) - first
+                first += self._pages[page]*size - page*size
+                if ranges and ranges[-1][0]+ranges[-1][1] == first:
+                    ranges[-1] = ranges[-1][0], ranges[-1][1]+count
+                else:
+                    ranges.append((first, count))
+        return ranges
+
+
+    def set_windows(self, windows):
+        """ Make some windows of items resident in GPU memory (deferred)
+
+        Parameters
+        ----------
+
+        windows : list of (start,stop)
+            Windows of items to be made resident
+        """
+
+        size = self._pagesize
+        pages = []
+        for start, stop in windows:
+            if start < 0 or stop > self._size or stop <= start:
+                raise IndexError("Window out of range")
+            pages.extend(range(start//size, (stop-1)//size+1))
+        pages = sorted(set(pages))
+        if len(pages) > len(self._pages) + len(self._free):
+            raise ValueError("Windows do not fit into buffer budget")
+
+        # Keep resident pages (they become the most recently used)
+        missing = []
+        for page in pages:
+            if page in self._pages:
+                self._pages[page] = self._pages.pop(page)
+            else:
+                missing.append(page)
+
+        # Page in missing pages, paging out least recently used ones
+        for page in missing:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                _, slot = self._pages.popitem(last=False)
+            self._pages[page] = slot
+            start = page*size
+            count = min(size, self._size-start)
+            data = np.memmap(self._filename, dtype=self._dtype, mode='r',
+                             offset=start*self._itemsize, shape=(count,))
+            Buffer.set_data(self, data, offset=slot*self._pagebytes)
+            self._paged += 1
+
+        self._windows = [(start, stop) for start, stop in windows]
+
+
+    def _set_dirty_range(self, start, stop):
+        """ Mark [start,stop) items of the CPU storage as dirty """
+
+        size = self._pagesize
+        for page in range(start//size, (stop-1)//size+1):
+            if page in self._pages:
+                first = max(start, page*size)
+                last = min(stop, (page+1)*size)
+                offset = self._pages[page]*self._pagebytes
+                offset += (first - page*size)*self._itemsize
+                Buffer.set_data(self, self._data[first:last], offset=offset)
+
+
+    def _storage(self, pending):
+        """ CPU storage does not reflect GPU content """
+
+        return None
+
+
+    def _evictable(self):
+        """ GPU content (paged windows) cannot be restored from storage """
+
+        return False
+
+
+    def set_data(self, data, offset=0, copy=False):
+        """ Not allowed (use set_windows and setitem) """
+
+        raise ValueError("Cannot set data on a mapped buffer")
+
 
 
 # ------------------------------------------------------- IndexBuffer class ---
@@ -657,7 +1170,8 @@ class IndexBuffer(DataBuffer):
     """
 
     def __init__(self, data=None, dtype=np.uint32, size=0, store=True,
-                       copy=False, resizeable=True, *args, **kwargs):
+                       copy=False, resizeable=True, usage='dynamic', regions=1,
+                       *args, **kwargs):
         """
         Initialize the buffer
 
@@ -681,6 +1195,12 @@ class IndexBuffer(DataBuffer):
 
         resizeable : boolean
             Indicates whether buffer is resizeable
+
+        usage : str
+            'static', 'dynamic' or 'stream'
+
+        regions : int
+            Number of regions used in turn by a 'stream' buffer
         """
 
         # We don't want these two parameters to be seen from outside
@@ -701,4 +1221,5 @@ class IndexBuffer(DataBuffer):
 
         DataBuffer.__init__(self, data=data, dtype=dtype, size=size, base=base,
                             offset = offset, target = gl.GL_ELEMENT_ARRAY_BUFFER,
-                            store=store, copy=copy, resizeable=resizeable)
+                            store=store, copy=copy, resizeable=resizeable,
+                            usage=usage, regions=regions)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import os
+import re
+import hashlib
+import numpy as np
+import OpenGL.GL as gl
+from OpenGL import contextdata
+
+from debug import log
+
+
+
+# -------------------------------------------------------------- preprocess ---
+def preprocess(code):
+    """ Remove comments, blank lines and leading/trailing spaces """
+
+    code = re.sub(r'/\*.*?\*/', ' ', code, flags=re.DOTALL)
+    code = re.sub(r'//[^\n]*', '', code)
+    lines = [line.strip() for line in code.split('\n')]
+    return '\n'.join([line for line in lines if line])
+
+
+
+# --------------------------------------------------------- LinkCache class ---
+class LinkCache(object):
+    """
+    Cache of compiled shaders and linked programs.
+
+    In-process, shaders are keyed on the current GL context and a hash of
+    their (preprocessed) code such that shader objects sharing the same code
+    share the same compiled GL shader (a new context never gets the handles of
+    a destroyed one). On disk (if a directory is given), linked programs are keyed on a
+    hash of all their (preprocessed) shaders and saved as program binaries
+    (glGetProgramBinary). Next time the same program is created, the binary
+    is loaded (glProgramBinary) instead of compiling and linking shaders. If
+    program binaries are not supported or a binary is rejected by the driver
+    (e.g. after a driver update), programs are compiled and linked as usual::
+
+      from gloo.cache import cache
+      cache.directory = os.path.expanduser("~/.cache/gloo")
+      ...
+      print cache.stats
+    """
+
+    def __init__(self, directory=None):
+        """
+        Initialize the cache
+
+        Parameters
+        ----------
+
+        directory : str
+            Directory where to save program binaries (None means no disk cache)
+        """
+
+        self.directory = directory
+
+        # (context, target, key) -> [handle, count]
+        self._shaders = {}
+
+        self._stats = { 'shader hits'    : 0,
+                        'shader misses'  : 0,
+                        'program hits'   : 0,
+                        'program misses' : 0,
+                        'program errors' : 0 }
+
+
+    @property
+    def stats(self):
+        """ Hit/miss statistics """
+
+        return dict(self._stats)
+
+
+    def key(self, *codes):
+        """ Hash of some (preprocessed) shader codes """
+
+        sha = hashlib.sha1()
+        for code in codes:
+            sha.update(preprocess(code).encode('utf-8'))
+            sha.update(b'\0')
+        return sha.hexdigest()
+
+
+    def context(self):
+        """ Current GL context (or backend if there is no GL context) """
+
+        try:
+            return contextdata.getContext()
+        except Exception:
+            return id(gl)
+
+
+    def clear(self):
+        """ Forget about compiled shaders (of all contexts) """
+
+        self._shaders = {}
+
+
+    # --- Shaders (in-process) ---
+    def get_shader(self, target, code):
+        """ Handle of a compiled shader with the same code (or None) """
+
+        entry = self._shaders.get((self.context(), target, self.key(code)), None)
+        if entry is None:
+            self._stats['shader misses'] += 1
+            return None
+        self._stats['shader hits'] += 1
+        entry[1] += 1
+        return entry[0]
+
+
+    def add_shader(self, target, code, handle):
+        """ Register a newly compiled shader """
+
+        self._shaders[(self.context(), target, self.key(code))] = [handle, 1]
+
+
+    def release_shader(self, handle):
+        """ Release a shader handle, return True if it is not used anymore """
+
+        context = self.context()
+        for key, entry in self._shaders.items():
+            if key[0] == context and entry[0] == handle:
+                entry[1] -= 1
+                if entry[1] > 0:
+                    return False
+                del self._shaders[key]
+                break
+        return True
+
+
+    # --- Programs (on disk) ---
+    def _filename(self, key):
+        """ Filename of a program binary """
+
+        return os.path.join(self.directory, "%s.bin" % key)
+
+
+    def _supported(self):
+        """ Whether program binaries can be used """
+
+        if self.directory is None or not gl.glProgramBinary:
+            return False
+        return bool(gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS))
+
+
+    def load_program(self, handle, key):
+        """ Load a program binary, return True if program is linked """
+
+        if not self._supported():
+            return False
+        filename = self._filename(key)
+        if not os.path.exists(filename):
+            self._stats['program misses'] += 1
+            return False
+        try:
+            with open(filename, 'rb') as file:
+                binary = np.frombuffer(file.read(), dtype=np.uint8)
+            format, binary = int(binary[:4].view(np.uint32)[0]), binary[4:]
+            gl.glProgramBinary(handle, format, binary, len(binary))
+            status = gl.glGetProgramiv(handle, gl.GL_LINK_STATUS)
+        except Exception:
+            status = False
+        if not status:
+            log("GPU: Program binary rejected, linking program")
+            self._stats['program errors'] += 1
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return False
+        log("GPU: Program loaded from binary")
+        self._stats['program hits'] += 1
+        return True
+
+
+    def prepare_program(self, handle):
+        """ Ask for the program binary to be retrievable (before linking) """
+
+        if self._supported():
+            gl.glProgramParameteri(handle, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT,
+                                   gl.GL_TRUE)
+
+
+    def save_program(self, handle, key):
+        """ Save the binary of a linked program """
+
+        if not self._supported():
+            return
+        try:
+            length = gl.glGetProgramiv(handle, gl.GL_PROGRAM_BINARY_LENGTH)
+            if not length:
+                return
+            binary = np.zeros(4+length, dtype=np.uint8)
+            size = np.zeros(1, dtype=np.int32)
+            format = np.zeros(1, dtype=np.uint32)
+            gl.glGetProgramBinary(handle, length, size, format, binary[4:])
+            if size[0] <= 0:
+                return
+            binary[:4] = format.view(np.uint8)
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            with open(self._filename(key), 'wb') as file:
+                file.write(binary[:4+size[0]].tostring())
+        except Exception:
+            log("GPU: Cannot save program binary")
+
+
+
+# Global cache
+cache = LinkCache()
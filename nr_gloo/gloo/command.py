@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+from array import array
+from itertools import izip
+
+import cache
+import buffer
+import shader
+import program
+import texture
+import variable
+from debug import log
+from state import state
+from buffer import DataBuffer
+from texture import Texture
+
+
+# Modules whose GL calls are recorded
+_modules = cache, buffer, shader, program, texture, variable
+
+# GL functions of the draw sequence (creations, uploads and queries are issued
+# while recording but are not part of the command list)
+_recorded = ('glUseProgram', 'glBindVertexArray', 'glBindBuffer',
+             'glActiveTexture', 'glBindTexture', 'glUniform',
+             'glVertexAttrib', 'glEnableVertexAttribArray',
+             'glDisableVertexAttribArray', 'glDrawArrays', 'glDrawElements',
+             'glMultiDrawArrays', 'glMultiDrawElements')
+
+
+
+# ---------------------------------------------------------- Recorder class ---
+class _Recorder(object):
+    """ Stand-in for a gl module issuing calls and recording some of them """
+
+    def __init__(self, gl, commands):
+        self._gl = gl
+        self._commands = commands
+
+
+    def __getattr__(self, name):
+        value = getattr(self._gl, name)
+        if not name.startswith(_recorded):
+            return value
+        commands = self._commands
+
+        def call(*args):
+            commands._record(name, value, args)
+            return value(*args)
+        return call
+
+
+
+# ------------------------------------------------------- CommandList class ---
+class CommandList(object):
+    """
+    A command list records the GL calls of a sequence of draws (program use,
+    bindings, uniforms, attribute pointers and draw calls) such that the same
+    sequence can be replayed without going through programs, variables and
+    buffers again::
+
+      commands = CommandList()
+      with commands:
+          for program in programs:
+              commands.draw(program, gl.GL_TRIANGLES, indices)
+      ...
+      program['u_color'] = 1,0,0,1    # patched in at next replay
+      commands.replay()
+
+    Commands are stored as an array of opcodes (GL functions) and a list of
+    arguments. Uniform commands refer to the uniform storage such that new
+    values are used at replay and a uniform is only uploaded again when it has
+    been set since the last replay (or draw). Objects (buffers, textures) are
+    updated before replay if their data changed.
+
+    Recording starts from an unknown GL state (every binding is recorded) and
+    the state is unknown after replay. If buffers or textures are recreated or
+    buffers move (stream buffers), the list must be recorded again.
+    """
+
+    def __init__(self):
+        """ Initialize the command list """
+
+        self._functions = []
+        self._names = []
+        self._opcode = {}
+        self._opcodes = array('H')
+        self._arguments = []
+        self._uniforms = []
+        self._objects = []
+        self._buffers = []
+        self._textures = []
+        self._recording = False
+        self._program = None
+        self._paused = False
+        self._saved = None
+
+
+    def __len__(self):
+        """ Number of recorded commands """
+
+        return len(self._opcodes)
+
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+
+    def __exit__(self, type, value, traceback):
+        self.end()
+
+
+    @property
+    def names(self):
+        """ Names of recorded GL functions (in order) """
+
+        return [self._names[opcode] for opcode in self._opcodes]
+
+
+    def begin(self):
+        """ Start recording (previous commands are cleared) """
+
+        if self._recording:
+            raise RuntimeError("Command list is already recording")
+        log("GPU: Recording command list")
+        self.__init__()
+        self._recording = True
+        self._saved = [module.gl for module in _modules]
+        recorders = {}
+        for module in _modules:
+            if id(module.gl) not in recorders:
+                recorders[id(module.gl)] = _Recorder(module.gl, self)
+            module.gl = recorders[id(module.gl)]
+        state.reset()
+
+
+    def end(self):
+        """ Stop recording """
+
+        if not self._recording:
+            raise RuntimeError("Command list is not recording")
+        for module, gl in zip(_modules, self._saved):
+            module.gl = gl
+        self._recording = False
+        self._saved = None
+        self._buffers = [(buffer, buffer._generation, buffer.gpu_offset)
+                         for buffer in self._objects
+                         if isinstance(buffer, DataBuffer)]
+        self._textures = [(texture, texture.handle)
+                          for texture in self._objects
+                          if isinstance(texture, Texture)]
+
+
+    def draw(self, program, *args, **kwargs):
+        """
+        Record a program draw (same arguments as Program.draw)
+        """
+
+        if not self._recording:
+            raise RuntimeError("Command list is not recording")
+
+        # Program is set up beforehand (not recorded) such that a vertex array
+        # is recorded as a single bind
+        self._paused = True
+        try:
+            program.activate()
+            program.deactivate()
+        finally:
+            self._paused = False
+        state.reset()
+
+        # Every uniform is uploaded (and recorded)
+        for uniform in program._uniforms.values():
+            if uniform.active:
+                uniform._need_update = True
+                uniform._shadow = None
+        self._program = program
+        try:
+            program.draw(*args, **kwargs)
+        finally:
+            self._program = None
+
+        # Objects to be updated before replay
+        objects = [attribute.data for attribute in program._attributes.values()
+                   if isinstance(attribute.data, DataBuffer)]
+        objects += [uniform.data for uniform in program._uniforms.values()
+                    if isinstance(uniform.data, Texture)]
+        indices = kwargs.get('indices', args[1] if len(args) > 1 else None)
+        if isinstance(indices, DataBuffer):
+            objects.append(indices)
+        for obj in objects:
+            if isinstance(obj, DataBuffer) and obj.base is not None:
+                obj = obj.base
+            if obj not in self._objects:
+                self._objects.append(obj)
+
+
+    def _record(self, name, function, args):
+        """ Record a GL call """
+
+        if self._paused:
+            return
+        if name == 'glBindBuffer' and args[1] and args[0] not in (
+                buffer.gl.GL_ARRAY_BUFFER, buffer.gl.GL_ELEMENT_ARRAY_BUFFER):
+            return
+        if name not in self._opcode:
+            self._opcode[name] = len(self._functions)
+            self._names.append(name)
+            self._functions.append(function)
+        self._opcodes.append(self._opcode[name])
+        self._arguments.append(args)
+
+        # Uniform uploads are tied to their uniform (to be skipped at replay
+        # if the uniform has not been set)
+        uniform = None
+        if name.startswith('glUniform') and self._program is not None:
+            for item in self._program._uniforms.values():
+                if item.active and item._handle == args[0]:
+                    uniform = item
+                    break
+        self._uniforms.append(uniform)
+
+
+    def replay(self):
+        """ Replay recorded commands """
+
+        if self._recording:
+            raise RuntimeError("Command list is recording")
+
+        # Update objects whose data changed
+        for obj in self._objects:
+            if obj._need_update:
+                obj.update()
+        for buffer, generation, offset in self._buffers:
+            if buffer._generation != generation or buffer.gpu_offset != offset:
+                raise RuntimeError("Buffers changed, command list must be "
+                                   "recorded again")
+        for texture, handle in self._textures:
+            if texture.handle != handle:
+                raise RuntimeError("Textures changed, command list must be "
+                                   "recorded again")
+
+        functions = self._functions
+        for opcode, args, uniform in izip(self._opcodes, self._arguments,
+                                          self._uniforms):
+            if uniform is not None:
+                if not uniform._need_update:
+                    continue
+                uniform._need_update = False
+                uniform._shadow = None
+            functions[opcode](*args)
+        state.reset()
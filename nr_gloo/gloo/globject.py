@@ -3,6 +3,7 @@
 # Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
 # Distributed under the terms of the new BSD License.
 # -----------------------------------------------------------------------------
+from memory import registry
 
 
 class GLObject(object):
@@ -19,6 +20,7 @@ class GLObject(object):
         self._need_create = True
         self._need_update = True
         self._need_delete = False
+        self._owner = None
 
         GLObject._idcount += 1
         self._id = GLObject._idcount
@@ -41,6 +43,7 @@ class GLObject(object):
         if self._need_create:
             self._create()
             self._need_create = False
+        registry.touch(self)
         self._activate()
         if self._need_update:
             self._update()
@@ -64,6 +67,26 @@ class GLObject(object):
         self.deactivate()
 
 
+    def _evictable(self):
+        """ Whether GPU memory can be freed and restored later """
+
+        return False
+
+
+    @property
+    def owner(self):
+        """ Owner of this object (for GPU memory accounting) """
+
+        return self._owner
+
+
+    @owner.setter
+    def owner(self, value):
+        """ Owner of this object (for GPU memory accounting) """
+
+        self._owner = value
+
+
     @property
     def handle(self):
         """ Name of this object on the GPU """
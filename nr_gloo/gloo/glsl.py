@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+GLSL declaration parser.
+
+The source is read once: top-level statements are tokenized (comments,
+preprocessor lines, hooks, words, numbers and symbols) and parsed as they come
+while blocks (function bodies) are only scanned for braces and hooks, giving
+declarations (uniforms, attributes, varyings, consts and externs), functions
+and hooks::
+
+  declarations = parse(code)
+  declarations['uniforms']     # ((name, type, size), ...)
+  declarations['functions']    # ((rtype, name, args, code), ...)
+
+Sizes are None for non-array variables. Results are immutable and cached
+(keyed on the source code, least recently used results being dropped) such
+that parsing the same code again costs a dictionary lookup.
+"""
+import re
+from collections import OrderedDict
+
+
+# Tokens (order matters)
+_tokens = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<preprocessor>\#[^\n]*)
+  | (?P<hook><\w+>)
+  | (?P<word>[A-Za-z_]\w*)
+  | (?P<number>(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?[fFuU]?)
+  | (?P<space>\s+)
+  | (?P<symbol>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Braces, hooks and comments (in blocks)
+_braces = re.compile(r"//[^\n]*|/\*.*?\*/|<\w+>|[{}]", re.DOTALL)
+
+# Storage qualifiers (and where their declarations go)
+_qualifiers = { 'uniform'   : 'uniforms',
+                'attribute' : 'attributes',
+                'varying'   : 'varyings',
+                'const'     : 'consts',
+                'extern'    : 'externs' }
+
+# Qualifiers that may come before the type
+_modifiers = ['invariant', 'lowp', 'mediump', 'highp', 'flat', 'smooth',
+              'centroid', 'noperspective']
+
+# Maximum number of cached results
+_size = 256
+_cache = OrderedDict()
+
+
+
+# ------------------------------------------------------------------ tokens ---
+def tokenize(code):
+    """
+    Significant tokens of code as a list of (kind, text, start, stop) where kind
+    is one of 'preprocessor', 'hook', 'word', 'number' or 'symbol' (comments and
+    spaces are dropped).
+    """
+
+    tokens = []
+    for match in _tokens.finditer(code):
+        kind = match.lastgroup
+        if kind not in ('comment', 'space'):
+            tokens.append((kind, match.group(kind), match.start(), match.end()))
+    return tokens
+
+
+
+# ------------------------------------------------------------------- parse ---
+def parse(code):
+    """
+    Parse GLSL code (cached)
+
+    Parameters
+    ----------
+
+    code : str
+        GLSL source code
+
+    Returns
+    -------
+
+    A dictionary with the following keys:
+
+    version : str or None
+        Version (from the #version directive)
+
+    uniforms, attributes, varyings, consts, externs : tuple
+        Declarations as (name, type, size) where size is None if the variable
+        is not an array
+
+    functions : tuple
+        Function definitions as (rtype, name, args, code)
+
+    hooks : tuple
+        Hook names (<name> in code)
+
+    spans : tuple
+        Source spans (start, stop) of uniform, attribute and varying
+        declarations and of function definitions
+    """
+
+    result = _cache.pop(code, None)
+    if result is None:
+        result = _parse(code or "")
+        if len(_cache) >= _size:
+            _cache.popitem(last=False)
+    _cache[code] = result
+    return result
+
+
+def expand(declarations):
+    """
+    Expand array declarations into one (name[i], type) item per element
+    (other declarations giving a (name, type) item).
+    """
+
+    items = []
+    for name, vtype, size in declarations:
+        if size is None:
+            items.append((name, vtype))
+        else:
+            items.extend([('%s[%d]' % (name, i), vtype) for i in range(size)])
+    return items
+
+
+def _parse(code):
+    """ Actual (uncached) parsing """
+
+    result = { 'version' : None, 'functions' : [], 'hooks' : [], 'spans' : [] }
+    for key in _qualifiers.values():
+        result[key] = []
+
+    statement = []
+    position, end = 0, len(code)
+    while position < end:
+        match = _tokens.match(code, position)
+        kind = match.lastgroup
+        position = match.end()
+        if kind in ('comment', 'space'):
+            continue
+        token = kind, match.group(kind), match.start(), position
+        text = token[1]
+
+        if kind == 'hook':
+            result['hooks'].append(text[1:-1])
+        elif kind == 'preprocessor':
+            words = text[1:].split()
+            if len(words) > 1 and words[0] == 'version':
+                result['version'] = words[1]
+            continue
+
+        # End of declaration (or prototype, precision statement, etc.)
+        elif kind == 'symbol' and text == ';':
+            if statement:
+                _declaration(statement, token, result)
+            statement = []
+            continue
+
+        # Block (function body, struct, etc.) is only scanned for braces
+        elif kind == 'symbol' and text == '{':
+            close, position = _block(code, position, result['hooks'])
+            function = _function(statement, code)
+            if function is not None:
+                body = code[token[3]:close]
+                result['functions'].append(function + (body,))
+                result['spans'].append((statement[0][2], position))
+                statement = []
+            else:
+                # Struct definition continues until ';'
+                statement.append(token)
+                statement.append(('symbol', '}', close, position))
+            continue
+
+        statement.append(token)
+
+    for key, value in result.items():
+        if isinstance(value, list):
+            result[key] = tuple(value)
+    return result
+
+
+def _block(code, position, hooks):
+    """ Start and stop of the brace closing a block opened before position """
+
+    depth = 1
+    for match in _braces.finditer(code, position):
+        text = match.group(0)
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+            if depth == 0:
+                return match.start(), match.end()
+        elif text[0] == '<':
+            hooks.append(text[1:-1])
+    return len(code), len(code)
+
+
+def _match(tokens, i):
+    """ Index of the token closing the bracket opened at index i """
+
+    opening, closing = tokens[i][1], { '(':')', '[':']' }[tokens[i][1]]
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j][0] != 'symbol':
+            continue
+        if tokens[j][1] == opening:
+            depth += 1
+        elif tokens[j][1] == closing:
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(tokens)
+
+
+def _function(statement, code):
+    """ Function (rtype, name, args) of a statement followed by a body """
+
+    # ... rtype name ( args )
+    if len(statement) < 4 or statement[-1][1] != ')':
+        return None
+    depth = 0
+    for j in range(len(statement)-1, -1, -1):
+        if statement[j][1] == ')':
+            depth += 1
+        elif statement[j][1] == '(':
+            depth -= 1
+            if depth == 0:
+                break
+    if j < 2 or statement[j-1][0] != 'word' or statement[j-2][0] != 'word':
+        return None
+    args = code[statement[j][3]:statement[-1][2]].strip()
+    return statement[j-2][1], statement[j-1][1], args
+
+
+def _declaration(statement, end, result):
+    """ Declarations of a statement (qualifier [modifiers] type names) """
+
+    qualifier = statement[0][1]
+    if qualifier in _modifiers and len(statement) > 1:
+        statement = statement[1:]
+        qualifier = statement[0][1]
+    if qualifier not in _qualifiers:
+        return
+    declarations = result[_qualifiers[qualifier]]
+    tokens = [token for token in statement[1:] if token[1] not in _modifiers]
+    if len(tokens) < 2 or tokens[0][0] != 'word':
+        return
+    vtype = tokens[0][1]
+
+    # Declarators: name [size] [= value], ...
+    j, n = 1, len(tokens)
+    while j < n:
+        name, size = tokens[j], None
+        j += 1
+        if j < n and tokens[j][1] == '[':
+            close = _match(tokens, j)
+            if close == j+2 and tokens[j+1][0] == 'number':
+                size = int(tokens[j+1][1].rstrip('uU'))
+            j = close + 1
+        # Skip initializer up to next top-level comma
+        depth = 0
+        while j < n and not (depth == 0 and tokens[j][1] == ','):
+            if tokens[j][1] in '([{':
+                depth += 1
+            elif tokens[j][1] in ')]}':
+                depth -= 1
+            j += 1
+        j += 1
+        if name[0] == 'word':
+            declarations.append((name[1], vtype, size))
+
+    if qualifier in ('uniform', 'attribute', 'varying'):
+        result['spans'].append((statement[0][2], end[3]))
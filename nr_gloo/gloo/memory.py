@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import weakref
+from collections import OrderedDict
+
+from debug import log
+
+
+
+# ---------------------------------------------------------- Registry class ---
+class Registry(object):
+    """
+    Registry of the GPU memory allocated by GL objects.
+
+    Objects record their GPU size (keyed on their id) whenever they are
+    resized on GPU and release it when deleted. Since the registry is plain
+    Python, it can be queried without any GL context::
+
+      from memory import registry
+      registry.total
+      registry.totals('type')    # {'VertexBuffer': ..., 'Texture2D': ...}
+      registry.totals('owner')   # {None: ..., 'text': ...}
+
+    A budget (bytes) can be set. When an allocation would exceed it, least
+    recently used buffers having CPU storage are evicted from GPU memory
+    (they are recreated and uploaded again on next activation) or, if this
+    is not possible or if policy is 'raise', a MemoryError is raised.
+    """
+
+    def __init__(self, budget=None, policy='evict'):
+        """
+        Initialize the registry
+
+        Parameters
+        ----------
+
+        budget : int
+            Maximum number of GPU bytes (None means unlimited)
+
+        policy : str
+            'evict' or 'raise'
+        """
+
+        self._objects = OrderedDict()
+        self._total = 0
+        self._evictions = 0
+        self.budget = budget
+        self.policy = policy
+
+
+    @property
+    def budget(self):
+        """ Maximum number of GPU bytes (None means unlimited) """
+
+        return self._budget
+
+
+    @budget.setter
+    def budget(self, value):
+        """ Maximum number of GPU bytes (None means unlimited) """
+
+        if value is not None and value < 0:
+            raise ValueError("Budget must be positive")
+        self._budget = value
+
+
+    @property
+    def policy(self):
+        """ What to do when budget is exceeded ('evict' or 'raise') """
+
+        return self._policy
+
+
+    @policy.setter
+    def policy(self, value):
+        """ What to do when budget is exceeded ('evict' or 'raise') """
+
+        if value not in ('evict', 'raise'):
+            raise ValueError("Policy must be 'evict' or 'raise'")
+        self._policy = value
+
+
+    @property
+    def total(self):
+        """ Total number of allocated GPU bytes """
+
+        return self._total
+
+
+    @property
+    def evictions(self):
+        """ Number of objects evicted so far """
+
+        return self._evictions
+
+
+    def nbytes(self, obj):
+        """ Number of GPU bytes allocated by an object """
+
+        entry = self._objects.get(obj._id, None)
+        return entry[3] if entry else 0
+
+
+    def totals(self, key='type'):
+        """ Allocated GPU bytes per object 'type' or per 'owner' """
+
+        index = 1 if key == 'type' else 2
+        totals = {}
+        for entry in self._objects.values():
+            totals[entry[index]] = totals.get(entry[index], 0) + entry[3]
+        return totals
+
+
+    def allocate(self, obj, nbytes):
+        """ Record the GPU size of an object (replacing any previous size)
+
+        Parameters
+        ----------
+
+        obj : GLObject
+            Object being allocated
+
+        nbytes : int
+            Number of GPU bytes
+        """
+
+        delta = nbytes - self.nbytes(obj)
+        if self._budget is not None and self._total + delta > self._budget:
+            self._make_room(obj, self._total + delta - self._budget)
+        self.release(obj)
+        owner = getattr(obj, 'owner', None)
+        self._objects[obj._id] = (weakref.ref(obj), obj.__class__.__name__,
+                                  owner, nbytes)
+        self._total += nbytes
+
+
+    def release(self, obj):
+        """ Forget about the GPU memory of an object """
+
+        entry = self._objects.pop(obj._id, None)
+        if entry is not None:
+            self._total -= entry[3]
+
+
+    def touch(self, obj):
+        """ Mark an object as the most recently used """
+
+        entry = self._objects.pop(obj._id, None)
+        if entry is not None:
+            self._objects[obj._id] = entry
+
+
+    def _make_room(self, obj, nbytes):
+        """ Evict least recently used objects to free (at least) nbytes """
+
+        if self._policy == 'raise':
+            raise MemoryError("GPU memory budget exceeded")
+
+        victims, freed = [], 0
+        for id, entry in self._objects.items():
+            if freed >= nbytes:
+                break
+            victim = entry[0]()
+            if victim is None or victim is obj or not victim._evictable():
+                continue
+            victims.append(victim)
+            freed += entry[3]
+        if freed < nbytes:
+            raise MemoryError("GPU memory budget exceeded")
+
+        for victim in victims:
+            log("GPU: Evicting %s (%d bytes)" % (victim.__class__.__name__,
+                                                 self.nbytes(victim)))
+            victim._evict()
+            self.release(victim)
+            self._evictions += 1
+
+
+
+# Global registry
+registry = Registry()
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import bisect
+import numpy as np
+import OpenGL.GL as gl
+
+from debug import log
+from buffer import VertexBuffer, IndexBuffer
+
+
+
+# -------------------------------------------------------- BufferPool class ---
+class BufferPool(object):
+    """
+    A buffer pool packs many small buffers into a single GPU buffer.
+
+    Each allocation is a view on the (large) backing buffer that can be used
+    as any other buffer view. Since they all share the same GL buffer, items
+    of different allocations can be drawn using a single binding, the first
+    item of an allocation being given by `first`::
+
+      pool = BufferPool(dtype, capacity=65536)
+      V = pool.alloc(4)
+      V[...] = vertices
+      program.bind(pool.buffer)
+      gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, pool.first(V), V.size)
+
+    Free blocks are kept in an address ordered free list (first fit) and are
+    coalesced with their neighbours when freed. When no free block is large
+    enough, the pool is compacted if it helps or grown otherwise. Compaction
+    moves allocations toward the start of the buffer and updates their offset
+    in place (views stay valid). Growing keeps allocations valid but, as for
+    any resize, other views on the backing buffer are invalidated.
+    """
+
+    def __init__(self, dtype, capacity=65536, target=gl.GL_ARRAY_BUFFER,
+                       resizeable=True):
+        """
+        Initialize the pool
+
+        Parameters
+        ----------
+
+        dtype : np.dtype
+            Items data type
+
+        capacity : int
+            Initial number of items
+
+        target : GLenum
+            gl.GL_ARRAY_BUFFER or gl.GL_ELEMENT_ARRAY_BUFFER
+
+        resizeable : boolean
+            Whether the pool can grow when full
+        """
+
+        if target == gl.GL_ARRAY_BUFFER:
+            self._buffer = VertexBuffer(np.zeros(capacity, dtype))
+        elif target == gl.GL_ELEMENT_ARRAY_BUFFER:
+            self._buffer = IndexBuffer(np.zeros(capacity, dtype))
+        else:
+            raise ValueError("Invalid target for buffer pool")
+        self._resizeable = resizeable
+        self._capacity = capacity
+
+        # Free blocks (start and size, sorted by start)
+        self._starts = [0]
+        self._sizes = [capacity]
+
+        # Allocated blocks (start -> view)
+        self._blocks = {}
+        self._used = 0
+
+
+    @property
+    def buffer(self):
+        """ Backing buffer """
+
+        return self._buffer
+
+
+    @property
+    def capacity(self):
+        """ Number of items in the backing buffer """
+
+        return self._capacity
+
+
+    @property
+    def used(self):
+        """ Number of allocated items """
+
+        return self._used
+
+
+    @property
+    def utilisation(self):
+        """ Fraction of the backing buffer that is allocated """
+
+        return self._used / float(self._capacity)
+
+
+    @property
+    def fragmentation(self):
+        """ Fraction of free items that are not part of the largest free block """
+
+        free = self._capacity - self._used
+        if free == 0:
+            return 0.0
+        return 1.0 - max(self._sizes) / float(free)
+
+
+    @property
+    def stats(self):
+        """ Pool statistics """
+
+        return { 'capacity'      : self._capacity,
+                 'used'          : self._used,
+                 'allocations'   : len(self._blocks),
+                 'free blocks'   : len(self._starts),
+                 'largest free'  : max(self._sizes or [0]),
+                 'utilisation'   : self.utilisation,
+                 'fragmentation' : self.fragmentation }
+
+
+    def first(self, view):
+        """ Index of the first item of an allocation in the backing buffer """
+
+        return view.offset // self._buffer.itemsize
+
+
+    def alloc(self, size):
+        """ Allocate some items and return a view on them
+
+        Parameters
+        ----------
+
+        size : int
+            Number of items to be allocated
+        """
+
+        if size <= 0:
+            raise ValueError("Allocation size must be positive")
+
+        index = self._find(size)
+        if index is None:
+            if self._capacity - self._used >= size:
+                self.compact()
+            else:
+                self._grow(self._used + size)
+            index = self._find(size)
+
+        start = self._starts[index]
+        if self._sizes[index] == size:
+            del self._starts[index]
+            del self._sizes[index]
+        else:
+            self._starts[index] += size
+            self._sizes[index] -= size
+
+        view = self._buffer[start:start+size]
+        self._blocks[start] = view
+        self._used += size
+        return view
+
+
+    def free(self, view):
+        """ Free an allocation (and coalesce it with its free neighbours)
+
+        Parameters
+        ----------
+
+        view : DataBuffer
+            Allocation as returned by alloc
+        """
+
+        start = self.first(view)
+        if self._blocks.get(start, None) is not view:
+            raise ValueError("Buffer has not been allocated from this pool")
+        del self._blocks[start]
+        self._buffer._views.remove(view)
+        view._valid = False
+        size = view.size
+        self._used -= size
+
+        index = bisect.bisect_left(self._starts, start)
+        # Merge with next free block
+        if index < len(self._starts) and self._starts[index] == start+size:
+            size += self._sizes[index]
+            del self._starts[index]
+            del self._sizes[index]
+        # Merge with previous free block
+        if index > 0 and self._starts[index-1]+self._sizes[index-1] == start:
+            self._sizes[index-1] += size
+        else:
+            self._starts.insert(index, start)
+            self._sizes.insert(index, size)
+
+
+    def compact(self):
+        """ Move all allocations toward the start of the buffer """
+
+        log("GPU: Compacting buffer pool")
+        data = self._buffer.data
+        itemsize = self._buffer.itemsize
+        cursor, first = 0, None
+        blocks = {}
+        for start in sorted(self._blocks.keys()):
+            view = self._blocks[start]
+            size = view.size
+            if start != cursor:
+                data[cursor:cursor+size] = data[start:start+size]
+                view._offset = cursor*itemsize
+                view._key = slice(cursor, cursor+size)
+                if first is None:
+                    first = cursor
+            blocks[cursor] = view
+            cursor += size
+        self._blocks = blocks
+        self._starts = [cursor] if cursor < self._capacity else []
+        self._sizes = [self._capacity-cursor] if cursor < self._capacity else []
+
+        # Moved items need to be uploaded
+        if first is not None:
+            self._buffer._set_dirty(first, cursor)
+
+
+    def _find(self, size):
+        """ Index of the first free block that is large enough (or None) """
+
+        for index, free in enumerate(self._sizes):
+            if free >= size:
+                return index
+        return None
+
+
+    def _grow(self, size):
+        """ Grow the backing buffer such that it can hold size items """
+
+        if not self._resizeable:
+            raise ValueError("Buffer pool is full")
+
+        capacity = self._capacity
+        while capacity < size:
+            capacity *= 2
+        log("GPU: Growing buffer pool (%d items)" % capacity)
+
+        # Resizing invalidates views but allocations keep their offset (other
+        # views, e.g. fields views from a program binding, must be recreated)
+        self._buffer.resize(capacity)
+        self._buffer._set_dirty(0, capacity)
+        for view in self._blocks.values():
+            view._valid = True
+            self._buffer._views.append(view)
+
+        # Extend (or create) last free block
+        if self._starts and self._starts[-1]+self._sizes[-1] == self._capacity:
+            self._sizes[-1] += capacity - self._capacity
+        else:
+            self._starts.append(self._capacity)
+            self._sizes.append(capacity - self._capacity)
+        self._capacity = capacity
@@ -8,6 +8,8 @@ import numpy as np
 import OpenGL.GL as gl
 
 from debug import log
+from cache import cache
+from state import state
 from globject import GLObject
 from buffer import VertexBuffer, IndexBuffer
 from shader import VertexShader, FragmentShader
@@ -32,6 +34,9 @@ def glGetActiveAttrib(program, index):
     return name.value, size.value, type.value
 gl.glGetActiveAttrib = glGetActiveAttrib
 
+# Name of the form "name[size]" (= array) of active uniforms and attributes
+_array = re.compile(r"""(?P<name>\w+)\s*(\[(?P<size>\d+)\])""")
+
 
 
 
@@ -42,8 +47,18 @@ class Program(GLObject):
     the program.
     """
 
+    # Whether the context supports vertex array objects (known when the first
+    # program is created)
+    _vao_support = None
+
+    # Whether the context supports instanced drawing (known at first draw)
+    _instancing_support = None
+
+    # Whether the context supports multi-draw (known at first draw)
+    _multidraw_support = None
+
     # ---------------------------------
-    def __init__(self, verts=[], frags=[], count=0):
+    def __init__(self, verts=[], frags=[], count=0, vao=True):
         """Initialize the program and register shaders to be linked.
 
         Parameters
@@ -58,6 +73,10 @@ class Program(GLObject):
         count : int
             Number of vertices this program will use
 
+        vao : bool
+            Whether to capture attribute bindings in a vertex array object
+            (if supported by the context)
+
         Note
         ----
         If several vertex shaders are specified, only one can contain the main
@@ -73,6 +92,17 @@ class Program(GLObject):
         self._count = count
         self._buffer = None
 
+        # Vertex array object, buffers it points to and their (generation,
+        # offset) when it was last set up, whether attributes changed since
+        self._vao = None
+        self._vao_enabled = vao
+        self._vao_buffers = []
+        self._vao_key = None
+        self._vao_dirty = True
+
+        # Expanded buffers (instanced drawing without instancing support)
+        self._expanded = {}
+
 
         # Get all vertex shaders
         self._verts = []
@@ -182,6 +212,54 @@ class Program(GLObject):
             if not self._handle:
                 raise ShaderException("Cannot create program object")
 
+        # Load program binary if it has been cached
+        verts = [shader.code for shader in self._verts]
+        frags = [shader.code for shader in self._frags]
+        key = cache.key(*(verts + [''] + frags))
+        if not cache.load_program(self._handle, key):
+            self._link(key)
+
+        # Activate uniforms (values and locations are lost when linking)
+        active_uniforms = [name for (name,gtype) in self.active_uniforms]
+        for uniform in self._uniforms.values():
+            if uniform.name in active_uniforms:
+                uniform.active = True
+            else:
+                uniform.active = False
+            uniform._need_create = True
+            uniform._need_update = True
+
+        # Activate attributes
+        active_attributes = [name for (name,gtype) in self.active_attributes]
+        for attribute in self._attributes.values():
+            if attribute.name in active_attributes:
+                attribute.active = True
+            else:
+                attribute.active = False
+        self._vao_dirty = True
+
+        # Vertex array object (if supported)
+        if Program._vao_support is None:
+            Program._vao_support = bool(gl.glGenVertexArrays)
+        if self._vao_enabled and Program._vao_support and self._vao is None:
+            self._vao = gl.glGenVertexArrays(1)
+
+
+    def _delete(self):
+        """ Delete program (and vertex array object) from GPU """
+
+        log("GPU: Deleting program")
+        if self._vao is not None:
+            gl.glDeleteVertexArrays(1, [self._vao])
+            state.delete_vertex_arrays([self._vao])
+            self._vao = None
+        gl.glDeleteProgram(self._handle)
+        state.delete_program(self._handle)
+
+
+    def _link(self, key):
+        """ Attach shaders, link the program and save its binary """
+
         # Detach any attached shaders
         attached = gl.glGetAttachedShaders(self._handle)
         for handle in attached:
@@ -198,26 +276,12 @@ class Program(GLObject):
         log("GPU: Creating program")
 
         # Link the program
+        cache.prepare_program(self._handle)
         gl.glLinkProgram(self._handle)
         if not gl.glGetProgramiv(self._handle, gl.GL_LINK_STATUS):
             print(gl.glGetProgramInfoLog(self._handle))
             raise ShaderException('Linking error')
-
-        # Activate uniforms
-        active_uniforms = [name for (name,gtype) in self.active_uniforms]
-        for uniform in self._uniforms.values():
-            if uniform.name in active_uniforms:
-                uniform.active = True
-            else:
-                uniform.active = False
-
-        # Activate attributes
-        active_attributes = [name for (name,gtype) in self.active_attributes]
-        for attribute in self._attributes.values():
-            if attribute.name in active_attributes:
-                attribute.active = True
-            else:
-                attribute.active = False
+        cache.save_program(self._handle, key)
 
 
     def _build_uniforms(self):
@@ -247,11 +311,27 @@ class Program(GLObject):
 
 
     def bind(self, data):
-        """ """
+        """ Bind a vertex buffer to the program
+
+        Each field of the buffer whose name matches a program attribute is
+        bound to this attribute (using a view on the buffer).
+
+        Parameters
+        ----------
+
+        data : VertexBuffer or np.ndarray
+            If data is a structured array, it is used as the CPU storage of a
+            new vertex buffer without any copy, provided it is C-contiguous
+            (np.memmap are allowed).
+        """
+
+        if isinstance(data, np.ndarray):
+            data = VertexBuffer(data, store=True, copy=False)
         if isinstance(data, VertexBuffer):
             for name in data.dtype.names:
                 if name in self._attributes.keys():
                     self._attributes[name].set_data(data[name])
+                    self._vao_dirty = True
 
 
     def __setitem__(self, name, data):
@@ -259,6 +339,7 @@ class Program(GLObject):
             self._uniforms[name].set_data(data)
         elif name in self._attributes.keys():
             self._attributes[name].set_data(data)
+            self._vao_dirty = True
         else:
             raise ValueError("Unknown uniform or attribute")
 
@@ -277,15 +358,62 @@ class Program(GLObject):
         """Activate the program as part of current rendering state."""
 
         log("GPU: Activating program")
-        gl.glUseProgram(self.handle)
+        if state.use_program(self.handle):
+            gl.glUseProgram(self.handle)
 
+        # Only uniforms whose value changed or that bind a texture
         for uniform in self._uniforms.values():
-            if uniform.active:
+            if uniform.active and (uniform._need_update or uniform._unit >= 0):
                 uniform.activate()
 
-        for attribute in self._attributes.values():
-            if attribute.active:
+        attributes = [attribute for attribute in self._attributes.values()
+                      if attribute.active]
+        if self._vao is None:
+            # Programs without vertex array use the default one
+            if Program._vao_support and state.bind_vertex_array(0):
+                gl.glBindVertexArray(0)
+            for attribute in attributes:
                 attribute.activate()
+            return
+
+        if state.bind_vertex_array(self._vao):
+            gl.glBindVertexArray(self._vao)
+
+        # Vertex array is up to date if attributes have not been set and their
+        # buffers have neither moved (stream buffers) nor been recreated
+        if not self._vao_dirty:
+            for buffer in self._vao_buffers:
+                buffer.activate()
+            if self._vertex_key(attributes) == self._vao_key:
+                # Generic values are not part of vertex array state
+                for attribute in attributes:
+                    if attribute._generic:
+                        attribute.activate()
+                return
+
+        log("GPU: Setting up vertex array")
+        buffers = []
+        for attribute in attributes:
+            attribute.activate()
+            if isinstance(attribute.data, VertexBuffer):
+                buffer = attribute.data.base
+                if buffer is None:
+                    buffer = attribute.data
+                if buffer not in buffers:
+                    buffers.append(buffer)
+        self._vao_buffers = buffers
+        self._vao_key = self._vertex_key(attributes)
+        self._vao_dirty = False
+
+
+    def _vertex_key(self, attributes):
+        """ Vertex array state that may change without setting attributes """
+
+        key = [(buffer._generation, buffer.gpu_offset)
+               for buffer in self._vao_buffers]
+        key += [attribute.data.divisor for attribute in attributes
+                if isinstance(attribute.data, VertexBuffer)]
+        return key
 
 
 
@@ -293,7 +421,8 @@ class Program(GLObject):
         """Deactivate the program."""
 
         log("GPU: Deactivating program")
-        gl.glUseProgram(0)
+        if state.unuse_program():
+            gl.glUseProgram(0)
 
         for uniform in self._uniforms.values():
             uniform.deactivate()
@@ -319,14 +448,12 @@ class Program(GLObject):
         """ Extract active uniforms from GPU """
 
         count = gl.glGetProgramiv(self.handle, gl.GL_ACTIVE_UNIFORMS)
-        # This match a name of the form "name[size]" (= array)
-        regex = re.compile("""(?P<name>\w+)\s*(\[(?P<size>\d+)\])\s*""")
         uniforms = []
         for i in range(count):
             name, size, gtype = gl.glGetActiveUniform(self.handle, i)
             # This checks if the uniform is an array
             # Name will be something like xxx[0] instead of xxx
-            m = regex.match(name)
+            m = _array.match(name)
             # When uniform is an array, size corresponds to the highest used index
             if m:
                 name = m.group('name')
@@ -377,15 +504,12 @@ class Program(GLObject):
         count = gl.glGetProgramiv(self.handle, gl.GL_ACTIVE_ATTRIBUTES)
         attributes = []
 
-        # This match a name of the form "name[size]" (= array)
-        regex = re.compile("""(?P<name>\w+)\s*(\[(?P<size>\d+)\])""")
-
         for i in range(count):
             name, size, gtype = gl.glGetActiveAttrib(self.handle, i)
 
             # This checks if the attribute is an array
             # Name will be something like xxx[0] instead of xxx
-            m = regex.match(name)
+            m = _array.match(name)
             # When attribute is an array, size corresponds to the highest used index
             if m:
                 name = m.group('name')
@@ -414,6 +538,21 @@ class Program(GLObject):
         doc = "Program inactive attributes obtained from GPU")
 
 
+    @property
+    def stats(self):
+        """ Number of uniform uploads and attribute pointer setups that have
+        been issued and skipped (because value or pointer was unchanged) """
+
+        stats = { 'uniform uploads'   : 0, 'uniform skips'   : 0,
+                  'attribute uploads' : 0, 'attribute skips' : 0 }
+        for kind, variables in (('uniform', self._uniforms),
+                                ('attribute', self._attributes)):
+            for variable in variables.values():
+                stats[kind + ' uploads'] += variable._uploads
+                stats[kind + ' skips'] += variable._skips
+        return stats
+
+
     @property
     def shaders(self):
         """ List of shaders currently attached to this program """
@@ -425,7 +564,8 @@ class Program(GLObject):
 
 
 
-    def draw(self, mode = gl.GL_TRIANGLES, indices=None): #first=0, count=None):
+    def draw(self, mode = gl.GL_TRIANGLES, indices=None, instances=None,
+             first=0, count=None, ranges=None):
         """ Draw the attribute arrays in the specified mode.
 
         Parameters
@@ -434,34 +574,186 @@ class Program(GLObject):
             GL_POINTS, GL_LINES, GL_LINE_STRIP, GL_LINE_LOOP,
             GL_TRIANGLES, GL_TRIANGLE_STRIP, GL_TRIANGLE_FAN
 
+        indices : IndexBuffer
+            Indices (or view on indices) of vertices to draw. Default none.
+
+        instances : int
+            Number of instances to draw. Attributes whose buffer field has a
+            non-zero divisor advance once per divisor instances. Without
+            instancing support, geometry is expanded on the CPU.
+
         first : int
-            The starting vertex index in the vertex array. Default 0.
+            The starting vertex index in the vertex array (or the starting
+            index in indices). Default 0.
 
         count : int
-            The number of vertices to draw. Default all.
+            The number of vertices (or indices) to draw. Default all.
+
+        ranges : list of (first, count)
+            Several ranges of vertices (or indices) to draw at once, using
+            multi-draw if supported (first and count are ignored).
         """
 
-        self.activate()
-        attributes = self._attributes.values()
+        if instances is not None:
+            if Program._instancing_support is None:
+                Program._instancing_support = bool(gl.glDrawArraysInstanced and
+                                                   gl.glVertexAttribDivisor)
+            if not Program._instancing_support:
+                self._draw_expanded(mode, indices, instances, first, count, ranges)
+                return
+        if Program._multidraw_support is None:
+            Program._multidraw_support = bool(gl.glMultiDrawArrays and
+                                              gl.glMultiDrawElements)
 
-        # Get buffer size first attribute
-        # We need more tests here
-        #  - do we have at least 1 attribute ?
-        #  - does all attributes report same count ?
-        # count = (count or attributes[0].size) - first
+        if isinstance(indices, IndexBuffer):
+            size = indices.size
+        else:
+            size = self._vertex_count()
+        if ranges is None:
+            if count is None:
+                count = size - first
+            ranges = [(first, count)]
+        ranges = self._ranges(ranges, size)
+        if not ranges:
+            return
 
+        self.activate()
         if isinstance(indices, IndexBuffer):
             indices.activate()
             gltypes = { np.dtype(np.uint8) : gl.GL_UNSIGNED_BYTE,
                         np.dtype(np.uint16): gl.GL_UNSIGNED_SHORT,
                         np.dtype(np.uint32): gl.GL_UNSIGNED_INT }
-            gl.glDrawElements(mode, indices.size, gltypes[indices.dtype], None)
+            gtype = gltypes[indices.dtype]
+
+            # Ranges of indices are byte offsets into the index buffer
+            offsets = [indices.gpu_offset + first*indices.itemsize
+                       for first, count in ranges]
+            if instances is not None:
+                for offset, (first, count) in zip(offsets, ranges):
+                    gl.glDrawElementsInstanced(mode, count, gtype,
+                                               ctypes.c_void_p(offset),
+                                               instances)
+            elif len(ranges) > 1 and Program._multidraw_support:
+                counts = np.array([count for first, count in ranges], np.int32)
+                offsets = (ctypes.c_void_p*len(ranges))(*offsets)
+                gl.glMultiDrawElements(mode, counts, gtype, offsets, len(ranges))
+            else:
+                for offset, (first, count) in zip(offsets, ranges):
+                    gl.glDrawElements(mode, count, gtype, ctypes.c_void_p(offset))
             indices.deactivate()
         else:
-            #count = (count or attributes[0].size) - first
-            first = 0
-            count = attributes[0].size
-            gl.glDrawArrays(mode, first, count)
+            if instances is not None:
+                for first, count in ranges:
+                    gl.glDrawArraysInstanced(mode, first, count, instances)
+            elif len(ranges) > 1 and Program._multidraw_support:
+                firsts = np.array([first for first, count in ranges], np.int32)
+                counts = np.array([count for first, count in ranges], np.int32)
+                gl.glMultiDrawArrays(mode, firsts, counts, len(ranges))
+            else:
+                for first, count in ranges:
+                    gl.glDrawArrays(mode, first, count)
 
-        gl.glBindBuffer( gl.GL_ARRAY_BUFFER, 0 )
+        if state.unbind_buffer(gl.GL_ARRAY_BUFFER):
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
         self.deactivate()
+
+
+    def _ranges(self, ranges, size):
+        """
+        Minimal list of (first, count) ranges: empty ranges are dropped and
+        contiguous ones are merged.
+        """
+
+        merged = []
+        for first, count in ranges:
+            if first < 0 or count < 0 or first + count > size:
+                raise ValueError("Range (%d,%d) out of bounds" % (first, count))
+            if not count:
+                continue
+            if merged and merged[-1][0] + merged[-1][1] == first:
+                merged[-1][1] += count
+            else:
+                merged.append([first, count])
+        return [(first, count) for first, count in merged]
+
+
+    def _vertex_count(self):
+        """ Number of vertices (size of non instanced attributes) """
+
+        attributes = self._attributes.values()
+        for attribute in attributes:
+            if (attribute.active and isinstance(attribute.data, VertexBuffer)
+                and not attribute.data.divisor):
+                return attribute.size
+        return attributes[0].size
+
+
+    def _draw_expanded(self, mode, indices, instances, first, count, ranges):
+        """
+        Draw instances without instancing support: non instanced attributes
+        are repeated for each instance and instanced ones for each vertex of
+        their instances into temporary buffers (expanded at each draw). Ranges
+        are repeated for each instance.
+        """
+
+        vertices = self._vertex_count()
+        attributes = [attribute for attribute in self._attributes.values()
+                      if isinstance(attribute.data, VertexBuffer)]
+        saved = [attribute._data for attribute in attributes]
+        for attribute in attributes:
+            buffer = attribute.data
+            data = buffer.data
+            key = getattr(buffer, '_key', None)
+            if isinstance(key, str) and buffer.base.data is not None:
+                data = buffer.base.data[key]
+            if data is None:
+                raise ValueError("Cannot expand %s (no CPU storage)"
+                                 % attribute.name)
+            if buffer.divisor:
+                index = np.arange(instances) // buffer.divisor
+                data = data[np.repeat(index, vertices)]
+            else:
+                data = data[np.tile(np.arange(vertices), instances)]
+
+            expanded = self._expanded.get(attribute.name)
+            if expanded is None or expanded.size != len(data):
+                expanded = VertexBuffer(np.ascontiguousarray(data))
+                self._expanded[attribute.name] = expanded
+            else:
+                expanded[...] = data.reshape(-1).view(expanded.dtype)
+            attribute._data = expanded
+
+        size = vertices
+        if isinstance(indices, IndexBuffer):
+            size = indices.size
+            data = indices.data
+            if data is None and indices.base is not None:
+                start = indices.offset // indices.itemsize
+                if indices.base.data is not None:
+                    data = indices.base.data[start:start+indices.size]
+            if data is None:
+                raise ValueError("Cannot expand indices (no CPU storage)")
+            offsets = vertices * np.arange(instances, dtype=np.uint32)
+            data = (data.reshape(1,-1) + offsets.reshape(-1,1)).ravel()
+            expanded = self._expanded.get(None)
+            if expanded is None or expanded.size != len(data):
+                expanded = IndexBuffer(data.astype(np.uint32))
+                self._expanded[None] = expanded
+            else:
+                expanded[...] = data
+            indices = expanded
+
+        if ranges is None:
+            if count is None:
+                count = size - first
+            ranges = [(first, count)]
+        ranges = [(i*size + first, count) for i in range(instances)
+                  for first, count in self._ranges(ranges, size)]
+
+        self._vao_dirty = True
+        try:
+            self.draw(mode, indices, ranges=ranges)
+        finally:
+            for attribute, data in zip(attributes, saved):
+                attribute._data = data
+            self._vao_dirty = True
@@ -7,6 +7,8 @@ import re
 import os.path
 import numpy as np
 import OpenGL.GL as gl
+import glsl
+from cache import cache
 from globject import GLObject
 
 debug = 0
@@ -90,6 +92,14 @@ class Shader(GLObject):
         if not self._code:
             raise RuntimeError("No code has been given")
 
+        # Reuse a compiled shader having the same code
+        if self._handle <= 0:
+            handle = cache.get_shader(self._target, self._code)
+            if handle is not None:
+                if debug: print ("GPU: Reusing shader")
+                self._handle = handle
+                return
+
         # Check that shader object has been created
         if self._handle <= 0:
             self._handle = gl.glCreateShader(self._target)
@@ -109,12 +119,14 @@ class Shader(GLObject):
             lineno, mesg = self._parse_error(error)
             self._print_error(mesg, lineno-1)
             raise RuntimeError("Shader compilation error")
+        cache.add_shader(self._target, self._code, self._handle)
 
 
     def _delete(self):
-        """ Delete shader from GPU memory (if it was present). """
+        """ Delete shader from GPU memory (if it was present and unshared). """
 
-        gl.glDeleteShader(self._handle)
+        if cache.release_shader(self._handle):
+            gl.glDeleteShader(self._handle)
 
 
     def _parse_error(self, error):
@@ -186,42 +198,18 @@ class Shader(GLObject):
     def uniforms(self):
         """ Shader uniforms obtained from source code """
 
-        uniforms = []
-        regex = re.compile("""\s*uniform\s+(?P<type>\w+)\s+"""
-                           """(?P<name>\w+)\s*(\[(?P<size>\d+)\])?\s*;""")
-        for m in re.finditer(regex,self._code):
-            size = -1
-            gtype = Shader._gtypes[m.group('type')]
-            if m.group('size'):
-                size = int(m.group('size'))
-            if size >= 1:
-                for i in range(size):
-                    name = '%s[%d]' % (m.group('name'),i)
-                    uniforms.append((name, gtype))
-            else:
-                uniforms.append((m.group('name'), gtype))
-        return uniforms
+        declarations = glsl.parse(self._code)['uniforms']
+        return [(name, Shader._gtypes[vtype])
+                for name, vtype in glsl.expand(declarations)]
 
 
     @property
     def attributes(self):
         """ Shader attributes obtained from source code """
 
-        attributes = []
-        regex = re.compile("""\s*attribute\s+(?P<type>\w+)\s+"""
-                           """(?P<name>\w+)\s*(\[(?P<size>\d+)\])?\s*;""")
-        for m in re.finditer(regex,self._code):
-            size = -1
-            gtype = Shader._gtypes[m.group('type')]
-            if m.group('size'):
-                size = int(m.group('size'))
-            if size >= 1:
-                for i in range(size):
-                    name = '%s[%d]' % (m.group('name'),i)
-                    attributess.append((name, gtype))
-            else:
-                attributes.append((m.group('name'), gtype))
-        return attributes
+        declarations = glsl.parse(self._code)['attributes']
+        return [(name, Shader._gtypes[vtype])
+                for name, vtype in glsl.expand(declarations)]
 
 
 
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import OpenGL.GL as gl
+
+
+
+# ------------------------------------------------------------- State class ---
+class State(object):
+    """
+    Shadow of the binding state of the GL context.
+
+    GL objects ask the state whether a bind call is needed before issuing it
+    such that binding an object that is already bound is elided. Unbinding (to
+    zero) is lazy: it is only recorded and nothing is issued since the next bind
+    replaces the binding anyway. Since the state is plain Python, GL calls are
+    still made by the objects themselves::
+
+      if state.bind_buffer(gl.GL_ARRAY_BUFFER, handle):
+          gl.glBindBuffer(gl.GL_ARRAY_BUFFER, handle)
+
+    Unknown bindings (None) are always issued. If some foreign code changes the
+    GL state (or if the context changes), the state must be reset. In debug
+    mode, the shadow is validated against the actual GL state (glGetIntegerv)
+    before any call is elided and a RuntimeError is raised on mismatch.
+    """
+
+    # Binding queries (debug mode)
+    _queries = {
+        gl.GL_ARRAY_BUFFER:         gl.GL_ARRAY_BUFFER_BINDING,
+        gl.GL_ELEMENT_ARRAY_BUFFER: gl.GL_ELEMENT_ARRAY_BUFFER_BINDING,
+        gl.GL_PIXEL_UNPACK_BUFFER:  gl.GL_PIXEL_UNPACK_BUFFER_BINDING,
+        gl.GL_TEXTURE_1D:           gl.GL_TEXTURE_BINDING_1D,
+        gl.GL_TEXTURE_2D:           gl.GL_TEXTURE_BINDING_2D,
+    }
+
+
+    def __init__(self, enabled=True, debug=False):
+        """
+        Initialize the state
+
+        Parameters
+        ----------
+
+        enabled : bool
+            Whether redundant calls are elided (all calls are issued otherwise)
+
+        debug : bool
+            Whether to validate the shadow against the actual GL state
+        """
+
+        self.enabled = enabled
+        self.debug = debug
+        self._stats = { 'issued'   : 0,
+                        'elided'   : 0,
+                        'deferred' : 0 }
+        self.reset()
+
+
+    @property
+    def stats(self):
+        """ Number of issued, elided and deferred (unbind) calls """
+
+        return dict(self._stats)
+
+
+    def reset(self):
+        """ Forget about the GL state (all bindings become unknown) """
+
+        self._program = None
+        self._buffers = {}
+        self._unit = None
+        self._textures = {}
+        self._values = {}
+
+        # Vertex array state (pointers, enabled arrays, divisors and element
+        # buffer) of the bound vertex array object and of the other ones
+        self._vao = None
+        self._vertex_arrays = {}
+        self._attributes = {}
+        self._arrays = {}
+        self._divisors = {}
+
+
+    def _check(self, name, pname, value):
+        """ Check a shadowed value against the actual GL state (debug mode) """
+
+        actual = gl.glGetIntegerv(pname)
+        if actual != value:
+            raise RuntimeError("GL state mismatch (%s is %s instead of %s)"
+                               % (name, actual, value))
+
+
+    def _bind(self, key, value, pname, bindings):
+        """ Record a binding, return whether it has to be issued """
+
+        if self.enabled and bindings.get(key, None) == value:
+            if self.debug and pname is not None:
+                self._check(key, pname, value)
+            self._stats['elided'] += 1
+            return False
+        bindings[key] = value
+        self._stats['issued'] += 1
+        return True
+
+
+    def _unbind(self, key, bindings):
+        """ Record an unbind, return whether it has to be issued """
+
+        if self.enabled:
+            self._stats['deferred'] += 1
+            return False
+        bindings[key] = 0
+        self._stats['issued'] += 1
+        return True
+
+
+    # --- Programs ---
+    def use_program(self, handle):
+        """ Whether glUseProgram(handle) has to be issued """
+
+        if self.enabled and self._program == handle:
+            if self.debug:
+                self._check('program', gl.GL_CURRENT_PROGRAM, handle)
+            self._stats['elided'] += 1
+            return False
+        self._program = handle
+        self._stats['issued'] += 1
+        return True
+
+
+    def unuse_program(self):
+        """ Whether glUseProgram(0) has to be issued """
+
+        if self.enabled:
+            self._stats['deferred'] += 1
+            return False
+        self._program = 0
+        self._stats['issued'] += 1
+        return True
+
+
+    def delete_program(self, handle):
+        """ Forget about a deleted program """
+
+        if self._program == handle:
+            self._program = None
+
+
+    # --- Buffers ---
+    def bind_buffer(self, target, handle):
+        """ Whether glBindBuffer(target, handle) has to be issued """
+
+        return self._bind(target, handle, State._queries.get(target),
+                          self._buffers)
+
+
+    def unbind_buffer(self, target):
+        """ Whether glBindBuffer(target, 0) has to be issued """
+
+        return self._unbind(target, self._buffers)
+
+
+    def delete_buffers(self, handles):
+        """ Forget about deleted buffers (GL unbinds them) """
+
+        for target, handle in self._buffers.items():
+            if handle in handles:
+                self._buffers[target] = 0
+
+
+    # --- Textures ---
+    def active_texture(self, unit):
+        """ Whether glActiveTexture(GL_TEXTURE0+unit) has to be issued """
+
+        if self.enabled and self._unit == unit:
+            if self.debug:
+                self._check('unit', gl.GL_ACTIVE_TEXTURE, gl.GL_TEXTURE0+unit)
+            self._stats['elided'] += 1
+            return False
+        self._unit = unit
+        self._stats['issued'] += 1
+        return True
+
+
+    def bind_texture(self, target, handle):
+        """ Whether glBindTexture(target, handle) has to be issued """
+
+        # Texture bindings are per unit (unknown unit means unknown binding)
+        if self._unit is None:
+            self._stats['issued'] += 1
+            return True
+        return self._bind((self._unit, target), handle,
+                          State._queries.get(target), self._textures)
+
+
+    def unbind_texture(self, target):
+        """ Whether glBindTexture(target, 0) has to be issued """
+
+        return self._unbind((self._unit, target), self._textures)
+
+
+    def delete_textures(self, handles):
+        """ Forget about deleted textures (GL unbinds them) """
+
+        for key, handle in self._textures.items():
+            if handle in handles:
+                self._textures[key] = 0
+
+
+    # --- Vertex arrays ---
+    def bind_vertex_array(self, handle):
+        """ Whether glBindVertexArray(handle) has to be issued """
+
+        if self.enabled and self._vao == handle:
+            if self.debug:
+                self._check('vertex array', gl.GL_VERTEX_ARRAY_BINDING, handle)
+            self._stats['elided'] += 1
+            return False
+
+        # Save state of current vertex array and restore the new one
+        target = gl.GL_ELEMENT_ARRAY_BUFFER
+        if self._vao is not None:
+            self._vertex_arrays[self._vao] = (self._attributes, self._arrays,
+                                              self._divisors,
+                                              self._buffers.get(target, None))
+        self._attributes, self._arrays, self._divisors, element = \
+            self._vertex_arrays.pop(handle, ({}, {}, {}, None))
+        self._buffers[target] = element
+        self._vao = handle
+        self._stats['issued'] += 1
+        return True
+
+
+    def delete_vertex_arrays(self, handles):
+        """ Forget about deleted vertex arrays (GL unbinds them) """
+
+        for handle in handles:
+            self._vertex_arrays.pop(handle, None)
+        if self._vao in handles:
+            self._vao = None
+            self._attributes, self._arrays, self._divisors = {}, {}, {}
+            self._buffers.pop(gl.GL_ELEMENT_ARRAY_BUFFER, None)
+
+
+    def vertex_attribute(self, location, value):
+        """
+        Whether a vertex attribute pointer has to be set up. The value is any
+        hashable description of the pointer (buffer, offset, stride, type).
+        """
+
+        return self._bind(location, value, None, self._attributes)
+
+
+    def vertex_value(self, location, value):
+        """ Whether a generic vertex attribute value has to be set """
+
+        return self._bind(location, value, None, self._values)
+
+
+    def vertex_divisor(self, location, divisor):
+        """
+        Whether glVertexAttribDivisor(location, divisor) has to be issued.
+        Unknown divisors are zero (GL default) such that drawing without
+        instances never issues it.
+        """
+
+        if self.enabled and self._divisors.get(location, 0) == divisor:
+            self._stats['elided'] += 1
+            return False
+        self._divisors[location] = divisor
+        self._stats['issued'] += 1
+        return True
+
+
+    def enable_attribute(self, location):
+        """ Whether glEnableVertexAttribArray(location) has to be issued """
+
+        return self._bind(location, True, None, self._arrays)
+
+
+    def disable_attribute(self, location):
+        """ Whether glDisableVertexAttribArray(location) has to be issued """
+
+        return self._bind(location, False, None, self._arrays)
+
+
+
+# Global state (current context)
+state = State()
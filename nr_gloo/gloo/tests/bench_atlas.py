@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Packing benchmark of TextureAtlas.
+
+Random regions (glyphs, sprites, dash patterns) are allocated until the atlas
+is full. We report the number of packed regions, the utilisation and the time
+per allocation, compared with a linear allocator using one texture row band
+per region (as DashAtlas does). We then free half of the regions at random,
+refill the atlas before and after defragmentation and report the bytes that
+are uploaded (only new rectangles are uploaded).
+
+Usage: bench_atlas.py [size]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+
+import texture
+from glstub import GLStub
+from atlas import TextureAtlas
+
+
+def uploaded(calls, channels=1):
+    """ Number of bytes uploaded by recorded calls """
+
+    return sum([args[4]*args[5]*channels for name, args in calls
+                if name == "glTexSubImage2D"])
+
+
+def fill(A, shapes):
+    """ Allocate (and write) regions until the atlas is full """
+
+    regions = []
+    for shape in shapes:
+        try:
+            R = A.allocate(shape)
+        except ValueError:
+            break
+        R[...] = 255
+        regions.append(R)
+    return regions
+
+
+def linear(size, shapes):
+    """ Number of regions packed with one row band per region """
+
+    y, count = 0, 0
+    for height, width in shapes:
+        if y + height > size or width > size:
+            break
+        y, count = y+height, count+1
+    return count
+
+
+def run(name, size, shapes):
+    """ Pack, free half, refill, defragment and refill """
+
+    texture.gl.reset()
+    A = TextureAtlas((size,size), np.uint8)
+    A.texture.activate()
+    texture.gl.reset()
+
+    t0 = time.time()
+    regions = fill(A, shapes)
+    elapsed = time.time() - t0
+    A.texture.activate()
+    print("%-20s %6d regions (%6d linear) %5.1f%% used %6.2f us/alloc "
+          "%9d bytes" % (name, len(regions), linear(size, shapes),
+          100*A.utilisation, 1e6*elapsed/max(len(regions),1),
+          uploaded(texture.gl.calls)))
+
+    # Churn: free half of the regions and refill
+    for i in np.random.permutation(len(regions))[:len(regions)//2]:
+        A.free(regions[i])
+    texture.gl.reset()
+    refill = fill(A, shapes[len(regions):])
+    A.texture.activate()
+    print("%-20s %6d regions refilled     %5.1f%% used            "
+          "%9d bytes" % ("  after free", len(refill), 100*A.utilisation,
+          uploaded(texture.gl.calls)))
+
+    texture.gl.reset()
+    t0 = time.time()
+    A.defragment()
+    elapsed = time.time() - t0
+    refill = fill(A, shapes[len(regions)+len(refill):])
+    A.texture.activate()
+    print("%-20s %6d regions refilled     %5.1f%% used %6.2f ms defrag "
+          "%9d bytes" % ("  after defragment", len(refill), 100*A.utilisation,
+          1000*elapsed, uploaded(texture.gl.calls)))
+
+
+if __name__ == '__main__':
+    texture.gl = GLStub()
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    np.random.seed(1)
+    n = 100000
+
+    glyphs = zip(np.random.randint(8, 25, n), np.random.randint(4, 21, n))
+    sprites = [(s, s) for s in np.random.randint(16, 65, n)]
+    dashes = [(1, size)] * n
+    mixed = list(glyphs[:n//2]) + sprites[:n//2]
+    np.random.shuffle(mixed)
+
+    run("glyphs", size, glyphs)
+    run("sprites", size, sprites)
+    run("dash patterns", size, dashes)
+    run("mixed", size, mixed)
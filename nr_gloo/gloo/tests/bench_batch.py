@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Recorded-call benchmark of batched uniforms.
+
+Many objects (a triangle each) having their own transform and color are drawn
+either using one program per object or using a single batch program. We report
+the number of GL calls per frame, the number of draw calls and the time per
+frame (one object moving per frame) using a recording GL stub.
+
+Usage: bench_batch.py [objects] [frames]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+import OpenGL.GL as gl
+
+import backend
+from glstub import GLStub
+from program import Program
+from batch import BatchProgram
+
+
+vertex = """
+uniform mat4 u_model;
+uniform vec4 u_color;
+attribute vec2 a_position;
+attribute float a_batch;
+void main() { gl_Position = u_model*vec4(a_position, 0.0, 1.0); }
+"""
+
+fragment = """
+uniform vec4 u_color;
+void main() { gl_FragColor = u_color; }
+"""
+
+
+def programs(count):
+    """ One program per object """
+
+    G = GLStub()
+    backend.use(G)
+    objects = []
+    for i in range(count):
+        P = Program(vertex, fragment)
+        P.bind(np.zeros(3, [("a_position", np.float32, 2)]))
+        P["u_model"] = np.eye(4)
+        P["u_color"] = np.random.uniform(0, 1, 4)
+        objects.append(P)
+
+    def draw(frame):
+        objects[frame % count]["u_model"] = np.eye(4)*(frame+1)
+        for P in objects:
+            P.draw(gl.GL_TRIANGLES)
+    return G, draw
+
+
+def batch(count):
+    """ One batch program for all objects """
+
+    G = GLStub()
+    backend.use(G)
+    P = BatchProgram(vertex, fragment, batch=count)
+    vertices = np.zeros(3*count, [("a_position", np.float32, 2),
+                                  ("a_batch", np.float32, 1)])
+    vertices["a_batch"] = np.repeat(np.arange(count), 3)
+    P.bind(vertices)
+    P["u_model"] = np.eye(4).ravel()
+    P["u_color"] = np.random.uniform(0, 1, (count,4))
+
+    def draw(frame):
+        P["u_model", frame % count] = np.eye(4)*(frame+1)
+        P.draw(gl.GL_TRIANGLES)
+    return G, draw
+
+
+def run(name, setup, count, frames):
+    """ Draw objects and report calls per frame """
+
+    G, draw = setup(count)
+    draw(0)
+    G.reset()
+    t0 = time.time()
+    for frame in range(frames):
+        draw(frame)
+    elapsed = time.time() - t0
+    draws = G.count("glDrawArrays")
+    print("%-10s %8d calls/frame %6d draws/frame %8.2f ms/frame" % (name,
+          len(G.calls)//frames, draws//frames, 1000*elapsed/frames))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    run("programs", programs, count, frames)
+    run("batch", batch, count, frames)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+CPU-side benchmark of buffer uploads.
+
+GL calls are recorded (not issued) such that no GL context is needed. For
+each scenario, we report the number of pending writes (= number of
+glBufferSubData that would be issued without coalescing), the number of GL
+calls actually issued, the number of bytes uploaded and the time spent in
+Python.
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+
+import buffer
+from glstub import GLStub
+from buffer import VertexBuffer
+
+
+def uploaded(calls):
+    """ Number of bytes uploaded by recorded calls """
+
+    nbytes = 0
+    for name, args in calls:
+        if name == "glBufferData":
+            nbytes += args[1]
+        elif name == "glBufferSubData":
+            nbytes += args[2]
+    return nbytes
+
+
+def run(name, B, write, frames=10):
+    """ Run `write` for a number of frames and upload pending data """
+
+    B.activate()
+    buffer.gl.reset()
+    pending, elapsed = 0, 0.0
+    for frame in range(frames):
+        write(B)
+        pending += len(B._pending_data)
+        t0 = time.time()
+        B._update()
+        elapsed += time.time() - t0
+    print("%-32s %8d writes %8d calls %10d bytes %8.2f ms" % (
+        name, pending//frames, buffer.gl.count()//frames,
+        uploaded(buffer.gl.calls)//frames, 1000*elapsed/frames))
+
+
+if __name__ == '__main__':
+    buffer.gl = GLStub()
+    n = 100000
+    dtype = [('a_position', np.float32, 2)]
+    chunk = 10
+    Z = np.zeros(chunk, dtype)
+    Z['a_position'] = np.random.uniform(-1, 1, (chunk,2))
+
+    def sequential(B):
+        for i in range(0, n, chunk):
+            B[i:i+chunk] = Z
+
+    def scattered(B):
+        for i in np.random.randint(0, n-chunk, 1000):
+            B[i:i+chunk] = Z
+
+    def sparse(B):
+        for i in range(0, n-chunk, 1000):
+            B[i:i+chunk] = Z
+
+    def colors(B):
+        color = B.data['a_color'].copy()
+        color[np.random.randint(0, n-chunk):][:chunk] = np.random.uniform(0,1,4)
+        B['a_color'] = color
+
+    run("sequential (store)", VertexBuffer(np.zeros(n, dtype)), sequential)
+    run("scattered (store)", VertexBuffer(np.zeros(n, dtype)), scattered)
+    run("sparse (store)", VertexBuffer(np.zeros(n, dtype)), sparse)
+    run("sequential (no store)",
+        VertexBuffer(np.zeros(n, dtype), store=False), sequential)
+    run("sparse (no store)",
+        VertexBuffer(np.zeros(n, dtype), store=False), sparse)
+
+    dtype = [('a_position', np.float32, 3), ('a_color', np.float32, 4)]
+    run("field (store)", VertexBuffer(np.zeros(n, dtype)), colors)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Recorded-call benchmark of command lists.
+
+Many objects (a program each with its own transform and color) are drawn
+either immediately (Program.draw for each object) or by replaying a command
+list recorded once. One object moves per frame. We report the number of GL
+calls per frame and the time per frame using a recording GL stub (the stub
+cost is the same for both paths).
+
+Usage: bench_command.py [objects] [frames]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+import OpenGL.GL as gl
+
+import backend
+from glstub import GLStub
+from program import Program
+from command import CommandList
+
+
+vertex = """
+uniform mat4 u_model;
+uniform vec4 u_color;
+attribute vec2 a_position;
+void main() { gl_Position = u_model*vec4(a_position, 0.0, 1.0); }
+"""
+
+fragment = """
+uniform vec4 u_color;
+void main() { gl_FragColor = u_color; }
+"""
+
+
+def scene(count):
+    """ One program per object """
+
+    G = GLStub()
+    backend.use(G)
+    objects = []
+    for i in range(count):
+        P = Program(vertex, fragment)
+        P.bind(np.zeros(3, [("a_position", np.float32, 2)]))
+        P["u_model"] = np.eye(4)
+        P["u_color"] = np.random.uniform(0, 1, 4)
+        objects.append(P)
+    return G, objects
+
+
+def immediate(count):
+    """ Programs drawn one after the other """
+
+    G, objects = scene(count)
+
+    def draw(frame):
+        objects[frame % count]["u_model"] = np.eye(4)*(frame+1)
+        for P in objects:
+            P.draw(gl.GL_TRIANGLES)
+    return G, draw
+
+
+def replay(count):
+    """ Command list recorded once and replayed """
+
+    G, objects = scene(count)
+    commands = CommandList()
+    with commands:
+        for P in objects:
+            commands.draw(P, gl.GL_TRIANGLES)
+
+    def draw(frame):
+        objects[frame % count]["u_model"] = np.eye(4)*(frame+1)
+        commands.replay()
+    return G, draw
+
+
+def run(name, setup, count, frames):
+    """ Draw objects and report calls per frame """
+
+    G, draw = setup(count)
+    draw(0)
+    G.reset()
+    t0 = time.time()
+    for frame in range(frames):
+        draw(frame)
+    elapsed = time.time() - t0
+    print("%-10s %8d calls/frame %8.2f ms/frame" % (name,
+          len(G.calls)//frames, 1000*elapsed/frames))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    run("immediate", immediate, count, frames)
+    run("replay", replay, count, frames)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Headless frame benchmark of gloo hot paths.
+
+Typical frames are run using the null GL backend (no GL context, no GPU):
+calls are counted and never issued such that the time per frame is the Python
+overhead of gloo. We report the time per frame (median over frames), GL calls,
+draw calls and uploaded bytes per frame for each scene:
+
+  uniforms   many programs, one uniform changing per frame
+  buffer     large vertex buffer, scattered vertices changing per frame
+  texture    large texture, small rectangles changing per frame
+  instanced  many instances, offsets changing per frame
+  replay     'uniforms' scene replayed from a command list
+
+Usage: bench_frame.py [frames] [scene ...]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import OpenGL.GL as gl
+
+import backend
+from program import Program
+from texture import Texture2D
+from command import CommandList
+from buffer import VertexBuffer, IndexBuffer
+
+
+vertex = """
+uniform mat4 u_model;
+uniform vec4 u_color;
+uniform sampler2D u_texture;
+attribute vec2 a_position;
+attribute vec2 a_offset;
+void main() { gl_Position = u_model*vec4(a_position+a_offset, 0.0, 1.0); }
+"""
+
+fragment = """
+uniform vec4 u_color;
+void main() { gl_FragColor = u_color; }
+"""
+
+
+def program(texture, count=3):
+    """ Program with a few vertices """
+
+    P = Program(vertex, fragment)
+    P.bind(VertexBuffer(np.zeros(count, [("a_position", np.float32, 2),
+                                         ("a_offset",   np.float32, 2)])))
+    P["u_model"] = np.eye(4)
+    P["u_color"] = np.random.uniform(0, 1, 4)
+    P["u_texture"] = texture
+    return P
+
+
+def programs(count):
+    """ One program per object """
+
+    T = Texture2D(np.zeros((4,4,4), np.uint8))
+    return [program(T) for i in range(count)]
+
+
+def uniforms():
+    objects = programs(1000)
+
+    def frame(i):
+        objects[i % len(objects)]["u_color"] = i,0,0,1
+        for P in objects:
+            P.draw(gl.GL_TRIANGLES)
+    return frame
+
+
+def replay():
+    objects = programs(1000)
+    commands = CommandList()
+    with commands:
+        for P in objects:
+            commands.draw(P, gl.GL_TRIANGLES)
+
+    def frame(i):
+        objects[i % len(objects)]["u_color"] = i,0,0,1
+        commands.replay()
+    return frame
+
+
+def vertices():
+    n = 1000000
+    P = program(Texture2D(np.zeros((4,4,4), np.uint8)), n)
+    V = P._attributes["a_position"].data.base
+    data = np.ones(1, V.dtype)
+
+    def frame(i):
+        for j in range(100):
+            V.set_data(data, offset=((i*7919 + j*104729) % n)*V.itemsize)
+        P.draw(gl.GL_POINTS)
+    return frame
+
+
+def textures():
+    T = Texture2D(np.zeros((2048,2048,4), np.uint8))
+    P = program(T, 4)
+    data = np.ones((16,16,4), np.uint8)
+
+    def frame(i):
+        for j in range(16):
+            y, x = 16*((i+j*37) % 128), 16*((i*3+j*11) % 128)
+            T[y:y+16, x:x+16] = data
+        P.draw(gl.GL_TRIANGLE_STRIP)
+    return frame
+
+
+def instanced():
+    n = 100000
+    P = program(Texture2D(np.zeros((4,4,4), np.uint8)))
+    P["a_position"] = VertexBuffer(np.zeros((4,2), np.float32))
+    instances = VertexBuffer(np.zeros(n, [("a_offset", np.float32, 2)]),
+                             divisor=1)
+    P.bind(instances)
+    I = IndexBuffer(np.array([0,1,2,0,2,3], np.uint32))
+    offsets = np.random.uniform(-1, 1, (n,2)).astype(np.float32)
+
+    def frame(i):
+        instances.set_data(offsets.view(instances.dtype).reshape(-1))
+        P.draw(gl.GL_TRIANGLES, I, instances=n)
+    return frame
+
+
+scenes = [("uniforms",  uniforms),
+          ("buffer",    vertices),
+          ("texture",   textures),
+          ("instanced", instanced),
+          ("replay",    replay)]
+
+
+def run(name, setup, frames):
+    """ Run frames of a scene and report median time and mean counts """
+
+    G = backend.NullGL()
+    previous = backend.use(G)
+    try:
+        frame = setup()
+        frame(0)
+        G.reset()
+        for i in range(1, frames+1):
+            with G.frame():
+                frame(i)
+    finally:
+        backend.use(previous)
+    times = sorted([f["time"] for f in G.frames])
+    mean = lambda key: sum([f[key] for f in G.frames]) / float(frames)
+    print("%-10s %8.2f ms/frame %8d calls/frame %6d draws/frame %10.1f KB/frame"
+          % (name, 1000*times[len(times)//2], mean("calls"), mean("draws"),
+             mean("bytes")/1024.0))
+
+
+if __name__ == '__main__':
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    names = sys.argv[2:] or [name for name, setup in scenes]
+    for name, setup in scenes:
+        if name in names:
+            run(name, setup, frames)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Micro-benchmark of the GLSL declaration parser.
+
+Large generated shaders (spatial filters up to radius 4, FXAA, SMAA) are
+scanned for uniforms and attributes the way shaders used to do it (regexes
+compiled and source scanned at each access), parsed from scratch (single pass
+giving all declarations and functions) and parsed through the cache.
+
+Usage: bench_glsl.py [repeat]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import re
+import time
+import glsl
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..')
+sources = [os.path.join(root, 'nr_gloo', 'spatial-filters.frag'),
+           os.path.join(root, 'fsaa', 'fxaa.glsl'),
+           os.path.join(root, 'fsaa', 'smaa.glsl')]
+
+
+def regex(code):
+    """ Uniforms and attributes as they used to be scanned """
+
+    declarations = []
+    for qualifier in ('uniform', 'attribute'):
+        regex = re.compile("""\s*%s\s+(?P<type>\w+)\s+"""
+                           """(?P<name>\w+)\s*(\[(?P<size>\d+)\])?\s*;""" % qualifier)
+        for m in re.finditer(regex, code):
+            declarations.append((m.group('name'), m.group('type')))
+    return declarations
+
+
+def run(name, function, code, repeat):
+    """ Time function over code """
+
+    t0 = time.time()
+    for i in range(repeat):
+        function(code)
+    elapsed = time.time() - t0
+    print("  %-8s %10.3f ms/parse" % (name, 1000*elapsed/repeat))
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    for filename in sources:
+        if not os.path.exists(filename):
+            continue
+        code = open(filename).read()
+        declarations = glsl.parse(code)
+        print("%s (%d bytes, %d tokens, %d uniforms, %d functions)" % (
+              os.path.basename(filename), len(code), len(glsl.tokenize(code)),
+              len(declarations['uniforms']), len(declarations['functions'])))
+        run("regex", regex, code, repeat)
+        run("parse", glsl._parse, code, repeat)
+        run("cached", glsl.parse, code, repeat)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Recorded-call benchmark of instanced drawing.
+
+Many quads (4 vertices, 6 indices) having their own offset and color are drawn
+using instanced drawing (divisor attributes) or the CPU fallback (geometry
+expanded for each instance), using a recording GL stub. We report the GPU
+memory allocated for buffers, the number of bytes uploaded per frame (one
+offset changing per frame) and the time per frame.
+
+Usage: bench_instancing.py [instances] [frames]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+import OpenGL.GL as gl
+
+import backend
+from memory import registry
+from glstub import GLStub
+from program import Program
+from buffer import VertexBuffer, IndexBuffer
+
+
+vertex = """
+attribute vec2 a_position;
+attribute vec2 a_offset;
+attribute vec4 a_color;
+"""
+
+def uploads(G):
+    """ Uploaded bytes of recorded calls """
+
+    uploaded = 0
+    for name, args in G.calls:
+        if name == "glBufferData" and args[2] is not None:
+            uploaded += args[1]
+        elif name == "glBufferSubData":
+            uploaded += args[2]
+    return uploaded
+
+
+def run(name, count, frames, support):
+    """ Draw instances and report memory and uploads """
+
+    G = GLStub()
+    backend.use(G)
+    Program._instancing_support = support
+
+    quad = np.array([(-1,-1), (-1,+1), (+1,-1), (+1,+1)], np.float32)
+    instances = np.zeros(count, [("a_offset", np.float32, 2),
+                                 ("a_color",  np.float32, 4)])
+    instances["a_offset"] = np.random.uniform(-1, 1, (count,2))
+    instances["a_color"] = np.random.uniform(0, 1, (count,4))
+    instances = VertexBuffer(instances, divisor=1)
+    indices = IndexBuffer(np.array([0,1,2,1,2,3], np.uint32))
+
+    P = Program(vertex, "void main() {}")
+    P["a_position"] = VertexBuffer(quad)
+    P.bind(instances)
+    total = registry.total
+    P.draw(gl.GL_TRIANGLES, indices, instances=count)
+    allocated, uploaded = registry.total - total, uploads(G)
+
+    G.reset()
+    t0 = time.time()
+    for frame in range(frames):
+        instances[frame % count] = ((frame, frame), (1,1,1,1))
+        P.draw(gl.GL_TRIANGLES, indices, instances=count)
+    elapsed = time.time() - t0
+    frame_uploaded = uploads(G)
+
+    print("%-10s %8.2f MB allocated %8.2f MB first upload "
+          "%10d bytes/frame %8.2f ms/frame" % (name, allocated/1e6,
+          uploaded/1e6, frame_uploaded//frames, 1000*elapsed/frames))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    support = Program._instancing_support
+    run("instanced", count, frames, True)
+    run("expanded", count, frames, False)
+    Program._instancing_support = support
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Out-of-core benchmark of MappedVertexBuffer.
+
+A (sparse) synthetic file of several GB is created and a window is moved
+across it, frame after frame, as when panning over a huge point cloud. Uploads
+are copied into a fake GPU memory such that pages are actually read. We report
+the number of paged-in pages, the uploaded bytes and the peak resident memory
+that must stay bounded by the budget whatever the file size.
+
+Usage: bench_mapped.py [file size in GB] [budget in MB]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import resource
+import tempfile
+import numpy as np
+
+import buffer
+from glstub import GLStub
+from buffer import MappedVertexBuffer
+
+
+class GPU(GLStub):
+    """ Recording stub copying uploads into a fake GPU memory """
+
+    def glBufferData(self, target, nbytes, data, usage):
+        self.calls.append(("glBufferData", (target, nbytes, None, usage)))
+        self.memory = np.zeros(nbytes, np.uint8)
+        if data is not None:
+            self.memory[...] = np.asarray(data).reshape(-1).view(np.uint8)
+        self.uploaded += nbytes
+
+    def glBufferSubData(self, target, offset, nbytes, data):
+        self.calls.append(("glBufferSubData", (target, offset, nbytes, None)))
+        data = np.asarray(data).reshape(-1).view(np.uint8)
+        self.memory[offset:offset+nbytes] = data
+        self.uploaded += nbytes
+
+
+def rss():
+    """ Peak resident memory (MB) """
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+if __name__ == '__main__':
+    gigabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+    budget = int(float(sys.argv[2]) if len(sys.argv) > 2 else 64) * 1024**2
+
+    dtype = np.dtype([('a_position', np.float32, 3),
+                      ('a_color',    np.uint8,   4)])
+    count = int(gigabytes * 1024**3) // dtype.itemsize
+    handle, filename = tempfile.mkstemp()
+    os.close(handle)
+    try:
+        with open(filename, 'wb') as file:
+            file.truncate(count * dtype.itemsize)
+
+        gpu = GPU()
+        gpu.uploaded = 0
+        buffer.gl = gpu
+        start = rss()
+        B = MappedVertexBuffer(filename, dtype, budget=budget)
+        window = B.nbytes // dtype.itemsize // 2
+        step = window // 4
+
+        t0 = time.time()
+        frames = 0
+        for first in range(0, count - window, step):
+            B.set_windows([(first, first + window)])
+            B.activate()
+            gpu.reset()
+            frames += 1
+        elapsed = time.time() - t0
+
+        print("File size:      %8.2f GB (%d items)" % (gigabytes, count))
+        print("Budget:         %8.2f MB" % (budget / 1024.0**2))
+        print("Frames:         %8d" % frames)
+        print("Pages in:       %8d" % B._paged)
+        print("Uploaded:       %8.2f GB" % (gpu.uploaded / 1024.0**3))
+        print("Time:           %8.2f s" % elapsed)
+        print("Peak RSS:       %8.2f MB (%.2f MB before)" % (rss(), start))
+    finally:
+        os.remove(filename)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Stress benchmark of BufferPool.
+
+Random allocations and frees (with random sizes) are issued on a pool, the
+number of live allocations oscillating around a target. GL calls are recorded
+(not issued) such that no GL context is needed. For each pattern, we report
+the time per operation, the number of compactions and growths, the final
+utilisation and fragmentation and the number of GL buffers that would have
+been needed without the pool.
+
+Usage: bench_pool.py [operations]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+
+import buffer
+from glstub import GLStub
+from pool import BufferPool
+
+
+def run(name, sizes, operations, live=1000, capacity=65536):
+    """ Random alloc/free with allocation sizes drawn from `sizes` """
+
+    dtype = np.dtype([('a_position', np.float32, 3)])
+    P = BufferPool(dtype, capacity=capacity)
+    compactions = [0]
+    compact = P.compact
+    def counted():
+        compactions[0] += 1
+        compact()
+    P.compact = counted
+
+    views, allocs = [], 0
+    t0 = time.time()
+    for i in range(operations):
+        if views and np.random.uniform(0, 2*live) < len(views):
+            P.free(views.pop(np.random.randint(len(views))))
+        else:
+            views.append(P.alloc(sizes()))
+            allocs += 1
+    elapsed = time.time() - t0
+
+    stats = P.stats
+    print("%-16s %6.2f us/op %4d compactions %8d items %5.1f%% used "
+          "%5.1f%% fragmented %6d blocks (%d buffers without pool)" % (
+          name, 1e6*elapsed/operations, compactions[0], stats['capacity'],
+          100*stats['utilisation'], 100*stats['fragmentation'],
+          stats['free blocks'], allocs))
+
+
+if __name__ == '__main__':
+    buffer.gl = GLStub()
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    np.random.seed(1)
+
+    run("fixed (4)", lambda: 4, operations)
+    run("uniform (1-256)", lambda: np.random.randint(1, 257), operations)
+    run("exponential", lambda: 1 + int(np.random.exponential(64)), operations)
+    run("bimodal", lambda: np.random.choice([4, 1024], p=[0.9, 0.1]),
+        operations)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+Recorded-call benchmark of the GL state shadow.
+
+A scene made of many small programs (own vertex buffer, static uniforms, a
+texture shared by groups of programs) is drawn several frames using a
+recording GL stub. We report the number of GL calls per frame (binds, program
+uses, uniform uploads, attribute pointers) and the time per frame, with
+redundant calls elided (state enabled) or not.
+
+Usage: bench_state.py [programs] [frames]
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+import OpenGL.GL as gl
+
+import backend
+from state import state
+from glstub import GLStub
+from program import Program
+from texture import Texture2D
+
+
+vertex = """
+uniform float u_scale;
+uniform vec4  u_color;
+uniform sampler2D u_texture;
+attribute vec2 a_position;
+"""
+
+def scene(count, groups=16):
+    """ Build count programs sharing groups textures """
+
+    textures = [Texture2D(np.zeros((8,8,4), np.uint8)) for i in range(groups)]
+    programs = []
+    for i in range(count):
+        P = Program(vertex, "void main() {}")
+        P.bind(np.zeros(6, [("a_position", np.float32, 2)]))
+        P["u_scale"] = 1
+        P["u_color"] = 1,1,1,1
+        P["u_texture"] = textures[i*groups // count]
+        programs.append(P)
+    return programs
+
+
+def run(name, count, frames, enabled):
+    """ Draw the scene and report calls per frame """
+
+    G = GLStub()
+    backend.use(G)
+    state.enabled = enabled
+    programs = scene(count)
+    for P in programs:
+        P.draw()
+
+    G.reset()
+    t0 = time.time()
+    for frame in range(frames):
+        for i, P in enumerate(programs):
+            # Mostly static uniforms, a few change every frame
+            P["u_scale"] = 1
+            if i % 100 == 0:
+                P["u_color"] = frame, 1, 1, 1
+            P.draw()
+    elapsed = time.time() - t0
+
+    calls = {}
+    for call, args in G.calls:
+        calls[call] = calls.get(call, 0) + 1
+    names = sorted(calls.keys())
+    print("%-10s %8d calls/frame %7.2f ms/frame" % (name,
+          len(G.calls)//frames, 1000*elapsed/frames))
+    for call in names:
+        print("  %-24s %8d" % (call, calls.get(call, 0)//frames))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    run("no state", count, frames, enabled=False)
+    run("state", count, frames, enabled=True)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+"""
+CPU-side benchmark of Texture2D partial uploads.
+
+GL calls are recorded (not issued) such that no GL context is needed. For
+random-rectangle workloads, we report the number of pending writes (= number
+of glTexSubImage2D that would be issued without merging) with the bytes they
+represent, the number of glTexSubImage2D actually issued, the number of bytes
+uploaded and the time spent in Python (with and without pixel buffers).
+"""
+import os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import numpy as np
+
+import texture
+from glstub import GLStub
+from texture import Texture2D
+
+
+def uploaded(T, calls):
+    """ Number of uploads and bytes uploaded by recorded calls """
+
+    count, nbytes = 0, 0
+    for name, args in calls:
+        if name == "glTexSubImage2D":
+            count += 1
+            nbytes += args[4]*args[5]*T.shape[-1]*np.dtype(T.dtype).itemsize
+    return count, nbytes
+
+
+def run(name, T, write, frames=10):
+    """ Run `write` for a number of frames and upload pending data """
+
+    T.activate()
+    texture.gl.reset()
+    pending, written, elapsed = 0, 0, 0.0
+    for frame in range(frames):
+        write(T)
+        pending += len(T._pending_data)
+        written += sum([data.nbytes for data, offset in T._pending_data])
+        t0 = time.time()
+        T._update()
+        elapsed += time.time() - t0
+    count, nbytes = uploaded(T, texture.gl.calls)
+    print("%-28s %6d writes %10d bytes %6d calls %10d bytes %8.2f ms" % (
+        name, pending//frames, written//frames, count//frames,
+        nbytes//frames, 1000*elapsed/frames))
+
+
+def rectangles(count, size, tiled=False):
+    """ Write `count` random rectangles of at most size x size texels """
+
+    def write(T):
+        for i in range(count):
+            h, w = np.random.randint(1, size+1, 2)
+            if tiled:
+                y = np.random.randint(0, T.height//size)*size
+                x = np.random.randint(0, T.width//size)*size
+                h, w = size, size
+            else:
+                y = np.random.randint(0, T.height-h)
+                x = np.random.randint(0, T.width-w)
+            T[y:y+h, x:x+w] = np.random.randint(0, 255)
+    return write
+
+
+def clustered(count, size):
+    """ Write `count` small rectangles around a random point """
+
+    def write(T):
+        cy = np.random.randint(size, T.height-2*size)
+        cx = np.random.randint(size, T.width-2*size)
+        for i in range(count):
+            y = cy + np.random.randint(-size, size)
+            x = cx + np.random.randint(-size, size)
+            T[y:y+4, x:x+4] = np.random.randint(0, 255)
+    return write
+
+
+if __name__ == '__main__':
+    texture.gl = GLStub()
+    np.random.seed(1)
+    shape = 2048, 2048, 4
+
+    run("sparse (10 x 16px)", Texture2D(np.zeros(shape, np.uint8)),
+        rectangles(10, 16))
+    run("scattered (1000 x 16px)", Texture2D(np.zeros(shape, np.uint8)),
+        rectangles(1000, 16))
+    run("tiles (100 x 64px)", Texture2D(np.zeros(shape, np.uint8)),
+        rectangles(100, 64, tiled=True))
+    run("clustered (500 x 4px)", Texture2D(np.zeros(shape, np.uint8)),
+        clustered(500, 64))
+    run("large (10 x 1024px)", Texture2D(np.zeros(shape, np.uint8)),
+        rectangles(10, 1024))
+    run("clustered (no store)",
+        Texture2D(np.zeros(shape, np.uint8), store=False), clustered(500, 64))
+
+    # Streaming through pixel buffers (fences are always signaled)
+    texture.gl.returns["glClientWaitSync"] = texture.gl.GL_ALREADY_SIGNALED
+    run("tiles (pbos=2)", Texture2D(np.zeros(shape, np.uint8), pbos=2),
+        rectangles(100, 64, tiled=True))
+    run("video (pbos=2)", Texture2D(np.zeros(shape, np.uint8), pbos=2),
+        lambda T: T.set_data(np.zeros(shape, np.uint8)))
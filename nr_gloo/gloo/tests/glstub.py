@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+from backend import RecordingGL
+
+
+# ------------------------------------------------------------ GLStub class ---
+class GLStub(RecordingGL):
+    """
+    Recording stand-in for the OpenGL.GL module.
+
+    Constants are taken from OpenGL.GL while every gl* function call is
+    recorded (name and arguments) instead of being issued, such that GPU
+    operations can be checked without any GL context. Replace the `gl`
+    attribute of a gloo module to use it::
+
+      import buffer
+      buffer.gl = GLStub()
+
+    Calls are answered as by the recording backend (fake handles, program
+    queries answered from shader sources) unless a return value is given in
+    `returns` (a callable is called with the arguments of the call).
+
+    A new stub stands for a new context: the GL state shadow is reset.
+    """
+
+    def __init__(self, returns=None):
+        RecordingGL.__init__(self)
+        self.returns = returns or {}
+
+
+    def _function(self, name):
+        function = RecordingGL._function(self, name)
+        returns = self.returns
+
+        def call(*args):
+            result = function(*args)
+            if name in returns:
+                value = returns[name]
+                return value(*args) if callable(value) else value
+            return result
+        call.__name__ = name
+        return call
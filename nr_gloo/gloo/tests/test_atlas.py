@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+import texture
+from glstub import GLStub
+from atlas import TextureAtlas
+from texture import Texture2D
+
+
+
+# -----------------------------------------------------------------------------
+class TextureAtlasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = texture.gl
+        texture.gl = GLStub()
+
+    def tearDown(self):
+        texture.gl = self.gl
+
+    def overlap(self, regions):
+        Z = np.zeros((100,100), int)
+        for R in regions:
+            y, x = R.offset[0], R.offset[1]
+            Z[y:y+R.shape[0], x:x+R.shape[1]] += 1
+        return Z.max() > 1
+
+    # Default init
+    # ------------
+    def test_init(self):
+        A = TextureAtlas((100,100,4), np.uint8)
+        assert isinstance(A.texture, Texture2D)
+        assert A.texture.shape == (100,100,4)
+        assert A.utilisation == 0
+        assert A.regions == []
+
+    # Allocation
+    # ----------
+    def test_allocate(self):
+        A = TextureAtlas((100,100,4), np.uint8)
+        R = A.allocate((10,20))
+        assert R.base is A.texture
+        assert R.offset == (0,0,0)
+        assert R.shape == (10,20,4)
+        assert A.utilisation == 0.02
+
+    # Bottom-left packing
+    # -------------------
+    def test_skyline(self):
+        A = TextureAtlas((100,100), np.uint8)
+        R1 = A.allocate((10,60))
+        R2 = A.allocate((20,40))
+        R3 = A.allocate((10,60))
+        assert R2.offset[:2] == (0,60)
+        assert R3.offset[:2] == (10,0)
+        assert A._skyline == [(0,20,100)]
+        assert not self.overlap([R1,R2,R3])
+
+    # No overlap with random sizes
+    # ----------------------------
+    def test_random(self):
+        np.random.seed(1)
+        A = TextureAtlas((100,100), np.uint8)
+        regions = []
+        for i in range(100):
+            try:
+                regions.append(A.allocate(np.random.randint(1,20,2)))
+            except ValueError:
+                break
+        assert len(regions) > 20
+        assert not self.overlap(regions)
+
+    # Full atlas
+    # ----------
+    def test_full(self):
+        A = TextureAtlas((100,100), np.uint8)
+        A.allocate((100,100))
+        with self.assertRaises(ValueError):
+            A.allocate((1,1))
+
+    # Free region is reused
+    # ---------------------
+    def test_free(self):
+        A = TextureAtlas((100,100), np.uint8)
+        R1 = A.allocate((50,100))
+        R2 = A.allocate((50,100))
+        A.free(R1)
+        assert R1._valid == False
+        assert A.utilisation == 0.5
+        R3 = A.allocate((20,30))
+        assert R3.offset[:2] == (0,0)
+        R4 = A.allocate((30,100))
+        assert R4.offset[:2] == (20,0)
+        assert not self.overlap([R2,R3,R4])
+
+    # Freeing twice
+    # -------------
+    def test_free_twice(self):
+        A = TextureAtlas((100,100), np.uint8)
+        R = A.allocate((10,10))
+        A.free(R)
+        with self.assertRaises(ValueError):
+            A.free(R)
+
+    # Aligned free rectangles are merged
+    # ----------------------------------
+    def test_free_merge(self):
+        A = TextureAtlas((100,100), np.uint8)
+        R = [A.allocate((10,50)) for i in range(4)]
+        A.free(R[0])
+        A.free(R[1])
+        assert A._free == [(0,0,10,100)]
+        A.free(R[3])
+        A.free(R[2])
+        assert A._free == [(0,0,20,100)]
+
+    # Defragmentation keeps regions (and their content) valid
+    # -------------------------------------------------------
+    def test_defragment(self):
+        A = TextureAtlas((100,100), np.uint8)
+        R = [A.allocate((25,100)) for i in range(4)]
+        for i in range(4):
+            R[i][...] = i+1
+        A.free(R[0])
+        A.free(R[2])
+        with self.assertRaises(ValueError):
+            A.allocate((50,100))
+        A.defragment()
+        assert R[1].offset[:2] == (0,0) and R[3].offset[:2] == (25,0)
+        assert (R[1].data == 2).all() and (R[3].data == 4).all()
+        assert (A.texture.data[:25] == 2).all()
+        R4 = A.allocate((50,100))
+        assert R4.offset[:2] == (50,0)
+
+    # Failed defragmentation leaves the atlas untouched
+    # -------------------------------------------------
+    def test_defragment_full(self):
+        A = TextureAtlas((10,10), np.uint8)
+        shapes = [(2,10), (2,6), (3,7), (3,5), (7,3)]
+        R = [A.allocate(shape) for shape in shapes]
+        for i in range(len(R)):
+            R[i][...] = i+1
+        offsets = [region.offset for region in R]
+        skyline, free = list(A._skyline), list(A._free)
+        with self.assertRaises(ValueError):
+            A.defragment()
+        assert [region.offset for region in R] == offsets
+        assert A._skyline == skyline and A._free == free
+        for i in range(len(R)):
+            assert (R[i].data == i+1).all()
+
+    # Writing a region only uploads its rectangle
+    # -------------------------------------------
+    def test_upload(self):
+        A = TextureAtlas((1000,1000), np.uint8)
+        A.texture.activate()
+        texture.gl.reset()
+        R = A.allocate((10,20))
+        R[...] = 1
+        A.texture.activate()
+        uploads = [args for name, args in texture.gl.calls
+                   if name == "glTexSubImage2D"]
+        assert len(uploads) == 1
+        assert uploads[0][2:6] == (0,0,20,10)
+
+    # Texture coordinates
+    # -------------------
+    def test_texcoords(self):
+        A = TextureAtlas((100,200), np.uint8)
+        A.allocate((50,100))
+        R = A.allocate((50,100))
+        assert A.texcoords(R) == (0.5, 0.0, 1.0, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+import OpenGL.GL as gl
+
+import cache
+import shader
+import program
+import backend
+from state import state
+from cache import LinkCache
+from program import Program
+from texture import Texture2D
+from buffer import VertexBuffer, IndexBuffer
+
+
+vertex = """
+uniform mat4  u_model;
+uniform float u_weights[3];
+uniform sampler2D u_texture;
+attribute vec2 a_position;
+attribute vec4 a_color;
+varying   vec4 v_color;
+void main() { v_color = a_color; }
+"""
+
+fragment = """
+uniform vec4 u_color;
+varying vec4 v_color;
+void main() { gl_FragColor = u_color*v_color; }
+"""
+
+
+
+# -----------------------------------------------------------------------------
+class BackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = backend.NullGL()
+        self.previous = backend.use(self.gl)
+        shader.cache = program.cache = LinkCache()
+
+    def tearDown(self):
+        backend.use(self.previous)
+        shader.cache = program.cache = cache.cache
+        state.debug = False
+
+    def program(self):
+        P = Program(vertex, fragment)
+        P.bind(VertexBuffer(np.zeros(4, [("a_position", np.float32, 2),
+                                         ("a_color",    np.float32, 4)])))
+        P["u_model"] = np.eye(4)
+        P["u_weights[1]"] = 1
+        P["u_color"] = 1,1,1,1
+        P["u_texture"] = np.zeros((4,4), np.uint8)
+        return P
+
+    # Backend is used by every module
+    # -------------------------------
+    def test_use(self):
+        assert program.gl is self.gl and state.__module__
+        previous = backend.use(None)
+        assert previous is self.gl
+        assert program.gl is gl and cache.gl is gl
+        backend.use(self.gl)
+
+    # Programs are answered from shader sources
+    # -----------------------------------------
+    def test_program(self):
+        P = self.program()
+        P.draw(gl.GL_TRIANGLES)
+        uniforms = dict(P.active_uniforms)
+        assert uniforms["u_model"] == gl.GL_FLOAT_MAT4
+        assert uniforms["u_color"] == gl.GL_FLOAT_VEC4
+        assert "u_weights[2]" in uniforms
+        assert dict(P.active_attributes)["a_color"] == gl.GL_FLOAT_VEC4
+        handles = [P._uniforms[name]._handle for name in
+                   ("u_model", "u_weights[1]", "u_color", "u_texture")]
+        assert min(handles) >= 0 and len(set(handles)) == len(handles)
+
+    # Calls and transferred bytes are counted
+    # ---------------------------------------
+    def test_counts(self):
+        V = VertexBuffer(np.zeros(1000, np.float32))
+        V.activate()
+        assert self.gl.counts["glBufferData"] == 1
+        assert self.gl.nbytes["glBufferData"] == 4000
+        V.set_data(np.ones(10, np.float32), offset=400)
+        V.activate()
+        assert self.gl.nbytes["glBufferSubData"] == 40
+        T = Texture2D(np.zeros((16,16,4), np.uint8))
+        T.activate()
+        assert self.gl.stats["bytes"] == 4040 + 1024
+
+    # Frames are timed
+    # ----------------
+    def test_frame(self):
+        P = self.program()
+        I = IndexBuffer(np.arange(4, dtype=np.uint32))
+        for i in range(3):
+            with self.gl.frame():
+                P["u_color"] = i,0,0,1
+                P.draw(gl.GL_TRIANGLES, I)
+        first, second, third = self.gl.frames
+        assert first["draws"] == second["draws"] == 1
+        assert first["calls"] > second["calls"] == third["calls"]
+        assert second["bytes"] == 16
+        assert third["time"] >= 0
+        self.gl.reset()
+        assert self.gl.frames == [] and self.gl.stats["calls"] == 0
+
+    # Bindings are tracked (debug mode)
+    # ---------------------------------
+    def test_debug(self):
+        state.debug = True
+        P1, P2 = self.program(), self.program()
+        I = IndexBuffer(np.arange(4, dtype=np.uint32))
+        for i in range(3):
+            P1.draw(gl.GL_TRIANGLES, I)
+            P2.draw(gl.GL_TRIANGLES, I)
+        assert state.stats["elided"] > 0
+
+    # Recording backend keeps calls
+    # -----------------------------
+    def test_recording(self):
+        G = backend.RecordingGL()
+        backend.use(G)
+        P = self.program()
+        P.draw(gl.GL_POINTS)
+        assert G.calls[-1][0] == "glDrawArrays"
+        assert G.count("glDrawArrays") == 1
+        assert G.count() == G.stats["calls"]
+        G.reset()
+        assert G.calls == [] and G.count() == 0
+
+
+if __name__ == "__main__":
+    unittest.main()
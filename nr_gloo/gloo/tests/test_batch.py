@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+import OpenGL.GL as gl
+
+import cache
+import shader
+import program
+import backend
+from glstub import GLStub
+from cache import LinkCache
+from batch import BatchProgram, fetchcode, declare
+
+
+vertex = """
+uniform mat4  u_model;
+uniform vec4  u_color;
+uniform float u_scale;
+uniform sampler2D u_texture;
+attribute vec2 a_position;
+void main()
+{
+    gl_Position = u_model * vec4(u_scale*a_position, 0.0, 1.0);
+}
+"""
+
+fragment = """
+uniform vec4 u_color;
+void main() { gl_FragColor = u_color; }
+"""
+
+
+
+# -----------------------------------------------------------------------------
+class FetchCodeTest(unittest.TestCase):
+
+    def test_declarations(self):
+        code = fetchcode([("u_color", "vec4"), ("u_scale", "float")], 2,
+                         varyings=["u_color"])
+        assert "uniform sampler2D u_batch;" in code
+        assert "attribute float a_batch;" in code
+        assert "varying vec4 u_color;" in code
+        assert "\nfloat u_scale;" in code
+
+    def test_aligned(self):
+        code = fetchcode([("u_model", "mat4"), ("u_color", "vec4")], 5)
+        assert "vec4 t4 = " in code
+        assert "u_model = mat4(t0.xyzw, t1.xyzw, t2.xyzw, t3.xyzw);" in code
+        assert "u_color = t4.xyzw;" in code
+
+    def test_unaligned(self):
+        code = fetchcode([("u_scale", "float"), ("u_color", "vec4"),
+                          ("u_offset", "vec3")], 2)
+        assert "u_scale = t0.x;" in code
+        assert "u_color = vec4(t0.yzw, t1.x);" in code
+        assert "u_offset = t1.yzw;" in code
+
+
+
+# -----------------------------------------------------------------------------
+class DeclareTest(unittest.TestCase):
+
+    def test_remove(self):
+        code, names = declare("uniform highp vec4 u_color;\nvoid main() {}",
+                              [("u_color", "vec4")])
+        assert "u_color" not in code
+        assert names == ["u_color"]
+
+    def test_multiple(self):
+        code, names = declare("uniform vec4 a, b, c[2];", [("a", "vec4")],
+                              "varying")
+        assert code == "varying vec4 a; uniform vec4 b; uniform vec4 c[2];"
+        assert names == ["a"]
+
+    def test_untouched(self):
+        code = "uniform vec4 a;\nattribute vec4 b;\nvoid main() { a; }"
+        assert declare(code, [("b", "vec4")]) == (code, [])
+
+
+
+# -----------------------------------------------------------------------------
+class BatchProgramTest(unittest.TestCase):
+
+    # Float uniforms of vertex shader are batched
+    # -------------------------------------------
+    def test_fields(self):
+        P = BatchProgram(vertex, fragment, batch=10)
+        assert sorted(P._fields.keys()) == ["u_color", "u_model", "u_scale"]
+        names = [name for name, gtype in P.all_uniforms]
+        assert "u_model" not in names
+        assert "u_texture" in names
+        assert "u_batch" in names
+        assert "a_batch" in [name for name, gtype in P.all_attributes]
+
+    # Given uniforms are batched
+    # --------------------------
+    def test_uniforms(self):
+        P = BatchProgram(vertex, fragment, batch=10, uniforms=["u_color"])
+        assert P._fields.keys() == ["u_color"]
+        assert "u_model" in [name for name, gtype in P.all_uniforms]
+        with self.assertRaises(ValueError):
+            BatchProgram(vertex, fragment, batch=10, uniforms=["u_texture"])
+        with self.assertRaises(ValueError):
+            BatchProgram(vertex, fragment, batch=10, uniforms=["u_unknown"])
+
+    # Shaders are rewritten
+    # ---------------------
+    def test_shaders(self):
+        P = BatchProgram("#version 120\n" + vertex, fragment, batch=10)
+        vert, frag = P.shaders[0].code, P.shaders[1].code
+        assert vert.startswith("#version 120\n")
+        assert "uniform mat4  u_model;" not in vert
+        assert "varying vec4 u_color;" in vert
+        assert "void _batch_main(void)" in vert
+        assert "fetch_batch();" in vert
+        assert "varying vec4 u_color;" in frag
+
+    # Qualified and multiple declarations are rewritten
+    # -------------------------------------------------
+    def test_shaders_declarations(self):
+        P = BatchProgram("uniform highp vec4 u_color, u_offset;\n"
+                         "uniform float u_scale;\n"
+                         "void main() { gl_Position = u_color + u_offset; }",
+                         "uniform mediump vec4 u_color;\n"
+                         "void main() { gl_FragColor = u_color; }",
+                         batch=10, uniforms=["u_color", "u_scale"])
+        vert, frag = P.shaders[0].code, P.shaders[1].code
+        assert "uniform highp" not in vert
+        assert "uniform vec4 u_offset;" in vert
+        assert "uniform float u_scale;" not in vert
+        assert frag.startswith("varying vec4 u_color;")
+
+    # Texture layout (5 texels per instance)
+    # --------------------------------------
+    def test_layout(self):
+        P = BatchProgram(vertex, fragment, batch=1000, uniforms=["u_model",
+                                                                  "u_color"])
+        assert P.texture.shape == (5, 204*5, 4)
+        assert P["u_batch_shape"].tolist() == [5, 1020, 5]
+        assert P.texture.dtype == np.float32
+
+    # Setting all instances
+    # ---------------------
+    def test_set_all(self):
+        P = BatchProgram(vertex, fragment, batch=10)
+        colors = np.random.uniform(0, 1, (10,4))
+        P["u_color"] = colors
+        P["u_scale"] = 2
+        assert np.allclose(P["u_color"], colors)
+        assert np.allclose(P["u_scale"], 2)
+        assert np.allclose(P.texture.data[0,0,:4], P["u_model"][0,:4])
+
+    # Setting some instances
+    # ----------------------
+    def test_set_index(self):
+        P = BatchProgram(vertex, fragment, batch=1000)
+        P.texture._pending_data = []
+        P["u_model", 500] = np.eye(4)
+        assert np.allclose(P["u_model"][500], np.eye(4).ravel())
+        assert np.allclose(P["u_model"][499], 0)
+        data, offset = P.texture._pending_data[-1]
+        assert offset == (500 // P._per_row, 0, 0)
+        assert data.shape[0] == 1
+        P["u_color", 10:20] = 1,0,0,1
+        assert np.allclose(P["u_color"][10:20], (1,0,0,1))
+        assert np.allclose(P["u_color"][20], 0)
+        P["u_scale", [1, 999]] = 3
+        data, offset = P.texture._pending_data[-1]
+        assert offset[0] == 0 and data.shape[0] == P.texture.shape[0]
+
+    # Batched uniforms are read-only
+    # ------------------------------
+    def test_readonly(self):
+        P = BatchProgram(vertex, fragment, batch=10)
+        with self.assertRaises(ValueError):
+            P["u_color"][0] = 1
+
+    # Regular uniforms are still regular
+    # ----------------------------------
+    def test_regular(self):
+        P = BatchProgram(vertex, fragment, batch=10, uniforms=["u_color"])
+        P["u_scale"] = 2
+        assert P["u_scale"] == 2
+
+
+
+# -----------------------------------------------------------------------------
+class BatchDrawTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = GLStub()
+        self.previous = backend.use(self.stub)
+        shader.cache = program.cache = LinkCache()
+
+    def tearDown(self):
+        backend.use(self.previous)
+        shader.cache = program.cache = cache.cache
+
+    # Many instances are drawn with a single call
+    # -------------------------------------------
+    def test_draw(self):
+        n = 10000
+        P = BatchProgram(vertex, fragment, batch=n, vao=False)
+        vertices = np.zeros(3*n, [("a_position", np.float32, 2),
+                                  ("a_batch", np.float32, 1)])
+        vertices["a_batch"] = np.repeat(np.arange(n), 3)
+        P.bind(vertices)
+        P["u_texture"] = np.zeros((4,4), np.uint8)
+        P["u_model"] = np.eye(4).ravel()
+        P["u_color"] = np.random.uniform(0, 1, (n,4))
+        P.draw(gl.GL_TRIANGLES)
+        assert self.stub.count("glDrawArrays") == 1
+        assert self.stub.count("glTexSubImage2D") == 2
+
+        # Modified instance only uploads its row
+        self.stub.reset()
+        P["u_color", 5000] = 1,0,0,1
+        P.draw(gl.GL_TRIANGLES)
+        args = [args for name, args in self.stub.calls
+                if name == "glTexSubImage2D"]
+        assert len(args) == 1
+        assert args[0][3:6] == (5000 // P._per_row, P.texture.shape[1], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,11 +3,17 @@
 # Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
 # Distributed under the terms of the new BSD License.
 # -----------------------------------------------------------------------------
+import os
 import sys
+import tempfile
 import unittest
 import numpy as np
 import OpenGL.GL as gl
+import buffer
+from glstub import GLStub
 from buffer import Buffer, DataBuffer, VertexBuffer, IndexBuffer
+from buffer import MappedVertexBuffer
+from buffer import coalesce
 
 
 
@@ -124,6 +130,214 @@ class BufferTest(unittest.TestCase):
 
 
 
+# -----------------------------------------------------------------------------
+class CoalesceTest(unittest.TestCase):
+
+    # Disjoint writes
+    # ---------------
+    def test_disjoint(self):
+        pending = [(None, 10, 0), (None, 10, 20)]
+        intervals = coalesce(pending)
+        assert [(start,stop) for start,stop,_ in intervals] == [(0,10),(20,30)]
+
+    # Adjacent writes
+    # ---------------
+    def test_adjacent(self):
+        pending = [(None, 10, 10), (None, 10, 0), (None, 10, 20)]
+        intervals = coalesce(pending)
+        assert [(start,stop) for start,stop,_ in intervals] == [(0,30)]
+        assert len(intervals[0][2]) == 3
+
+    # Overlapping writes
+    # ------------------
+    def test_overlapping(self):
+        pending = [(None, 10, 0), (None, 10, 5)]
+        intervals = coalesce(pending)
+        assert [(start,stop) for start,stop,_ in intervals] == [(0,15)]
+
+    # Writes hidden by later writes are dropped
+    # -----------------------------------------
+    def test_covered(self):
+        A, B, C = (None, 4, 2), (None, 5, 0), (None, 5, 5)
+        intervals = coalesce([A, B, C])
+        assert intervals == [(0, 10, [B, C])]
+
+    # Older writes come first
+    # -----------------------
+    def test_order(self):
+        A, B = (None, 10, 5), (None, 10, 0)
+        intervals = coalesce([A, B])
+        assert intervals == [(0, 15, [A, B])]
+
+
+
+# -----------------------------------------------------------------------------
+class BufferUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = buffer.gl
+        buffer.gl = GLStub()
+
+    def tearDown(self):
+        buffer.gl = self.gl
+
+    # Whole buffer upload is a single glBufferData
+    # --------------------------------------------
+    def test_whole_upload(self):
+        B = Buffer(data=np.zeros(100, np.float32))
+        B.activate()
+        assert buffer.gl.count("glBufferData") == 1
+        assert buffer.gl.count("glBufferSubData") == 0
+
+    # Small writes are merged
+    # -----------------------
+    def test_merged_upload(self):
+        B = Buffer(data=np.zeros(100, np.float32))
+        B.activate()
+        buffer.gl.reset()
+        B._need_update = True
+        for i in range(10):
+            B.set_data(np.ones(1, np.float32)*i, offset=4*i)
+        B.set_data(np.ones(10, np.float32), offset=80)
+        B._update()
+        assert buffer.gl.count("glBufferSubData") == 2
+        name, (target, offset, nbytes, data) = buffer.gl.calls[0]
+        assert offset == 0 and nbytes == 40
+        assert np.allclose(data.view(np.float32), np.arange(10))
+
+    # Writes covering the whole buffer are merged into a single glBufferData
+    # ----------------------------------------------------------------------
+    def test_merged_whole_upload(self):
+        B = Buffer(data=np.zeros(100, np.float32))
+        B.activate()
+        buffer.gl.reset()
+        for i in range(10):
+            B.set_data(np.ones(10, np.float32)*i, offset=40*i)
+        B._update()
+        assert buffer.gl.count() == 1
+        name, (target, nbytes, data, usage) = buffer.gl.calls[0]
+        assert name == "glBufferData"
+        assert np.allclose(data.view(np.float32), np.repeat(np.arange(10),10))
+
+    # Dirty buffer with CPU storage is uploaded at once
+    # -------------------------------------------------
+    def test_storage_whole_upload(self):
+        B = DataBuffer(np.zeros(100, np.float32))
+        B.activate()
+        buffer.gl.reset()
+        B[0:40] = 1
+        B[50:80] = 2
+        B._update()
+        assert buffer.gl.count() == 1
+        assert buffer.gl.count("glBufferData") == 1
+
+    # Slightly dirty buffer with CPU storage is partially uploaded
+    # ------------------------------------------------------------
+    def test_storage_partial_upload(self):
+        B = DataBuffer(np.zeros(10000, np.float32))
+        B.activate()
+        buffer.gl.reset()
+        B[0:10] = 1
+        B[10:20] = 2
+        B[5000:5010] = 3
+        B._update()
+        assert buffer.gl.count("glBufferData") == 0
+        assert buffer.gl.count("glBufferSubData") == 2
+
+    # Close dirty ranges of a buffer with CPU storage are merged
+    # ----------------------------------------------------------
+    def test_storage_merge_gap(self):
+        B = DataBuffer(np.zeros(10000, np.float32))
+        B.activate()
+        buffer.gl.reset()
+        B[0:10] = 1
+        B[20:30] = 2
+        B._update()
+        assert buffer.gl.count("glBufferSubData") == 1
+        name, (target, offset, nbytes, data) = buffer.gl.calls[0]
+        assert offset == 0 and nbytes == 30*4
+
+    # Merged gaps of a whole upload come from CPU storage
+    # ---------------------------------------------------
+    def test_storage_merge_gap_whole_upload(self):
+        B = VertexBuffer(np.arange(300, dtype=np.float32))
+        B.activate()
+        buffer.gl.reset()
+        B[0:10] = -1
+        B[290:300] = -1
+        B._update()
+        assert buffer.gl.count() == 1
+        name, (target, nbytes, data, usage) = buffer.gl.calls[0]
+        assert name == "glBufferData"
+        expected = np.arange(300, dtype=np.float32)
+        expected[:10] = expected[290:] = -1
+        assert np.allclose(np.asarray(data).view(np.float32), expected)
+
+
+
+# -----------------------------------------------------------------------------
+class StreamBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = buffer.gl
+        buffer.gl = GLStub()
+
+    def tearDown(self):
+        buffer.gl = self.gl
+
+    # Usage
+    # -----
+    def test_usage(self):
+        B = Buffer(usage='stream')
+        assert B._usage == gl.GL_STREAM_DRAW
+        with self.assertRaises(ValueError):
+            B = Buffer(usage='unknown')
+        with self.assertRaises(ValueError):
+            B = Buffer(usage='dynamic', regions=2)
+
+    # Regions are used in turn
+    # ------------------------
+    def test_ring(self):
+        B = VertexBuffer(np.zeros(10, np.float32), usage='stream', regions=3)
+        B.activate()
+        name, (target, nbytes, data, usage) = buffer.gl.calls[-2]
+        assert name == "glBufferData" and nbytes == 3*40 and data is None
+        offsets = []
+        for i in range(4):
+            B[...] = i
+            B.activate()
+            name, (target, offset, nbytes, data) = buffer.gl.calls[-1]
+            assert name == "glBufferSubData" and nbytes == 40
+            offsets.append(offset)
+        assert offsets == [40, 80, 0, 40]
+        assert B.gpu_offset == 40
+        assert B['f0'].gpu_offset == 40
+
+    # Partial writes are uploaded in full to a new region
+    # ---------------------------------------------------
+    def test_ring_partial(self):
+        B = VertexBuffer(np.zeros(10, np.float32), usage='stream', regions=2)
+        B.activate()
+        buffer.gl.reset()
+        B[0] = 1
+        B.activate()
+        name, (target, offset, nbytes, data) = buffer.gl.calls[-1]
+        assert offset == 40 and nbytes == 40
+
+    # Single region: storage is orphaned
+    # ----------------------------------
+    def test_orphan(self):
+        B = VertexBuffer(np.zeros(10, np.float32), usage='stream')
+        B.activate()
+        buffer.gl.reset()
+        B[0] = 1
+        B.activate()
+        assert buffer.gl.count("glBufferData") == 1
+        assert buffer.gl.count("glBufferSubData") == 0
+        assert B.gpu_offset == 0
+
+
+
 # -----------------------------------------------------------------------------
 class DataBufferTest(unittest.TestCase):
 
@@ -322,7 +536,7 @@ class DataBufferTest(unittest.TestCase):
                             ('texcoord', np.float32, 2),
                             ('color',    np.float32, 4) ] )
         data1 = np.zeros(10,dtype=dtype)
-        data2 = np.empty(10,dtype=dtype)
+        data2 = np.ones(10,dtype=dtype)
         B = DataBuffer(data1, store=True, copy=False)
         B[...] = data2
         assert np.allclose(data1['position'],data2['position'])
@@ -336,7 +550,7 @@ class DataBufferTest(unittest.TestCase):
                             ('texcoord', np.float32, 2),
                             ('color',    np.float32, 4) ] )
         data1 = np.zeros(10,dtype=dtype)
-        data2 = np.empty(10,dtype=dtype)
+        data2 = np.ones(10,dtype=dtype)
         B = DataBuffer(data1, store=True, copy=False)
         B[::2] = data2[::2]
         assert np.allclose(data1['position'][::2],data2['position'][::2])
@@ -350,7 +564,7 @@ class DataBufferTest(unittest.TestCase):
                             ('texcoord', np.float32, 2),
                             ('color',    np.float32, 4) ] )
         data1 = np.zeros(10,dtype=dtype)
-        data2 = np.empty(10,dtype=dtype)
+        data2 = np.ones(10,dtype=dtype)
         B = DataBuffer(data1, store=True, copy=False)
         B[:5] = data2[:5]
         assert np.allclose(data1['position'][:5],data2['position'][:5])
@@ -358,6 +572,64 @@ class DataBufferTest(unittest.TestCase):
         assert np.allclose(data1['color'][:5],data2['color'][:5])
         assert len(B._pending_data) == 2
 
+    # Set field marks every item as dirty
+    # -----------------------------------
+    def test_setitem_field_dirty(self):
+        dtype = np.dtype( [('position', np.float32, 3),
+                           ('color',    np.float32, 4)] )
+        data = np.zeros(10000,dtype=dtype)
+        B = DataBuffer(data, store=True, copy=False)
+        B._pending_data = []
+        color = np.zeros((10000,4), np.float32)
+        color[100:110] = 1
+        B['color'] = color
+        assert np.allclose(data['color'], color)
+        assert [(nbytes, offset) for _, nbytes, offset in B._pending_data] == \
+               [(10000*dtype.itemsize, 0)]
+
+    # Set field to its current value still marks items as dirty
+    # ---------------------------------------------------------
+    def test_setitem_field_unchanged(self):
+        dtype = np.dtype( [('position', np.float32, 3),
+                           ('color',    np.float32, 4)] )
+        B = DataBuffer(dtype=dtype, size=100)
+        B.data[...] = 0
+        B._pending_data = []
+        B['color'] = 0,0,0,0
+        assert [(nbytes, offset) for _, nbytes, offset in B._pending_data] == \
+               [(100*dtype.itemsize, 0)]
+
+    # Set items through a field view
+    # ------------------------------
+    def test_setitem_field_view(self):
+        dtype = np.dtype( [('position', np.float32, 3),
+                           ('color',    np.float32, 4)] )
+        data = np.zeros(100,dtype=dtype)
+        B = DataBuffer(data, store=True, copy=False)
+        B._pending_data = []
+        B['color'][5:8] = 1,1,1,1
+        assert np.allclose(data['color'][5:8], 1)
+        assert np.allclose(data['color'][:5], 0)
+        assert np.allclose(data['position'], 0)
+        assert [(nbytes, offset) for _, nbytes, offset in B._pending_data] == \
+               [(3*dtype.itemsize, 5*dtype.itemsize)]
+
+    # Set items through an items view
+    # -------------------------------
+    def test_setitem_items_view(self):
+        dtype = np.dtype( [('position', np.float32, 3),
+                           ('color',    np.float32, 4)] )
+        data = np.zeros(100,dtype=dtype)
+        B = DataBuffer(data, store=True, copy=False)
+        V = B[10:20]
+        B._pending_data = []
+        V[0:2] = np.ones(2,dtype=dtype)
+        assert np.allclose(data['color'][10:12], 1)
+        assert np.allclose(data['color'][:10], 0)
+        assert np.allclose(data['color'][12:], 0)
+        assert [(nbytes, offset) for _, nbytes, offset in B._pending_data] == \
+               [(2*dtype.itemsize, 10*dtype.itemsize)]
+
     # Set field without storage: error
     # --------------------------------
     def test_setitem_field_no_storage(self):
@@ -390,6 +662,15 @@ class DataBufferTest(unittest.TestCase):
         assert B.nbytes == data.nbytes
         assert B._need_resize == True
 
+    # Explicit resize
+    # ---------------
+    def test_resize_size(self):
+        B = DataBuffer(dtype=np.float32, size=10, store=False)
+        B.resize(20)
+        assert B.size == 20
+        assert B.nbytes == 80
+        B.set_data(np.zeros(5, np.float32), offset=60)
+
     # Resize not allowed using ellipsis
     # --------------------------------
     def test_no_resize_ellipsis(self):
@@ -410,6 +691,164 @@ class DataBufferTest(unittest.TestCase):
 
 
 
+# -----------------------------------------------------------------------------
+class ZeroCopyTest(unittest.TestCase):
+
+    dtype = np.dtype( [('position', np.float32, 3),
+                       ('color',    np.float32, 4)] )
+
+    # Contiguous structured data is used as storage
+    # ---------------------------------------------
+    def test_structured(self):
+        data = np.zeros(100, dtype=self.dtype)
+        count = Buffer._copycount
+        V = VertexBuffer(data)
+        V['color'][10:20] = 1,1,1,1
+        V['position'] = 1,2,3
+        assert Buffer._copycount == count
+        assert np.may_share_memory(V.data, data)
+        assert np.allclose(data['color'][10:20], 1)
+
+    # Memory-mapped data is used as storage
+    # -------------------------------------
+    def test_memmap(self):
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            data = np.memmap(filename, dtype=self.dtype, mode='w+', shape=(100,))
+            count = Buffer._copycount
+            V = VertexBuffer(data)
+            assert Buffer._copycount == count
+            assert isinstance(V.data, np.memmap)
+            del V, data
+        finally:
+            os.remove(filename)
+
+    # Views are descriptors only
+    # --------------------------
+    def test_views(self):
+        data = np.zeros(100, dtype=self.dtype)
+        count = Buffer._copycount
+        V = VertexBuffer(data)
+        Z = V['color']
+        assert Z.data is None
+        assert Z.offset == 3*4 and Z.stride == 7*4
+        assert Buffer._copycount == count
+
+    # Non contiguous data is copied (and counted)
+    # -------------------------------------------
+    def test_non_contiguous(self):
+        data = np.zeros(100, dtype=self.dtype)
+        count = Buffer._copycount
+        V = VertexBuffer(data[::2])
+        assert Buffer._copycount == count+1
+        assert V.stride == self.dtype.itemsize
+
+    # Explicit copy is counted
+    # ------------------------
+    def test_copy(self):
+        data = np.zeros(100, dtype=self.dtype)
+        count = Buffer._copycount
+        V = VertexBuffer(data, copy=True)
+        assert Buffer._copycount == count+1
+        assert Buffer._copybytes >= data.nbytes
+
+
+
+# -----------------------------------------------------------------------------
+class MappedVertexBufferTest(unittest.TestCase):
+
+    dtype = np.dtype( [('position', np.float32, 3),
+                       ('color',    np.float32, 4)] )
+
+    def setUp(self):
+        self.gl = buffer.gl
+        buffer.gl = GLStub()
+        handle, self.filename = tempfile.mkstemp()
+        os.close(handle)
+        data = np.memmap(self.filename, dtype=self.dtype, mode='w+', shape=(1000,))
+        data['position'][:,0] = np.arange(1000)
+        del data
+
+    def tearDown(self):
+        buffer.gl = self.gl
+        os.remove(self.filename)
+
+    def mapped(self, mode='r'):
+        return MappedVertexBuffer(self.filename, self.dtype, mode=mode,
+                                  budget=3*100*self.dtype.itemsize, pagesize=100)
+
+    # Default init
+    # ------------
+    def test_init(self):
+        B = self.mapped()
+        assert B.size == 1000
+        assert B.nbytes == 300*self.dtype.itemsize
+        assert isinstance(B.data, np.memmap)
+        assert len(B._pending_data) == 0
+
+    # Window upload
+    # -------------
+    def test_window(self):
+        B = self.mapped()
+        B.set_windows([(50,250)])
+        assert B.ranges == [(50,200)]
+        B.activate()
+        assert buffer.gl.count("glBufferData") == 1
+        name, (target, nbytes, data, usage) = buffer.gl.calls[-1]
+        assert nbytes == B.nbytes
+        assert np.allclose(data.view(self.dtype)['position'][:,0], range(300))
+
+    # Window paging
+    # -------------
+    def test_paging(self):
+        B = self.mapped()
+        B.set_windows([(0,300)])
+        B.activate()
+        buffer.gl.reset()
+        B.set_windows([(250,350)])
+        assert B._paged == 4
+        assert B.ranges == [(250,50), (0,50)]
+        B.activate()
+        assert buffer.gl.count("glBufferSubData") == 1
+        name, (target, offset, nbytes, data) = buffer.gl.calls[-1]
+        assert offset == 0 and nbytes == 100*self.dtype.itemsize
+        assert np.allclose(data['position'][:,0], range(300,400))
+
+    # Windows too large
+    # -----------------
+    def test_budget(self):
+        B = self.mapped()
+        with self.assertRaises(ValueError):
+            B.set_windows([(0,100), (500,800)])
+        with self.assertRaises(IndexError):
+            B.set_windows([(900,1100)])
+
+    # Views
+    # -----
+    def test_views(self):
+        B = self.mapped()
+        Z = B['color']
+        assert Z.offset == 3*4 and Z.stride == self.dtype.itemsize
+        Z = B[100:200]
+        assert Z.size == 100
+        assert Z.offset == 100*self.dtype.itemsize
+
+    # Writes to resident pages are uploaded at their GPU location
+    # -----------------------------------------------------------
+    def test_setitem(self):
+        B = self.mapped(mode='r+')
+        B.set_windows([(500,700)])
+        B.activate()
+        B._pending_data = []
+        B['color'][610:620] = 1,1,1,1
+        B[900:910] = np.zeros(10, self.dtype)
+        assert [(nbytes, offset) for _, nbytes, offset in B._pending_data] == \
+               [(10*self.dtype.itemsize, 110*self.dtype.itemsize)]
+        assert np.allclose(B.data['color'][610:620], 1)
+
+
+
 # -----------------------------------------------------------------------------
 class VertexBufferTest(unittest.TestCase):
 
@@ -428,6 +867,20 @@ class VertexBufferTest(unittest.TestCase):
         for dtype in (np.uint32, np.int32, np.float64):
             with self.assertRaises(TypeError):
                 V = VertexBuffer(dtype=dtype)
+    # Instance divisors are per field
+    # -------------------------------
+    def test_divisor(self):
+        dtype = [('position', np.float32, 2), ('offset', np.float32, 2)]
+        V = VertexBuffer(np.zeros(10, dtype), divisor={'offset': 1})
+        assert V['position'].divisor == 0
+        assert V['offset'].divisor == 1
+        V['position'].divisor = 2
+        assert V['position'].divisor == 2
+        V.divisor = 3
+        assert V['offset'].divisor == 3
+        with self.assertRaises(ValueError):
+            V.divisor = {'color': 1}
+        assert VertexBuffer(np.zeros((10,2), np.float32), divisor=1).divisor == 1
 
 # -----------------------------------------------------------------------------
 class IndexBufferTest(unittest.TestCase):
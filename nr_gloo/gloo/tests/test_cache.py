@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import os
+import shutil
+import tempfile
+import unittest
+import OpenGL.GL as gl
+
+import cache
+import shader
+import program
+import backend
+from glstub import GLStub
+from cache import LinkCache, preprocess
+from program import Program
+from shader import VertexShader, FragmentShader
+
+
+vertex = """
+// Vertex shader
+attribute vec2 position;
+void main() { gl_Position = vec4(position, 0.0, 1.0); }
+"""
+
+fragment = """
+/* Fragment shader */
+void main() { gl_FragColor = vec4(1.0); }
+"""
+
+
+
+# -----------------------------------------------------------------------------
+class PreprocessTest(unittest.TestCase):
+
+    def test_comments(self):
+        assert preprocess("a; // b\n/* c\n d */ e;") == "a;\ne;"
+
+    def test_spaces(self):
+        assert preprocess("\n  a;  \n\n\tb;\n") == "a;\nb;"
+
+    def test_key(self):
+        C = LinkCache()
+        assert C.key(vertex) == C.key("  " + vertex + "\n// comment\n")
+        assert C.key(vertex) != C.key(fragment)
+        assert C.key(vertex, fragment) != C.key(fragment, vertex)
+
+
+
+# -----------------------------------------------------------------------------
+class LinkCacheTest(unittest.TestCase):
+
+    binary = b"\1\2\3\4\5\6\7\10"
+
+    def setUp(self):
+        self.stub = GLStub({
+            "glGetIntegerv"          : 1,
+            "glGetProgramiv"         : self.glGetProgramiv,
+            "glGetProgramBinary"     : self.glGetProgramBinary })
+        self.previous = backend.use(self.stub)
+        self.cache = LinkCache()
+        self.link_status = 1
+        for module in shader, program:
+            module.cache = self.cache
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        backend.use(self.previous)
+        for module in shader, program:
+            module.cache = cache.cache
+        shutil.rmtree(self.directory)
+
+    def glGetProgramiv(self, handle, pname):
+        if pname == gl.GL_LINK_STATUS:
+            return self.link_status
+        if pname == gl.GL_PROGRAM_BINARY_LENGTH:
+            return len(self.binary)
+        return 0
+
+    def glGetProgramBinary(self, handle, length, size, format, binary):
+        size[0], format[0] = len(self.binary), 42
+        binary[:len(self.binary)] = bytearray(self.binary)
+
+    def program(self):
+        P = Program(VertexShader(vertex), FragmentShader(fragment))
+        P.activate()
+        return P
+
+    # Shaders with same code share the same GL shader
+    # -----------------------------------------------
+    def test_shader_reuse(self):
+        S1 = VertexShader(vertex)
+        S1.activate()
+        S2 = VertexShader("// Same code\n" + vertex)
+        S2.activate()
+        assert S1.handle == S2.handle
+        assert self.stub.count("glCreateShader") == 1
+        assert self.stub.count("glCompileShader") == 1
+        assert self.cache.stats['shader hits'] == 1
+        assert self.cache.stats['shader misses'] == 1
+
+    # Same code but different target is not shared
+    # --------------------------------------------
+    def test_shader_target(self):
+        VertexShader(vertex).activate()
+        FragmentShader(vertex).activate()
+        assert self.stub.count("glCompileShader") == 2
+
+    # Shared shader is deleted when last shader is deleted
+    # ----------------------------------------------------
+    def test_shader_delete(self):
+        S1 = VertexShader(vertex)
+        S1.activate()
+        S2 = VertexShader(vertex)
+        S2.activate()
+        S1._delete()
+        assert self.stub.count("glDeleteShader") == 0
+        S2._delete()
+        assert self.stub.count("glDeleteShader") == 1
+        VertexShader(vertex).activate()
+        assert self.stub.count("glCompileShader") == 2
+
+    # Shaders are not shared across GL contexts
+    # -----------------------------------------
+    def test_shader_context(self):
+        self.cache.context = lambda: 1
+        S1 = VertexShader(vertex)
+        S1.activate()
+        self.cache.context = lambda: 2
+        S2 = VertexShader(vertex)
+        S2.activate()
+        assert self.stub.count("glCompileShader") == 2
+        assert self.cache.stats['shader hits'] == 0
+        S2._delete()
+        assert self.stub.count("glDeleteShader") == 1
+        self.cache.context = lambda: 1
+        VertexShader(vertex).activate()
+        assert self.stub.count("glCompileShader") == 2
+
+    # Programs share compiled shaders
+    # -------------------------------
+    def test_program_shaders(self):
+        self.program()
+        self.program()
+        assert self.stub.count("glCompileShader") == 2
+        assert self.stub.count("glLinkProgram") == 2
+
+    # No directory, no program binary
+    # -------------------------------
+    def test_no_directory(self):
+        self.program()
+        assert self.stub.count("glGetProgramBinary") == 0
+        assert self.stub.count("glProgramBinary") == 0
+        assert os.listdir(self.directory) == []
+
+    # Program binaries not supported
+    # ------------------------------
+    def test_unsupported(self):
+        self.cache.directory = self.directory
+        self.stub.returns["glGetIntegerv"] = 0
+        self.program()
+        self.program()
+        assert self.stub.count("glLinkProgram") == 2
+        assert os.listdir(self.directory) == []
+
+    # Program binary is saved then loaded
+    # -----------------------------------
+    def test_program_binary(self):
+        self.cache.directory = self.directory
+        self.program()
+        assert self.stub.count("glProgramParameteri") == 1
+        assert len(os.listdir(self.directory)) == 1
+        self.stub.reset()
+        self.program()
+        assert self.stub.count("glLinkProgram") == 0
+        assert self.stub.count("glCompileShader") == 0
+        name, args = [call for call in self.stub.calls
+                      if call[0] == "glProgramBinary"][0]
+        assert args[1] == 42
+        assert args[2].tostring() == self.binary
+        assert self.cache.stats['program misses'] == 1
+        assert self.cache.stats['program hits'] == 1
+
+    # Rejected program binary falls back to linking
+    # ---------------------------------------------
+    def test_program_rejected(self):
+        self.cache.directory = self.directory
+        self.program()
+        self.stub.reset()
+        self.link_status = 0
+        def glLinkProgram(handle):
+            self.link_status = 1
+        self.stub.returns["glLinkProgram"] = glLinkProgram
+        self.program()
+        assert self.stub.count("glProgramBinary") == 1
+        assert self.stub.count("glLinkProgram") == 1
+        assert self.cache.stats['program errors'] == 1
+        assert len(os.listdir(self.directory)) == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+import OpenGL.GL as gl
+
+import cache
+import shader
+import program
+import variable
+import backend
+from glstub import GLStub
+from cache import LinkCache
+from program import Program
+from command import CommandList
+from buffer import VertexBuffer, IndexBuffer
+
+
+vertex = """
+uniform float u_scale;
+uniform vec4  u_color;
+uniform sampler2D u_texture;
+attribute vec2 a_position;
+"""
+
+
+
+# -----------------------------------------------------------------------------
+class CommandListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = GLStub()
+        self.previous = backend.use(self.stub)
+        shader.cache = program.cache = LinkCache()
+        self.vao_support = Program._vao_support
+        Program._vao_support = False
+
+    def tearDown(self):
+        backend.use(self.previous)
+        shader.cache = program.cache = cache.cache
+        Program._vao_support = self.vao_support
+
+    def program(self):
+        P = Program(vertex, "void main() {}", vao=False)
+        V = VertexBuffer(np.zeros(4, [("a_position", np.float32, 2)]))
+        P.bind(V)
+        P["u_scale"] = 1
+        P["u_color"] = 1,0,0,1
+        P["u_texture"] = np.zeros((4,4), np.uint8)
+        return P, V
+
+    def record(self, programs, *args, **kwargs):
+        commands = CommandList()
+        with commands:
+            for P in programs:
+                commands.draw(P, *args, **kwargs)
+        self.stub.reset()
+        return commands
+
+    def calls(self, name):
+        return [args for _name, args in self.stub.calls if _name == name]
+
+    # Only the draw sequence is recorded
+    # ----------------------------------
+    def test_record(self):
+        P, V = self.program()
+        commands = self.record([P], gl.GL_TRIANGLES)
+        names = commands.names
+        assert names[0] == "glUseProgram"
+        assert names[-1] == "glDrawArrays"
+        assert "glUniform1fv" in names and "glUniform4fv" in names
+        assert "glUniform1i" in names and "glBindTexture" in names
+        assert "glVertexAttribPointer" in names
+        assert "glBufferData" not in names and "glCreateProgram" not in names
+        assert len(commands) == len(names)
+
+    # Uniforms set before recording are recorded anyway
+    # -------------------------------------------------
+    def test_record_uploaded(self):
+        P, V = self.program()
+        P.draw(gl.GL_TRIANGLES)
+        commands = self.record([P], gl.GL_TRIANGLES)
+        assert commands.names.count("glUniform1fv") == 1
+        assert commands.names.count("glUniform4fv") == 1
+
+    # Replay issues the same calls but unchanged uniforms
+    # ---------------------------------------------------
+    def test_replay(self):
+        P, V = self.program()
+        commands = self.record([P], gl.GL_TRIANGLES)
+        commands.replay()
+        names = [name for name, args in self.stub.calls]
+        assert names == [name for name in commands.names
+                         if not name.startswith("glUniform")]
+        assert self.calls("glDrawArrays") == [(gl.GL_TRIANGLES, 0, 4)]
+
+    # Changed uniforms are patched in
+    # -------------------------------
+    def test_replay_uniform(self):
+        P, V = self.program()
+        commands = self.record([P], gl.GL_TRIANGLES)
+        P["u_color"] = 0,1,0,1
+        commands.replay()
+        assert self.stub.count("glUniform1fv") == 0
+        args = self.calls("glUniform4fv")
+        assert len(args) == 1
+        assert np.allclose(args[0][2], (0,1,0,1))
+        self.stub.reset()
+        commands.replay()
+        assert self.stub.count("glUniform4fv") == 0
+
+    # Uniforms uploaded by an immediate draw are not uploaded again
+    # -------------------------------------------------------------
+    def test_replay_immediate(self):
+        P, V = self.program()
+        commands = self.record([P], gl.GL_TRIANGLES)
+        P["u_scale"] = 2
+        P.draw(gl.GL_TRIANGLES)
+        self.stub.reset()
+        commands.replay()
+        assert self.stub.count("glUniform1fv") == 0
+        P["u_scale"] = 3
+        P.draw(gl.GL_TRIANGLES)
+        assert self.stub.count("glUniform1fv") == 1
+
+    # Changed buffers are uploaded before replay
+    # ------------------------------------------
+    def test_replay_buffer(self):
+        P, V = self.program()
+        commands = self.record([P], gl.GL_TRIANGLES, indices=IndexBuffer(
+            np.arange(4, dtype=np.uint32)))
+        V.set_data(np.ones(1, [("a_position", np.float32, 2)]), offset=8)
+        commands.replay()
+        names = [name for name, args in self.stub.calls]
+        assert names.index("glBufferSubData") < names.index("glDrawElements")
+        self.stub.reset()
+        commands.replay()
+        assert self.stub.count("glBufferSubData") == 0
+
+    # Recreated buffers require a new recording
+    # -----------------------------------------
+    def test_replay_invalid(self):
+        P, V = self.program()
+        commands = self.record([P], gl.GL_TRIANGLES)
+        V.delete()
+        with self.assertRaises(RuntimeError):
+            commands.replay()
+
+    # Recreated textures require a new recording
+    # ------------------------------------------
+    def test_replay_invalid_texture(self):
+        P, V = self.program()
+        commands = self.record([P], gl.GL_TRIANGLES)
+        T = P._uniforms["u_texture"].data
+        T.delete()
+        T.set_data(np.ones(T.shape, np.uint8))
+        with self.assertRaises(RuntimeError):
+            commands.replay()
+
+    # Several programs are replayed in order
+    # --------------------------------------
+    def test_programs(self):
+        P1, V1 = self.program()
+        P2, V2 = self.program()
+        commands = self.record([P1, P2, P1], gl.GL_POINTS)
+        assert commands.names.count("glUseProgram") == 3
+        commands.replay()
+        assert [args[0] for args in self.calls("glUseProgram")] == [
+            P1.handle, P2.handle, P1.handle]
+        assert self.stub.count("glDrawArrays") == 3
+
+    # Recording is explicit
+    # ---------------------
+    def test_recording(self):
+        P, V = self.program()
+        commands = CommandList()
+        with self.assertRaises(RuntimeError):
+            commands.draw(P, gl.GL_TRIANGLES)
+        commands.begin()
+        with self.assertRaises(RuntimeError):
+            commands.replay()
+        commands.end()
+        assert program.gl is self.stub and variable.gl is self.stub
+        with self.assertRaises(RuntimeError):
+            commands.end()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+
+import glsl
+from shader import VertexShader
+
+
+code = """
+#version 120
+// uniform float u_comment;
+/* attribute vec2 a_comment; */
+uniform   float u_a, u_b[2];
+uniform highp vec4 u_c;
+attribute vec2 a_position;
+varying   vec4 v_color;
+const     vec2 c_a = vec2(1.0, 2.0), c_b = vec2(0.0);
+extern    float e_a[3];
+uniform   float <hook_1>;
+struct S { float x; };
+vec4 f(vec4 x);
+
+vec4 f(vec4 x)
+{
+    if (x.x > 0.0) { return x; }
+    return <hook_2>(x);
+}
+
+void main(void)
+{
+    gl_Position = f(vec4(a_position, u_a, u_c.x));
+}
+"""
+
+
+
+# -----------------------------------------------------------------------------
+class ParseTest(unittest.TestCase):
+
+    def test_declarations(self):
+        D = glsl.parse(code)
+        assert D['version'] == '120'
+        assert D['uniforms'] == (('u_a', 'float', None), ('u_b', 'float', 2),
+                                 ('u_c', 'vec4', None))
+        assert D['attributes'] == (('a_position', 'vec2', None),)
+        assert D['varyings'] == (('v_color', 'vec4', None),)
+        assert D['consts'] == (('c_a', 'vec2', None), ('c_b', 'vec2', None))
+        assert D['externs'] == (('e_a', 'float', 3),)
+
+    def test_functions(self):
+        functions = glsl.parse(code)['functions']
+        assert [(rtype, name, args) for rtype, name, args, body in functions] \
+            == [('vec4', 'f', 'vec4 x'), ('void', 'main', 'void')]
+        assert "if (x.x > 0.0) { return x; }" in functions[0][3]
+
+    def test_hooks(self):
+        assert glsl.parse(code)['hooks'] == ('hook_1', 'hook_2')
+
+    def test_spans(self):
+        spans = glsl.parse(code)['spans']
+        assert len(spans) == 7
+        start, stop = spans[0]
+        assert code[start:stop] == "uniform   float u_a, u_b[2];"
+        start, stop = spans[-1]
+        assert code[start:].startswith("void main(void)")
+        assert code[:stop].endswith("u_c.x));\n}")
+
+    def test_expand(self):
+        uniforms = glsl.expand(glsl.parse(code)['uniforms'])
+        assert uniforms == [('u_a', 'float'), ('u_b[0]', 'float'),
+                            ('u_b[1]', 'float'), ('u_c', 'vec4')]
+
+    def test_empty(self):
+        assert glsl.parse("")['uniforms'] == ()
+        assert glsl.parse(None)['functions'] == ()
+
+    def test_cache(self):
+        assert glsl.parse(code) is glsl.parse(code)
+        assert glsl.parse(code) is glsl.parse(str(code[:-1]) + "\n")
+
+    def test_shader(self):
+        shader = VertexShader(code)
+        assert [name for name, gtype in shader.uniforms] == ['u_a', 'u_b[0]',
+                                                             'u_b[1]', 'u_c']
+        assert [name for name, gtype in shader.attributes] == ['a_position']
+
+
+if __name__ == "__main__":
+    unittest.main()
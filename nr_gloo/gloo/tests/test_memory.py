@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+import buffer
+import texture
+import globject
+from glstub import GLStub
+from memory import Registry
+from buffer import VertexBuffer, IndexBuffer
+from texture import Texture2D
+
+
+
+# -----------------------------------------------------------------------------
+class RegistryTest(unittest.TestCase):
+
+    dtype = np.dtype( [('position', np.float32, 3),
+                       ('color',    np.float32, 4)] )
+
+    def setUp(self):
+        self.gl = buffer.gl, texture.gl
+        buffer.gl = texture.gl = GLStub()
+        self.registry = Registry()
+        for module in globject, buffer, texture:
+            module.registry = self.registry
+
+    def tearDown(self):
+        buffer.gl, texture.gl = self.gl
+        from memory import registry
+        for module in globject, buffer, texture:
+            module.registry = registry
+
+    def vertices(self, n=100):
+        V = VertexBuffer(np.zeros(n, self.dtype))
+        V.activate()
+        return V
+
+    # Default
+    # -------
+    def test_init(self):
+        R = self.registry
+        assert R.total == 0
+        assert R.budget is None
+        assert R.policy == 'evict'
+        assert R.totals() == {}
+
+    # Invalid budget and policy
+    # -------------------------
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.registry.budget = -1
+        with self.assertRaises(ValueError):
+            self.registry.policy = 'ignore'
+
+    # Objects are recorded when resized on GPU (not before)
+    # -----------------------------------------------------
+    def test_allocate(self):
+        V = VertexBuffer(np.zeros(100, self.dtype))
+        assert self.registry.total == 0
+        V.activate()
+        assert self.registry.nbytes(V) == 100*self.dtype.itemsize
+        T = Texture2D(np.zeros((10,10,4), np.uint8))
+        T.activate()
+        assert self.registry.nbytes(T) == 400
+        assert self.registry.total == 100*self.dtype.itemsize + 400
+
+    # Resizing replaces previous size
+    # -------------------------------
+    def test_resize(self):
+        V = self.vertices(100)
+        V.set_data(np.zeros(200, self.dtype))
+        V.activate()
+        assert self.registry.total == 200*self.dtype.itemsize
+
+    # Stream buffer regions
+    # ---------------------
+    def test_regions(self):
+        V = VertexBuffer(np.zeros(100, self.dtype), usage='stream', regions=3)
+        V.activate()
+        assert self.registry.total == 3*100*self.dtype.itemsize
+
+    # Deleted objects are released
+    # ----------------------------
+    def test_release(self):
+        V = self.vertices()
+        V._delete()
+        assert self.registry.total == 0
+
+    # Totals per type and per owner
+    # -----------------------------
+    def test_totals(self):
+        V = self.vertices(100)
+        I = IndexBuffer(np.zeros(100, np.uint32))
+        I.owner = 'mesh'
+        I.activate()
+        T = Texture2D(np.zeros((10,10,4), np.uint8))
+        T.activate()
+        assert self.registry.totals('type') == {
+            'VertexBuffer': 100*self.dtype.itemsize,
+            'IndexBuffer': 400, 'Texture2D': 400 }
+        assert self.registry.totals('owner') == {
+            None: 100*self.dtype.itemsize + 400, 'mesh': 400 }
+
+    # Budget exceeded (raise)
+    # -----------------------
+    def test_budget_raise(self):
+        self.registry.budget = 150*self.dtype.itemsize
+        self.registry.policy = 'raise'
+        V1 = self.vertices(100)
+        with self.assertRaises(MemoryError):
+            self.vertices(100)
+        assert self.registry.total == 100*self.dtype.itemsize
+
+    # Budget exceeded (LRU eviction)
+    # ------------------------------
+    def test_budget_evict(self):
+        self.registry.budget = 250*self.dtype.itemsize
+        V1 = self.vertices(100)
+        V2 = self.vertices(100)
+        V1.activate()
+        handle = V2.handle
+        buffer.gl.reset()
+        V3 = self.vertices(100)
+        assert ("glDeleteBuffers", (1, [handle])) in buffer.gl.calls
+        assert V2._need_create and V2.handle == -1
+        assert self.registry.nbytes(V2) == 0
+        assert self.registry.evictions == 1
+        assert self.registry.total == 200*self.dtype.itemsize
+
+    # Evicted buffer is restored on next activation
+    # ---------------------------------------------
+    def test_evict_restore(self):
+        self.registry.budget = 250*self.dtype.itemsize
+        V1 = self.vertices(100)
+        V1[...] = np.ones(100, self.dtype)
+        V1.activate()
+        V2 = self.vertices(100)
+        V3 = self.vertices(100)
+        assert V1._need_create
+        buffer.gl.reset()
+        V1.activate()
+        names = [name for name, args in buffer.gl.calls]
+        assert names[0] == "glGenBuffers"
+        assert ("glBufferData" in names)
+        assert self.registry.nbytes(V1) == 100*self.dtype.itemsize
+        assert self.registry.nbytes(V2) == 0
+        assert self.registry.evictions == 2
+
+    # Buffers without CPU storage cannot be evicted
+    # ---------------------------------------------
+    def test_evict_no_store(self):
+        self.registry.budget = 150*self.dtype.itemsize
+        V = VertexBuffer(np.zeros(100, self.dtype), store=False)
+        V.activate()
+        with self.assertRaises(MemoryError):
+            self.vertices(100)
+        assert self.registry.evictions == 0
+
+    # Textures are not evicted
+    # ------------------------
+    def test_evict_texture(self):
+        self.registry.budget = 500
+        T = Texture2D(np.zeros((10,10,4), np.uint8))
+        T.activate()
+        with self.assertRaises(MemoryError):
+            Texture2D(np.zeros((10,10,4), np.uint8)).activate()
+
+
+if __name__ == "__main__":
+    unittest.main()
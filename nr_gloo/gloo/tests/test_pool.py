@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+import OpenGL.GL as gl
+import buffer
+from glstub import GLStub
+from pool import BufferPool
+from buffer import VertexBuffer, IndexBuffer
+
+
+
+# -----------------------------------------------------------------------------
+class BufferPoolTest(unittest.TestCase):
+
+    dtype = np.dtype( [('position', np.float32, 3),
+                       ('color',    np.float32, 4)] )
+
+    def setUp(self):
+        self.gl = buffer.gl
+        buffer.gl = GLStub()
+
+    def tearDown(self):
+        buffer.gl = self.gl
+
+    # Default init
+    # ------------
+    def test_init(self):
+        P = BufferPool(self.dtype, capacity=100)
+        assert isinstance(P.buffer, VertexBuffer)
+        assert P.buffer.size == 100
+        assert P.capacity == 100
+        assert P.used == 0
+        assert P.utilisation == 0
+        assert P.fragmentation == 0
+
+    # Index pool
+    # ----------
+    def test_init_index(self):
+        P = BufferPool(np.uint32, capacity=100,
+                       target=gl.GL_ELEMENT_ARRAY_BUFFER)
+        assert isinstance(P.buffer, IndexBuffer)
+
+    # Allocations are consecutive views
+    # ---------------------------------
+    def test_alloc(self):
+        P = BufferPool(self.dtype, capacity=100)
+        V1 = P.alloc(10)
+        V2 = P.alloc(20)
+        assert V1.base is P.buffer
+        assert P.first(V1) == 0 and V1.size == 10
+        assert P.first(V2) == 10 and V2.size == 20
+        assert V2.gpu_offset == 10*self.dtype.itemsize
+        assert P.used == 30
+        assert P.utilisation == 0.3
+
+    # Writing an allocation writes the backing buffer
+    # -----------------------------------------------
+    def test_alloc_setitem(self):
+        P = BufferPool(self.dtype, capacity=100)
+        V1 = P.alloc(10)
+        V2 = P.alloc(10)
+        V2[...] = np.ones(10, self.dtype)
+        assert P.buffer.data['position'][10:20].sum() == 30
+        assert P.buffer.data['position'][:10].sum() == 0
+
+    # Freed blocks are coalesced
+    # --------------------------
+    def test_free_coalesce(self):
+        P = BufferPool(self.dtype, capacity=100)
+        V1, V2, V3 = P.alloc(10), P.alloc(10), P.alloc(10)
+        P.free(V1)
+        P.free(V3)
+        assert P._starts == [0, 20]
+        assert P._sizes == [10, 80]
+        P.free(V2)
+        assert P._starts == [0]
+        assert P._sizes == [100]
+        assert P.used == 0
+        assert V2._valid == False
+
+    # Freed blocks are reused (first fit)
+    # -----------------------------------
+    def test_free_reuse(self):
+        P = BufferPool(self.dtype, capacity=100)
+        V1, V2 = P.alloc(10), P.alloc(10)
+        P.free(V1)
+        V3 = P.alloc(5)
+        assert P.first(V3) == 0
+
+    # Freeing twice
+    # -------------
+    def test_free_twice(self):
+        P = BufferPool(self.dtype, capacity=100)
+        V = P.alloc(10)
+        P.free(V)
+        with self.assertRaises(ValueError):
+            P.free(V)
+
+    # Fragmentation
+    # -------------
+    def test_fragmentation(self):
+        P = BufferPool(self.dtype, capacity=40)
+        V = [P.alloc(10) for i in range(4)]
+        P.free(V[0])
+        P.free(V[2])
+        assert P.fragmentation == 0.5
+        assert P.stats['free blocks'] == 2
+        assert P.stats['largest free'] == 10
+
+    # Compaction moves data and keeps views valid
+    # -------------------------------------------
+    def test_compact(self):
+        P = BufferPool(self.dtype, capacity=40)
+        V = [P.alloc(10) for i in range(4)]
+        for i in range(4):
+            P.buffer.data['position'][10*i:10*i+10] = i
+        P.free(V[0])
+        P.free(V[2])
+        P.compact()
+        assert P.first(V[1]) == 0 and P.first(V[3]) == 10
+        assert V[1]._data is None and V[3]._data is None
+        assert (P.buffer.data[V[1]._key]['position'] == 1).all()
+        assert (P.buffer.data[V[3]._key]['position'] == 3).all()
+        assert P._starts == [20] and P._sizes == [20]
+        assert P.fragmentation == 0
+        V[3][...] = np.zeros(10, self.dtype)
+        assert P.buffer.data['position'][10:20].sum() == 0
+
+    # Allocation compacts the pool when fragmented
+    # --------------------------------------------
+    def test_alloc_compact(self):
+        P = BufferPool(self.dtype, capacity=40)
+        V = [P.alloc(10) for i in range(4)]
+        P.free(V[0])
+        P.free(V[2])
+        W = P.alloc(20)
+        assert P.capacity == 40
+        assert P.first(W) == 20
+
+    # Allocation grows the pool when full
+    # -----------------------------------
+    def test_alloc_grow(self):
+        P = BufferPool(self.dtype, capacity=40)
+        V = [P.alloc(10) for i in range(4)]
+        P.buffer.data['position'][30:40] = 3
+        W = P.alloc(10)
+        assert P.capacity == 80
+        assert P.first(W) == 40
+        assert V[3]._valid and V[3]._data is None
+        assert (P.buffer.data[V[3]._key]['position'] == 3).all()
+        assert P.buffer.size == 80
+
+    # Non resizeable pool
+    # -------------------
+    def test_alloc_full(self):
+        P = BufferPool(self.dtype, capacity=40, resizeable=False)
+        P.alloc(40)
+        with self.assertRaises(ValueError):
+            P.alloc(1)
+
+    # Allocations share a single GL buffer and uploads are coalesced
+    # --------------------------------------------------------------
+    def test_upload(self):
+        P = BufferPool(self.dtype, capacity=10000)
+        P.buffer.activate()
+        V1, V2 = P.alloc(10), P.alloc(10)
+        buffer.gl.reset()
+        V1[...] = np.ones(10, self.dtype)
+        V2[...] = np.ones(10, self.dtype)
+        P.buffer.activate()
+        assert buffer.gl.count("glGenBuffers") == 0
+        assert buffer.gl.count("glBufferSubData") == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,9 +4,18 @@
 # Distributed under the terms of the new BSD License.
 # -----------------------------------------------------------------------------
 import unittest
+import numpy as np
 import OpenGL.GL as gl
+
+import cache
+import buffer
+import shader
+import program
+import backend
+from glstub import GLStub
+from cache import LinkCache
 from program import Program
-from buffer import VertexBuffer
+from buffer import Buffer, VertexBuffer, IndexBuffer
 from shader import VertexShader, FragmentShader
 
 
@@ -91,6 +100,332 @@ class ProgramTest(unittest.TestCase):
             program["A"] = 1
 
 
+    def test_bind_array(self):
+        vert = VertexShader("attribute vec2 a_position; attribute float a_size;")
+        frag = FragmentShader("")
+        program = Program(vert,frag)
+        data = np.zeros(10, [('a_position', np.float32, 2),
+                             ('a_size',     np.float32, 1)])
+        count = Buffer._copycount
+        program.bind(data)
+        program['a_size'] = 2*np.ones(10, np.float32)
+        assert Buffer._copycount == count
+        assert np.allclose(data['a_size'], 2)
+        assert program['a_position'].base.data is not None
+        assert np.may_share_memory(program['a_position'].base.data, data)
+
+
+
+# -----------------------------------------------------------------------------
+class ProgramStateTest(unittest.TestCase):
+
+    vertex = """
+    uniform float u_scale;
+    uniform vec4  u_color;
+    attribute vec2 a_position;
+    """
+
+    def setUp(self):
+        self.stub = GLStub()
+        self.previous = backend.use(self.stub)
+        shader.cache = program.cache = LinkCache()
+
+    def tearDown(self):
+        backend.use(self.previous)
+        shader.cache = program.cache = cache.cache
+
+    def program(self, vao=False):
+        P = Program(self.vertex, "void main() {}", vao=vao)
+        P.bind(np.zeros(4, [("a_position", np.float32, 2)]))
+        P["u_scale"] = 1
+        P["u_color"] = 1,0,0,1
+        return P
+
+    # Unchanged uniforms are not uploaded again
+    # -----------------------------------------
+    def test_uniform_shadow(self):
+        P = self.program()
+        P.activate()
+        assert self.stub.count("glUniform1fv") == 1
+        assert self.stub.count("glUniform4fv") == 1
+        P["u_scale"] = 1
+        P["u_color"] = 0,1,0,1
+        P.activate()
+        assert self.stub.count("glUniform1fv") == 1
+        assert self.stub.count("glUniform4fv") == 2
+        assert P.stats['uniform uploads'] == 3
+        assert P.stats['uniform skips'] == 1
+
+    # Relinked program uploads uniforms again
+    # ---------------------------------------
+    def test_uniform_relink(self):
+        P = self.program()
+        P.activate()
+        P._need_create = True
+        P.activate()
+        assert self.stub.count("glUniform1fv") == 2
+        assert self.stub.count("glGetUniformLocation") == 4
+
+    # Unchanged attribute pointers are not set again
+    # ----------------------------------------------
+    def test_attribute_shadow(self):
+        P = self.program()
+        P.draw()
+        P.draw()
+        assert self.stub.count("glVertexAttribPointer") == 1
+        assert P.stats['attribute uploads'] == 1
+        assert P.stats['attribute skips'] == 1
+
+    # Programs sharing an attribute location set their own pointer
+    # ------------------------------------------------------------
+    def test_attribute_programs(self):
+        P1, P2 = self.program(), self.program()
+        for i in range(3):
+            P1.draw()
+            P2.draw()
+        assert self.stub.count("glVertexAttribPointer") == 6
+        P2.draw()
+        assert self.stub.count("glVertexAttribPointer") == 6
+
+    # Program is only used once and never unbound
+    # -------------------------------------------
+    def test_use_program(self):
+        P1, P2 = self.program(), self.program()
+        P1.draw()
+        P1.draw()
+        assert self.stub.count("glUseProgram") == 1
+        P2.draw()
+        P1.draw()
+        assert self.stub.count("glUseProgram") == 3
+        assert ("glUseProgram", (0,)) not in self.stub.calls
+        assert ("glBindBuffer", (gl.GL_ARRAY_BUFFER, 0)) not in self.stub.calls
+
+    # Vertex array objects are set up once
+    # ------------------------------------
+    def test_vao(self):
+        P1, P2 = self.program(vao=True), self.program(vao=True)
+        for i in range(3):
+            P1.draw()
+            P2.draw()
+        assert self.stub.count("glGenVertexArrays") == 2
+        assert self.stub.count("glBindVertexArray") == 6
+        assert self.stub.count("glVertexAttribPointer") == 2
+        assert self.stub.count("glEnableVertexAttribArray") == 2
+
+    # Vertex array object is set up again when attributes change
+    # ----------------------------------------------------------
+    def test_vao_setitem(self):
+        P = self.program(vao=True)
+        P.draw()
+        P.bind(np.zeros(4, [("a_position", np.float32, 2)]))
+        P.draw()
+        assert self.stub.count("glVertexAttribPointer") == 2
+        P["a_position"] = np.ones((4,2), np.float32)
+        P.draw()
+        P.draw()
+        assert self.stub.count("glVertexAttribPointer") == 2
+        assert self.stub.count("glBufferSubData") + \
+               self.stub.count("glBufferData") >= 3
+
+    # Vertex array object is set up again when buffer moves or is recreated
+    # ---------------------------------------------------------------------
+    def test_vao_buffer(self):
+        P = Program(self.vertex, "void main() {}")
+        V = buffer.VertexBuffer(np.zeros(4, [("a_position", np.float32, 2)]),
+                                usage='stream', regions=2)
+        P.bind(V)
+        P.draw()
+        V["a_position"] = 1
+        P.draw()
+        assert self.stub.count("glVertexAttribPointer") == 2
+        V._evict()
+        P.draw()
+        assert self.stub.count("glVertexAttribPointer") == 3
+
+    # Programs without vertex array use the default one
+    # -------------------------------------------------
+    def test_vao_fallback(self):
+        P1, P2 = self.program(vao=True), self.program(vao=False)
+        P1.draw()
+        P2.draw()
+        P2.draw()
+        assert ("glBindVertexArray", (0,)) in self.stub.calls
+        assert self.stub.count("glBindVertexArray") == 2
+
+    # No vertex array object if not supported
+    # ---------------------------------------
+    def test_vao_unsupported(self):
+        support, Program._vao_support = Program._vao_support, False
+        try:
+            P = self.program(vao=True)
+            P.draw()
+            assert P._vao is None
+            assert self.stub.count("glGenVertexArrays") == 0
+            assert self.stub.count("glBindVertexArray") == 0
+        finally:
+            Program._vao_support = support
+
+
+
+class ProgramDrawTest(unittest.TestCase):
+
+    vertex = """
+    attribute vec2 a_position;
+    attribute vec2 a_offset;
+    """
+
+    def setUp(self):
+        self.stub = GLStub()
+        self.previous = backend.use(self.stub)
+        shader.cache = program.cache = LinkCache()
+        self.support = Program._instancing_support, Program._multidraw_support
+
+    def tearDown(self):
+        backend.use(self.previous)
+        shader.cache = program.cache = cache.cache
+        Program._instancing_support, Program._multidraw_support = self.support
+
+    def program(self, instances=10, vao=False):
+        P = Program(self.vertex, "void main() {}", vao=vao)
+        P["a_position"] = VertexBuffer(np.arange(8, dtype=np.float32).reshape(4,2))
+        P["a_offset"] = VertexBuffer(np.arange(2*instances, dtype=np.float32)
+                                     .reshape(instances,2), divisor=1)
+        return P
+
+    def calls(self, name):
+        return [args for call, args in self.stub.calls if call == name]
+
+    # Instanced attributes have a divisor
+    # -----------------------------------
+    def test_instances(self):
+        P = self.program()
+        P.draw(gl.GL_TRIANGLE_STRIP, instances=10)
+        assert self.calls("glDrawArraysInstanced") == [(gl.GL_TRIANGLE_STRIP, 0, 4, 10)]
+        assert self.calls("glVertexAttribDivisor") == [(1, 1)]
+        P.draw(gl.GL_TRIANGLE_STRIP, instances=10)
+        assert self.stub.count("glVertexAttribDivisor") == 1
+
+    # Instanced elements
+    # ------------------
+    def test_instances_elements(self):
+        P = self.program()
+        I = IndexBuffer(np.array([0,1,2,1,2,3], np.uint32))
+        P.draw(gl.GL_TRIANGLES, I, instances=10)
+        args = self.calls("glDrawElementsInstanced")
+        assert len(args) == 1
+        assert args[0][1] == 6 and args[0][4] == 10
+
+    # Divisor is reset when location is reused
+    # ----------------------------------------
+    def test_divisor_reset(self):
+        P = self.program()
+        P.draw(gl.GL_TRIANGLE_STRIP, instances=10)
+        P["a_offset"] = VertexBuffer(np.zeros((4,2), np.float32))
+        P.draw(gl.GL_TRIANGLE_STRIP)
+        assert self.calls("glVertexAttribDivisor") == [(1, 1), (1, 0)]
+        assert self.calls("glDrawArrays") == [(gl.GL_TRIANGLE_STRIP, 0, 4)]
+
+    # Divisor change sets vertex array up again
+    # -----------------------------------------
+    def test_divisor_vao(self):
+        P = self.program(vao=True)
+        P.draw(gl.GL_TRIANGLE_STRIP, instances=10)
+        P["a_offset"].divisor = 2
+        P.draw(gl.GL_TRIANGLE_STRIP, instances=20)
+        assert self.calls("glVertexAttribDivisor") == [(1, 1), (1, 2)]
+
+    # Geometry is expanded without instancing support
+    # -----------------------------------------------
+    def test_expanded(self):
+        Program._instancing_support = False
+        P = self.program(instances=3)
+        P.draw(gl.GL_TRIANGLE_STRIP, instances=3)
+        assert self.stub.count("glDrawArraysInstanced") == 0
+        assert self.stub.count("glVertexAttribDivisor") == 0
+        assert self.calls("glDrawArrays") == [(gl.GL_TRIANGLE_STRIP, 0, 12)]
+        position = P._expanded["a_position"].data["f0"]
+        offset = P._expanded["a_offset"].data["f0"]
+        assert np.allclose(position[4:8], position[:4])
+        assert np.allclose(offset[:4], (0,1))
+        assert np.allclose(offset[8:], (4,5))
+        assert P["a_offset"].size == 3
+
+    # Indices are expanded without instancing support
+    # -----------------------------------------------
+    def test_expanded_elements(self):
+        Program._instancing_support = False
+        P = self.program(instances=3)
+        I = IndexBuffer(np.array([0,1,2,1,2,3], np.uint32))
+        P.draw(gl.GL_TRIANGLES, I, instances=3)
+        indices = P._expanded[None].data
+        assert indices.size == 18
+        assert indices[6:12].tolist() == [4,5,6,5,6,7]
+        args = self.calls("glDrawElements")
+        assert len(args) == 1 and args[0][1] == 18
+
+    # First and count
+    # ---------------
+    def test_first_count(self):
+        P = self.program()
+        P.draw(gl.GL_POINTS, first=1, count=2)
+        P.draw(gl.GL_POINTS, first=1)
+        assert self.calls("glDrawArrays") == [(gl.GL_POINTS, 1, 2),
+                                              (gl.GL_POINTS, 1, 3)]
+        with self.assertRaises(ValueError):
+            P.draw(gl.GL_POINTS, first=2, count=3)
+
+    # Ranges are merged and multi-drawn
+    # ---------------------------------
+    def test_ranges(self):
+        Program._multidraw_support = True
+        P = self.program()
+        P.draw(gl.GL_POINTS, ranges=[(0,1), (1,1), (2,0), (3,1)])
+        args = self.calls("glMultiDrawArrays")
+        assert len(args) == 1
+        assert args[0][1].tolist() == [0, 3]
+        assert args[0][2].tolist() == [2, 1]
+        assert self.stub.count("glDrawArrays") == 0
+        P.draw(gl.GL_POINTS, ranges=[(0,2), (2,2)])
+        assert self.calls("glDrawArrays") == [(gl.GL_POINTS, 0, 4)]
+
+    # Ranges are drawn in turn without multi-draw
+    # -------------------------------------------
+    def test_ranges_loop(self):
+        Program._multidraw_support = False
+        P = self.program()
+        P.draw(gl.GL_POINTS, ranges=[(0,1), (2,2)])
+        assert self.calls("glDrawArrays") == [(gl.GL_POINTS, 0, 1),
+                                              (gl.GL_POINTS, 2, 2)]
+
+    # Index views and ranges use byte offsets
+    # ---------------------------------------
+    def test_index_view(self):
+        Program._multidraw_support = True
+        P = self.program()
+        I = IndexBuffer(np.arange(12, dtype=np.uint16) % 4)
+        P.draw(gl.GL_TRIANGLES, I[6:12])
+        args = self.calls("glDrawElements")
+        assert args[0][1:3] == (6, gl.GL_UNSIGNED_SHORT)
+        assert args[0][3].value == 12
+        P.draw(gl.GL_TRIANGLES, I, ranges=[(0,3), (6,3)])
+        args = self.calls("glMultiDrawElements")
+        assert args[0][1].tolist() == [3, 3]
+        assert [offset for offset in args[0][3]] == [None, 12]
+        uploads = [args for args in self.calls("glBufferData")
+                   if args[0] == gl.GL_ELEMENT_ARRAY_BUFFER]
+        assert len(uploads) == 1
+
+    # Ranges are repeated for expanded instances
+    # ------------------------------------------
+    def test_expanded_ranges(self):
+        Program._instancing_support = False
+        Program._multidraw_support = True
+        P = self.program(instances=3)
+        P.draw(gl.GL_POINTS, instances=3, first=1, count=2)
+        args = self.calls("glMultiDrawArrays")
+        assert args[0][1].tolist() == [1, 5, 9]
+        assert args[0][2].tolist() == [2, 2, 2]
+
 
 if __name__ == "__main__":
     unittest.main()
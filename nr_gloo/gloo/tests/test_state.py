@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
+# Distributed under the terms of the new BSD License.
+# -----------------------------------------------------------------------------
+import unittest
+import numpy as np
+import OpenGL.GL as gl
+
+import state
+import buffer
+import texture
+from glstub import GLStub
+from state import State
+from buffer import VertexBuffer, IndexBuffer
+from texture import Texture2D
+
+
+
+# -----------------------------------------------------------------------------
+class StateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = state.gl
+        self.state = State()
+
+    def tearDown(self):
+        state.gl = self.gl
+
+    # Unknown bindings are issued, redundant ones are elided
+    # ------------------------------------------------------
+    def test_bind(self):
+        S = self.state
+        assert S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        assert not S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        assert S.bind_buffer(gl.GL_ELEMENT_ARRAY_BUFFER, 1)
+        assert S.bind_buffer(gl.GL_ARRAY_BUFFER, 2)
+        assert S.use_program(1)
+        assert not S.use_program(1)
+        assert S.stats == {'issued': 4, 'elided': 2, 'deferred': 0}
+
+    # Unbinding is deferred
+    # ---------------------
+    def test_unbind(self):
+        S = self.state
+        S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        assert not S.unbind_buffer(gl.GL_ARRAY_BUFFER)
+        assert not S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        S.use_program(1)
+        assert not S.unuse_program()
+        assert not S.use_program(1)
+        assert S.stats['deferred'] == 2
+
+    # Disabled state issues everything
+    # --------------------------------
+    def test_disabled(self):
+        S = State(enabled=False)
+        assert S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        assert S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        assert S.unbind_buffer(gl.GL_ARRAY_BUFFER)
+        assert S.unuse_program()
+        assert S.stats['elided'] == 0
+
+    # Textures are bound per unit
+    # ---------------------------
+    def test_texture_units(self):
+        S = self.state
+        assert S.bind_texture(gl.GL_TEXTURE_2D, 1)
+        assert S.bind_texture(gl.GL_TEXTURE_2D, 1)
+        assert S.active_texture(0)
+        assert S.bind_texture(gl.GL_TEXTURE_2D, 1)
+        assert not S.bind_texture(gl.GL_TEXTURE_2D, 1)
+        assert S.active_texture(1)
+        assert S.bind_texture(gl.GL_TEXTURE_2D, 1)
+        assert not S.active_texture(1)
+
+    # Deleted objects are unbound
+    # ---------------------------
+    def test_delete(self):
+        S = self.state
+        S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        S.delete_buffers([1])
+        assert S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        S.active_texture(0)
+        S.bind_texture(gl.GL_TEXTURE_2D, 1)
+        S.delete_textures([1])
+        assert S.bind_texture(gl.GL_TEXTURE_2D, 1)
+        S.use_program(1)
+        S.delete_program(1)
+        assert S.use_program(1)
+
+    # Reset forgets everything
+    # ------------------------
+    def test_reset(self):
+        S = self.state
+        S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        S.use_program(1)
+        S.reset()
+        assert S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        assert S.use_program(1)
+
+    # Debug mode validates shadow against GL state
+    # --------------------------------------------
+    def test_debug(self):
+        bindings = { gl.GL_ARRAY_BUFFER_BINDING : 1 }
+        state.gl = GLStub({"glGetIntegerv" : lambda pname: bindings[pname]})
+        S = State(debug=True)
+        S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        assert not S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+        bindings[gl.GL_ARRAY_BUFFER_BINDING] = 2
+        with self.assertRaises(RuntimeError):
+            S.bind_buffer(gl.GL_ARRAY_BUFFER, 1)
+
+
+
+# -----------------------------------------------------------------------------
+class StateObjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = buffer.gl, texture.gl
+        buffer.gl = texture.gl = GLStub()
+
+    def tearDown(self):
+        buffer.gl, texture.gl = self.gl
+
+    # Buffer activation only binds once
+    # ---------------------------------
+    def test_buffer(self):
+        V = VertexBuffer(np.zeros(10, [('a', np.float32, 1)]))
+        for i in range(3):
+            V.activate()
+            V.deactivate()
+        assert buffer.gl.count("glBindBuffer") == 1
+
+    # Buffer of another target does not change binding
+    # ------------------------------------------------
+    def test_buffer_targets(self):
+        V = VertexBuffer(np.zeros(10, [('a', np.float32, 1)]))
+        I = IndexBuffer(np.zeros(10, np.uint32))
+        for i in range(3):
+            V.activate()
+            I.activate()
+        assert buffer.gl.count("glBindBuffer") == 2
+
+    # Deleted buffer is bound again when recreated
+    # --------------------------------------------
+    def test_buffer_delete(self):
+        V = VertexBuffer(np.zeros(10, [('a', np.float32, 1)]))
+        V.activate()
+        V._delete()
+        V._handle = 1
+        V.activate()
+        assert buffer.gl.count("glBindBuffer") == 2
+
+    # Texture activation only binds once
+    # ----------------------------------
+    def test_texture(self):
+        T = Texture2D(np.zeros((4,4), np.uint8))
+        state.state.active_texture(0)
+        for i in range(3):
+            T.activate()
+            T.deactivate()
+        assert texture.gl.count("glBindTexture") == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,10 @@
 import unittest
 import numpy as np
 import OpenGL.GL as gl
+import texture
+from glstub import GLStub
 from texture import Texture, Texture1D, Texture2D
+from texture import merge_rects
 
 
 # ----------------------------------------------------------------- Texture ---
@@ -372,6 +375,277 @@ class Texture2DTest(unittest.TestCase):
         assert T.width == 20
         assert T.height == 10
 
+    # Setting data with store does not copy
+    # ---------------------------------
+    def test_setitem_no_copy(self):
+        data = np.zeros((100,100), dtype=np.uint8)
+        T = Texture2D(data=data)
+        T[10:20,10:20] = 1
+        assert np.may_share_memory(T._pending_data[-1][0], data)
+        assert T._pending_data[-1][1] == (10,10,0)
+
+
+
+# ------------------------------------------------------------- merge_rects ---
+class MergeRectsTest(unittest.TestCase):
+
+    # Disjoint far away rectangles
+    # ---------------------------------
+    def test_disjoint(self):
+        rects = [(0,0,10,10), (50,50,60,60)]
+        assert merge_rects(rects) == rects
+
+    # Adjacent rectangles
+    # ---------------------------------
+    def test_adjacent(self):
+        assert merge_rects([(0,0,10,10), (0,10,10,20)]) == [(0,0,10,20)]
+
+    # Contained rectangles
+    # ---------------------------------
+    def test_contained(self):
+        assert merge_rects([(0,0,10,10), (2,2,5,5)]) == [(0,0,10,10)]
+
+    # Waste
+    # ---------------------------------
+    def test_waste(self):
+        rects = [(0,0,10,10), (0,12,10,22)]
+        assert merge_rects(rects, 19) == rects
+        assert merge_rects(rects, 20) == [(0,0,10,22)]
+
+    # Cascading merges
+    # ---------------------------------
+    def test_cascade(self):
+        rects = [(0,0,1,1), (0,2,1,3), (0,1,1,2)]
+        assert merge_rects(rects) == [(0,0,1,3)]
+
+
+
+# --------------------------------------------------------- Texture2DUpdate ---
+class Texture2DUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = texture.gl
+        texture.gl = GLStub()
+        self.T = Texture2D(data=np.zeros((100,100,4), dtype=np.uint8))
+        self.T.activate()
+        texture.gl.reset()
+
+    def tearDown(self):
+        texture.gl = self.gl
+
+    def uploads(self):
+        return [args for name, args in texture.gl.calls
+                if name == "glTexSubImage2D"]
+
+    # Small far away rectangles are uploaded separately, from storage
+    # ---------------------------------
+    def test_separate(self):
+        T = self.T
+        T[0:10,0:10] = 1
+        T[80:90,80:90] = 2
+        T._update()
+        uploads = self.uploads()
+        assert len(uploads) == 2
+        assert uploads[0][2:6] == (0,0,10,10)
+        assert uploads[1][2:6] == (80,80,10,10)
+        data = uploads[1][-1]
+        assert np.may_share_memory(data, T.data)
+        assert data.size == (9*100+10)*4
+        assert (data[:40] == 2).all()
+        assert ("glPixelStorei", (gl.GL_UNPACK_ROW_LENGTH, 100)) in texture.gl.calls
+        assert texture.gl.calls[-1] == ("glPixelStorei",
+                                        (gl.GL_UNPACK_ROW_LENGTH, 0))
+
+    # Contiguous uploads are read with their own row length
+    # ---------------------------------
+    def test_contiguous_row_length(self):
+        T = self.T
+        T[0:10,0:10] = 1
+        T.set_data(np.ones((2,2,4), np.uint8), offset=(50,50,0))
+        T[80:90,80:90] = 2
+        T._update()
+        length, lengths = 0, []
+        for name, args in texture.gl.calls:
+            if name == "glPixelStorei" and args[0] == gl.GL_UNPACK_ROW_LENGTH:
+                length = args[1]
+            elif name == "glTexSubImage2D":
+                lengths.append((args[2:6], length))
+        assert lengths == [((0,0,10,10), 100),
+                           ((50,50,2,2), 0),
+                           ((80,80,10,10), 100)]
+        assert length == 0
+
+    # Close rectangles are merged
+    # ---------------------------------
+    def test_merged(self):
+        T = self.T
+        for i in range(10):
+            T[i,0:10] = 1
+        T._update()
+        uploads = self.uploads()
+        assert len(uploads) == 1
+        assert uploads[0][2:6] == (0,0,10,10)
+
+    # Large dirty area: single full upload
+    # ---------------------------------
+    def test_full(self):
+        T = self.T
+        T._merge_area = 0
+        for i in range(0, 100, 2):
+            T[i,:] = 1
+        T._update()
+        uploads = self.uploads()
+        assert len(uploads) == 1
+        assert uploads[0][2:6] == (0,0,100,100)
+        assert uploads[0][-1] is T.data
+        assert texture.gl.count("glPixelStorei") == 0
+
+    # Data given without storage is uploaded in order
+    # ---------------------------------
+    def test_no_store(self):
+        T = Texture2D(data=np.zeros((100,100,4), dtype=np.uint8), store=False)
+        T.activate()
+        texture.gl.reset()
+        T[0:10,0:10] = 1
+        T[0:10,10:20] = 2
+        T._update()
+        assert len(self.uploads()) == 2
+        assert texture.gl.count("glPixelStorei") == 0
+
+
+
+# ------------------------------------------------------------ TextureStream ---
+class TextureStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gl = texture.gl
+        texture.gl = GLStub()
+
+    def tearDown(self):
+        texture.gl = self.gl
+
+    def names(self):
+        return [name for name, args in texture.gl.calls]
+
+    # Pixel buffers are created with the texture
+    # ---------------------------------
+    def test_create(self):
+        T = Texture2D(data=np.zeros((10,10,4), dtype=np.uint8), pbos=2)
+        T.activate()
+        assert texture.gl.count("glGenTextures") == 1
+        assert texture.gl.count("glGenBuffers") == 2
+        assert len(set(T._pbos)) == 2
+
+    # Invalid number of pixel buffers
+    # ---------------------------------
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Texture2D(data=np.zeros((10,10,4), dtype=np.uint8), pbos=-1)
+
+    # Upload goes through a pixel buffer and is fenced
+    # ---------------------------------
+    def test_stream(self):
+        T = Texture2D(data=np.zeros((10,10,4), dtype=np.uint8), pbos=2)
+        T.activate()
+        calls = [(name, args) for name, args in texture.gl.calls
+                 if name not in ("glTexParameterf", "glBindTexture",
+                                 "glGenTextures", "glGenBuffers",
+                                 "glTexImage2D")]
+        assert [name for name, args in calls] == [
+            "glBindBuffer", "glBufferData", "glBufferSubData",
+            "glTexSubImage2D", "glBindBuffer", "glFenceSync"]
+        assert calls[0][1] == (gl.GL_PIXEL_UNPACK_BUFFER, T._pbos[0])
+        assert calls[1][1][1] == 400
+        assert calls[3][1][-1].value in (None, 0)
+        assert calls[4][1] == (gl.GL_PIXEL_UNPACK_BUFFER, 0)
+        assert T._fences[0] is not None and T._fences[1] is None
+
+    # Consecutive uploads use the ring
+    # ---------------------------------
+    def test_ring(self):
+        T = Texture2D(data=np.zeros((10,10,4), dtype=np.uint8), pbos=2)
+        T.activate()
+        T[...] = 1
+        T.activate()
+        binds = [args[1] for name, args in texture.gl.calls
+                 if name == "glBindBuffer" and args[1] != 0]
+        assert binds == T._pbos
+        assert texture.gl.count("glClientWaitSync") == 0
+
+    # Pixel buffer is reused once its fence has been signaled
+    # ---------------------------------
+    def test_reuse(self):
+        texture.gl.returns["glClientWaitSync"] = gl.GL_ALREADY_SIGNALED
+        T = Texture2D(data=np.zeros((10,10,4), dtype=np.uint8), pbos=1)
+        T.activate()
+        fence = T._fences[0]
+        texture.gl.reset()
+        T[...] = 1
+        T.activate()
+        names = self.names()
+        assert names.index("glClientWaitSync") < names.index("glDeleteSync")
+        assert names.index("glDeleteSync") < names.index("glBufferData")
+        assert ("glDeleteSync", (fence,)) in texture.gl.calls
+        assert T._fences[0] != fence
+        assert T._busy == 0
+
+    # Busy pixel buffer: synchronous upload from client memory
+    # ---------------------------------
+    def test_busy(self):
+        texture.gl.returns["glClientWaitSync"] = gl.GL_TIMEOUT_EXPIRED
+        T = Texture2D(data=np.zeros((10,10,4), dtype=np.uint8), pbos=1)
+        T.activate()
+        texture.gl.reset()
+        T[...] = 1
+        T.activate()
+        names = self.names()
+        assert "glBufferData" not in names
+        assert texture.gl.count("glTexSubImage2D") == 1
+        upload = [args for name, args in texture.gl.calls
+                  if name == "glTexSubImage2D"][0]
+        assert upload[-1] is T.data
+        assert T._busy == 1
+
+    # Partial uploads are packed into a single pixel buffer
+    # ---------------------------------
+    def test_rects(self):
+        T = Texture2D(data=np.zeros((100,100,4), dtype=np.uint8), pbos=2)
+        T.activate()
+        texture.gl.reset()
+        T[0:10,0:10] = 1
+        T[80:90,80:90] = 2
+        T.activate()
+        uploads = [args for name, args in texture.gl.calls
+                   if name == "glTexSubImage2D"]
+        fills = [args for name, args in texture.gl.calls
+                 if name == "glBufferSubData"]
+        assert texture.gl.count("glBufferData") == 1
+        assert [args[1:3] for args in fills] == [(0, 400), (400, 400)]
+        assert (fills[1][3] == 2).all()
+        assert [args[2:6] for args in uploads] == [(0,0,10,10), (80,80,10,10)]
+        assert [args[-1].value or 0 for args in uploads] == [0, 400]
+        assert texture.gl.count("glPixelStorei") == 0
+
+    # Texture1D streaming
+    # ---------------------------------
+    def test_texture1D(self):
+        T = Texture1D(data=np.zeros((10,3), dtype=np.uint8), pbos=2)
+        T.activate()
+        assert texture.gl.count("glTexSubImage1D") == 1
+        assert texture.gl.count("glFenceSync") == 1
+        # RGB rows of 10 texels are not 4 bytes aligned
+        assert ("glPixelStorei", (gl.GL_UNPACK_ALIGNMENT, 1)) in texture.gl.calls
+
+    # Pixel buffers and fences are deleted with the texture
+    # ---------------------------------
+    def test_delete(self):
+        T = Texture2D(data=np.zeros((10,10,4), dtype=np.uint8), pbos=2)
+        T.activate()
+        T._delete()
+        assert texture.gl.count("glDeleteBuffers") == 1
+        assert texture.gl.count("glDeleteSync") == 1
+        assert T._fences == [None, None]
+
 
 
 # -----------------------------------------------------------------------------
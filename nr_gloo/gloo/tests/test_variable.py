@@ -7,6 +7,10 @@ import unittest
 import numpy as np
 import OpenGL.GL as gl
 
+import buffer
+import variable
+from glstub import GLStub
+from buffer import VertexBuffer
 from variable import Uniform, Variable, Attribute
 
 
@@ -122,6 +126,51 @@ class AttributeTest(unittest.TestCase):
         attribute.set_data(1)
         assert type(attribute.data) is np.ndarray
 
+    def test_stream_pointer(self):
+        class Program(object):
+            handle = 1
+        stub = GLStub({"glGetAttribLocation" : 0})
+        _gl = buffer.gl, variable.gl
+        buffer.gl = variable.gl = stub
+        try:
+            V = VertexBuffer(np.zeros(10, [("A", np.float32, 1)]),
+                             usage="stream", regions=2)
+            attribute = Attribute(Program(), "A", gl.GL_FLOAT)
+            attribute.set_data(V["A"])
+            offsets = []
+            for i in range(3):
+                V["A"] = i
+                attribute.activate()
+                calls = [args for name, args in stub.calls
+                         if name == "glVertexAttribPointer"]
+                offsets.append(calls[-1][-1].value or 0)
+            assert offsets == [0, 40, 0]
+            assert stub.count("glVertexAttribPointer") == 3
+            attribute.activate()
+            assert stub.count("glVertexAttribPointer") == 3
+        finally:
+            buffer.gl, variable.gl = _gl
+
+    def test_evicted_pointer(self):
+        class Program(object):
+            handle = 1
+        stub = GLStub({"glGetAttribLocation" : 0})
+        _gl = buffer.gl, variable.gl
+        buffer.gl = variable.gl = stub
+        try:
+            V = VertexBuffer(np.zeros(10, [("A", np.float32, 1)]))
+            attribute = Attribute(Program(), "A", gl.GL_FLOAT)
+            attribute.set_data(V["A"])
+            attribute.activate()
+            V._evict()
+            attribute.activate()
+            assert stub.count("glVertexAttribPointer") == 2
+            binds = [args for name, args in stub.calls
+                     if name == "glBindBuffer"]
+            assert binds[-1] == (gl.GL_ARRAY_BUFFER, V.handle)
+        finally:
+            buffer.gl, variable.gl = _gl
+
 
 if __name__ == "__main__":
     unittest.main()
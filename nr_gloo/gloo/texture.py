@@ -3,15 +3,71 @@
 # Copyright (c) 2014, Nicolas P. Rougier. All rights reserved.
 # Distributed under the terms of the new BSD License.
 # -----------------------------------------------------------------------------
+import ctypes
 import numpy as np
 import OpenGL.GL as gl
 from operator import mul
 
 from debug import log
+from state import state
+from memory import registry
 from globject import GLObject
 
 
 
+# ------------------------------------------------------------- merge_rects ---
+def merge_rects(rects, waste=0):
+    """
+    Merge rectangles into bounding rectangles whenever this is cheaper.
+
+    Two rectangles are replaced by their bounding rectangle if this latter
+    does not cover more than `waste` texels that are not part of any of them,
+    `waste` being the cost (in texels) of issuing an extra upload.
+
+    Parameters
+    ----------
+
+    rects : list of (y0, x0, y1, x1)
+        Rectangles to be merged
+
+    waste : int
+        Maximum number of extra texels for two rectangles to be merged
+
+    Returns
+    -------
+
+    A list of (y0, x0, y1, x1) rectangles covering the given ones.
+    """
+
+    R = np.array(rects, dtype=np.int64).reshape(-1,4)
+    count = len(R)+1
+    while len(R) < count:
+        count = len(R)
+        i = 0
+        while i < len(R):
+            r, others = R[i], R[i+1:]
+            Y0 = np.minimum(r[0], others[:,0])
+            X0 = np.minimum(r[1], others[:,1])
+            Y1 = np.maximum(r[2], others[:,2])
+            X1 = np.maximum(r[3], others[:,3])
+            box = (Y1-Y0)*(X1-X0)
+            area = (r[2]-r[0])*(r[3]-r[1]) + \
+                   (others[:,2]-others[:,0])*(others[:,3]-others[:,1])
+            inter = np.maximum(np.minimum(r[2], others[:,2]) -
+                               np.maximum(r[0], others[:,0]), 0) * \
+                    np.maximum(np.minimum(r[3], others[:,3]) -
+                               np.maximum(r[1], others[:,1]), 0)
+            k = np.nonzero(box - area + inter <= waste)[0]
+            if len(k):
+                k = k[0]
+                R[i] = Y0[k], X0[k], Y1[k], X1[k]
+                R = np.delete(R, i+1+k, axis=0)
+            else:
+                i += 1
+    return [tuple(r) for r in R.tolist()]
+
+
+
 # ----------------------------------------------------------- Texture class ---
 class Texture(GLObject):
     """
@@ -39,7 +95,8 @@ class Texture(GLObject):
 
 
     def __init__(self, data=None, shape=(), dtype=None, base=None, target=None,
-                       offset=None, store=True, copy=False, resizeable=True):
+                       offset=None, store=True, copy=False, resizeable=True,
+                       pbos=0):
         """
         Initialize the texture
 
@@ -72,6 +129,10 @@ class Texture(GLObject):
 
         resizeable : boolean
             Indicates whether texture can be resized
+
+        pbos : int
+            Number of pixel buffers used to stream uploads (0 means uploads
+            are made synchronously from client memory)
         """
 
         GLObject.__init__(self)
@@ -88,6 +149,26 @@ class Texture(GLObject):
         self._valid = True
         self._views = []
 
+        # Dirty fraction above which pending rectangles (from CPU storage)
+        # are uploaded at once instead of using several glTexSubImage
+        self._full_upload = 0.5
+
+        # Cost (texels) of an extra upload: two dirty rectangles are uploaded
+        # as their bounding rectangle when it adds fewer (unchanged) texels.
+        self._merge_area = 1024
+
+        # Ring of pixel unpack buffers (streaming), a fence tells when the
+        # GPU is done with a buffer such that it can be filled again
+        if pbos < 0:
+            raise ValueError("Invalid number of pixel buffers for texture")
+        self._pbos = [0]*pbos
+        self._fences = [None]*pbos
+        self._pbo = pbos-1
+        self._busy = 0
+
+        # Internal format (None means same as format)
+        self._internalformat = None
+
         self._interpolation = gl.GL_NEAREST, gl.GL_NEAREST
         self._wrapping = gl.GL_CLAMP_TO_EDGE
         self._need_parameterization = True
@@ -150,6 +231,13 @@ class Texture(GLObject):
         return self._dtype
 
 
+    @property
+    def nbytes(self):
+        """ Texture size in bytes """
+
+        return reduce(mul, self.shape)*np.dtype(self.dtype).itemsize
+
+
     @property
     def base(self):
         """ Texture base if this texture is a view on another texture """
@@ -302,17 +390,42 @@ class Texture(GLObject):
             if offset[i]+data.shape[i] > self.shape[i]:
                 raise ValueError("Data is too large")
 
-        # Make sure data is contiguous
-        if not data.flags["C_CONTIGUOUS"]:
-            data = np.array(data,copy=True)
-        else:
-            data = np.array(data,copy=copy)
+        # Data from CPU storage is uploaded from the storage itself (at update
+        # time), otherwise make sure data is contiguous
+        if copy or self._storage_offset(data) != tuple(offset):
+            if not data.flags["C_CONTIGUOUS"]:
+                data = np.array(data,copy=True)
+            else:
+                data = np.array(data,copy=copy)
 
         self._pending_data.append( (data, offset) )
         self._need_update = True
 
 
 
+    def _storage_offset(self, data):
+        """ Offset of data in CPU storage (None if not part of storage) """
+
+        storage = self._data
+        if (storage is None or not isinstance(data, np.ndarray)
+            or data.dtype != storage.dtype or data.ndim != storage.ndim
+            or data.size == 0):
+            return None
+        for i in range(data.ndim):
+            if data.shape[i] > 1 and data.strides[i] != storage.strides[i]:
+                return None
+        delta = (data.__array_interface__['data'][0] -
+                 storage.__array_interface__['data'][0])
+        if delta < 0 or delta >= storage.nbytes or delta % storage.itemsize:
+            return None
+        offset = np.unravel_index(delta // storage.itemsize, storage.shape)
+        for i in range(data.ndim):
+            if offset[i] + data.shape[i] > storage.shape[i]:
+                return None
+        return tuple([int(i) for i in offset])
+
+
+
     def __getitem__(self, key):
         """ x.__getitem__(y) <==> x[y] """
 
@@ -361,7 +474,7 @@ class Texture(GLObject):
         shape = tuple([s.stop-s.start for s in slices])
         data = None
         if self.data is not None:
-            data = self.data[slices]
+            data = self.data[tuple(slices)]
 
         T = self.__class__(dtype=self.dtype, shape=shape,
                            base=self, offset=offset, resizeable=False)
@@ -418,10 +531,10 @@ class Texture(GLObject):
         shape = tuple([s.stop-s.start for s in slices])
         size = reduce(mul,shape)
 
-        # We have CPU storage
+        # We have CPU storage: modified part is uploaded from storage
         if self.data is not None:
             self.data[key] = data
-            data = self.data[key]
+            data = self.data[tuple(slices)]
         else:
             # Make sure data is an array
             if not isinstance(data,np.ndarray):
@@ -434,10 +547,70 @@ class Texture(GLObject):
         if self.base is None:
             self.set_data(data=data, offset=offset, copy=False)
         else:
-            offset = self.offset + offset
+            offset = tuple([a+b for a,b in zip(self.offset, offset)])
             self.base.set_data(data=data, offset=offset, copy=False)
 
 
+    def _upload(self, uploads):
+        """ Upload a list of (offset, data) to the texture """
+
+        if self._pbos and self._stream(uploads):
+            return
+        for offset, data in uploads:
+            self._sub_image(offset, data.shape, data)
+
+
+    def _stream(self, uploads):
+        """
+        Upload a list of (offset, data) through the next pixel buffer of the
+        ring. The buffer is only used if the GPU is done with it (fence has
+        been signaled), otherwise nothing is done and False is returned.
+        """
+
+        index = (self._pbo + 1) % len(self._pbos)
+        fence = self._fences[index]
+        if fence is not None:
+            status = gl.glClientWaitSync(fence, 0, 0)
+            if status not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+                log("GPU: Pixel buffer busy, uploading from client memory")
+                self._busy += 1
+                return False
+            gl.glDeleteSync(fence)
+            self._fences[index] = None
+        self._pbo = index
+
+        # Data is packed in the pixel buffer (orphaned first)
+        log("GPU: Streaming texture (%d upload(s))" % len(uploads))
+        offsets, nbytes = [], 0
+        datas = [np.ascontiguousarray(data) for offset, data in uploads]
+        for data in datas:
+            offsets.append(nbytes)
+            nbytes += (data.nbytes + 15) & ~15
+        target = gl.GL_PIXEL_UNPACK_BUFFER
+        if state.bind_buffer(target, self._pbos[index]):
+            gl.glBindBuffer(target, self._pbos[index])
+        gl.glBufferData(target, nbytes, None, gl.GL_STREAM_DRAW)
+        for data, offset in zip(datas, offsets):
+            gl.glBufferSubData(target, offset, data.nbytes, data)
+
+        # Texture is updated from the pixel buffer (asynchronous)
+        pitch = self.shape[-1]*np.dtype(self.dtype).itemsize
+        aligned = all([(data.shape[1 if data.ndim > 2 else 0]*pitch) % 4 == 0
+                       for data in datas])
+        if not aligned:
+            gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        for (offset, data), pointer in zip(uploads, offsets):
+            self._sub_image(offset, data.shape, ctypes.c_void_p(pointer))
+        if not aligned:
+            gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+        # Client memory uploads need the unpack buffer to be unbound
+        if state.bind_buffer(target, 0):
+            gl.glBindBuffer(target, 0)
+        if gl.glFenceSync:
+            self._fences[index] = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        return True
+
+
     def _parameterize(self):
         """ Paramaterize texture """
 
@@ -459,7 +632,7 @@ class Texture(GLObject):
                 wrap_t = self._wrapping
             gl.glTexParameterf(self._target, gl.GL_TEXTURE_WRAP_S, wrap_s)
             gl.glTexParameterf(self._target, gl.GL_TEXTURE_WRAP_T, wrap_t)
-        self._need_parameterization = True
+        self._need_parameterization = False
 
 
     def _create(self):
@@ -467,6 +640,8 @@ class Texture(GLObject):
 
         log("GPU: Creating texture")
         self._handle = gl.glGenTextures(1)
+        for i in range(len(self._pbos)):
+            self._pbos[i] = gl.glGenBuffers(1)
 
 
     def _delete(self):
@@ -474,13 +649,23 @@ class Texture(GLObject):
 
         log("GPU: Deleting texture")
         gl.glDeleteTextures([self._handle])
+        state.delete_textures([self._handle])
+        registry.release(self)
+        if self._pbos:
+            gl.glDeleteBuffers(len(self._pbos), self._pbos)
+            state.delete_buffers(self._pbos)
+        for i, fence in enumerate(self._fences):
+            if fence is not None:
+                gl.glDeleteSync(fence)
+            self._fences[i] = None
 
 
     def _activate(self):
         """ Activate texture on GPU """
 
         log("GPU: Activate texture")
-        gl.glBindTexture(self.target, self._handle)
+        if state.bind_texture(self.target, self._handle):
+            gl.glBindTexture(self.target, self._handle)
         if self._need_parameterization:
             self._parameterize()
 
@@ -489,7 +674,8 @@ class Texture(GLObject):
         """ Deactivate texture on GPU """
 
         log("GPU: Deactivate texture")
-        gl.glBindTexture(self._target, 0)
+        if state.unbind_texture(self._target):
+            gl.glBindTexture(self._target, 0)
 
 
 # --------------------------------------------------------- Texture1D class ---
@@ -497,7 +683,7 @@ class Texture1D(Texture):
     """ """
 
     def __init__(self, data=None, shape=None, dtype=None,
-                       store=True, copy=False, *args, **kwargs):
+                       store=True, copy=False, pbos=0, *args, **kwargs):
         """
         Initialize the texture.
 
@@ -518,6 +704,9 @@ class Texture1D(Texture):
 
         copy : boolean
            Indicate whether to use given data as CPU storage
+
+        pbos : int
+            Number of pixel buffers used to stream uploads
         """
 
         # We don't want these parameters to be seen from outside (because they
@@ -545,7 +734,8 @@ class Texture1D(Texture):
                 raise ValueError("Too many channels for texture")
 
         Texture.__init__(self, data=data, shape=shape, dtype=dtype, base=base,
-                         store=store, copy=copy, target=gl.GL_TEXTURE_1D, offset=offset)
+                         store=store, copy=copy, target=gl.GL_TEXTURE_1D, offset=offset,
+                         pbos=pbos)
 
         self._format = Texture._formats.get(self.shape[-1], None)
         if self._format is None:
@@ -563,7 +753,9 @@ class Texture1D(Texture):
         """ Texture resize on GPU """
 
         log("GPU: Resizing texture(%s)"% (self.width))
-        gl.glTexImage1D(self.target, 0, self._format, self.width,
+        registry.allocate(self, self.nbytes)
+        gl.glTexImage1D(self.target, 0, self._internalformat or self._format,
+                        self.width,
                         0, self._format, self._gtype, None)
 
 
@@ -579,15 +771,15 @@ class Texture1D(Texture):
             self._need_resize = False
         log("GPU: Updating texture (%d pending operation(s))" % len(self._pending_data))
 
-        while self._pending_data:
-            data, offset = self._pending_data.pop(0)
-            if offset is None:
-                x = 0
-            else:
-                x = offset[0]
-            width = data.shape[0]
-            gl.glTexSubImage1D(self.target, 0, x,
-                               width, self._format, self._gtype, data)
+        pending, self._pending_data = self._pending_data, []
+        self._upload([(offset or (0,), data) for data, offset in pending])
+
+
+    def _sub_image(self, offset, shape, data):
+        """ Upload data (array or pixel buffer offset) at given offset """
+
+        gl.glTexSubImage1D(self.target, 0, offset[0], shape[0],
+                           self._format, self._gtype, data)
 
 
 
@@ -596,7 +788,7 @@ class Texture2D(Texture):
     """ """
 
     def __init__(self, data=None, shape=None, dtype=None,
-                       store=True, copy=False, *args, **kwargs):
+                       store=True, copy=False, pbos=0, *args, **kwargs):
         """
         Initialize the texture.
 
@@ -617,6 +809,9 @@ class Texture2D(Texture):
 
         copy : boolean
            Indicate whether to use given data as CPU storage
+
+        pbos : int
+            Number of pixel buffers used to stream uploads
         """
 
         # We don't want these parameters to be seen from outside (because they
@@ -644,7 +839,8 @@ class Texture2D(Texture):
                 raise ValueError("Too many channels for texture")
 
         Texture.__init__(self, data=data, shape=shape, dtype=dtype, base=base,
-                         store=store, copy=copy, target=gl.GL_TEXTURE_2D, offset=offset)
+                         store=store, copy=copy, target=gl.GL_TEXTURE_2D, offset=offset,
+                         pbos=pbos)
 
         self._format = Texture._formats.get(self.shape[-1], None)
         if self._format is None:
@@ -669,7 +865,9 @@ class Texture2D(Texture):
         """ Texture resize on GPU """
 
         log("GPU: Resizing texture(%sx%s)"% (self.width,self.height))
-        gl.glTexImage2D(self.target, 0, self._format, self.width, self.height,
+        registry.allocate(self, self.nbytes)
+        gl.glTexImage2D(self.target, 0, self._internalformat or self._format,
+                        self.width, self.height,
                         0, self._format, self._gtype, None)
 
 
@@ -685,11 +883,83 @@ class Texture2D(Texture):
             self._need_resize = False
         log("GPU: Updating texture (%d pending operation(s))" % len(self._pending_data))
 
-        while self._pending_data:
-            data, offset = self._pending_data.pop(0)
-            x, y = 0,0
+        # Consecutive writes to CPU storage are gathered as dirty rectangles
+        # while other writes are uploaded in order
+        pending, self._pending_data = self._pending_data, []
+        uploads, rects = [], []
+        for data, offset in pending:
+            y, x = 0, 0
             if offset is not None:
-                y,x = offset[0], offset[1]
-            width, height = data.shape[1],data.shape[0]
-            gl.glTexSubImage2D(self.target, 0, x, y,
-                               width, height, self._format, self._gtype, data)
+                y, x = offset[0], offset[1]
+            height, width = data.shape[0], data.shape[1]
+            if self._storage_offset(data) == (y, x, 0):
+                rects.append((y, x, y+height, x+width))
+                continue
+            uploads.extend(self._update_rects(rects))
+            uploads.append(((y, x), data))
+            rects = []
+        uploads.extend(self._update_rects(rects))
+        self._upload(uploads)
+
+
+    def _update_rects(self, rects):
+        """ Uploads (offset, data) of dirty rectangles of CPU storage """
+
+        if not rects:
+            return []
+
+        # Full upload if dirty area (before and after merge) is large enough
+        height, width = self.height, self.width
+        full = self._full_upload*width*height
+        area = sum([(y1-y0)*(x1-x0) for y0, x0, y1, x1 in rects])
+        if area < full:
+            rects = merge_rects(rects, self._merge_area)
+            area = sum([(y1-y0)*(x1-x0) for y0, x0, y1, x1 in rects])
+        if area >= full:
+            return [((0, 0), self._data)]
+        return [((y0, x0), self._data[y0:y1, x0:x1])
+                for y0, x0, y1, x1 in rects]
+
+
+    def _upload(self, uploads):
+        """ Upload a list of (offset, data) to the texture """
+
+        if self._pbos and self._stream(uploads):
+            return
+
+        # Rectangles of CPU storage are read in place, GL skipping the rest
+        # of the row (no copy). Row length is only set around these uploads
+        # since other (contiguous) data is read with its own row pitch.
+        width, channels = self.width, self.shape[-1]
+        pitch = width*channels*np.dtype(self.dtype).itemsize
+        unpack = False
+        for offset, data in uploads:
+            strided = not data.flags["C_CONTIGUOUS"]
+            if strided != unpack:
+                self._unpack_rows(width if strided else 0, pitch)
+                unpack = strided
+            if strided:
+                y, x = offset
+                start = (y*width + x)*channels
+                stop = start + ((data.shape[0]-1)*width + data.shape[1])*channels
+                storage = self._data.reshape(-1)
+                self._sub_image(offset, data.shape, storage[start:stop])
+            else:
+                self._sub_image(offset, data.shape, data)
+        if unpack:
+            self._unpack_rows(0, pitch)
+
+
+    def _unpack_rows(self, length, pitch):
+        """ Set (or reset if length is 0) unpack row length of storage """
+
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, length)
+        if pitch % 4:
+            gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1 if length else 4)
+
+
+    def _sub_image(self, offset, shape, data):
+        """ Upload data (array or pixel buffer offset) at given offset """
+
+        gl.glTexSubImage2D(self.target, 0, offset[1], offset[0], shape[1],
+                           shape[0], self._format, self._gtype, data)
@@ -8,8 +8,9 @@ import numpy as np
 import OpenGL.GL as gl
 
 from debug import log
+from state import state
 from globject import GLObject
-from buffer import VertexBuffer
+from buffer import VertexBuffer, array
 from texture import Texture1D, Texture2D
 
 
@@ -73,6 +74,10 @@ class Variable(GLObject):
         # Whether this variable is active
         self._active = True
 
+        # Number of GL uploads issued and skipped (unchanged state)
+        self._uploads = 0
+        self._skips = 0
+
 
     @property
     def name(self):
@@ -125,18 +130,19 @@ class Variable(GLObject):
 class Uniform(Variable):
     """ A Uniform represents a program uniform variable. """
 
+    # GL functions (looked up when called such that gl can be replaced)
     _ufunctions = {
-        gl.GL_FLOAT:        gl.glUniform1fv,
-        gl.GL_FLOAT_VEC2:   gl.glUniform2fv,
-        gl.GL_FLOAT_VEC3:   gl.glUniform3fv,
-        gl.GL_FLOAT_VEC4:   gl.glUniform4fv,
-        gl.GL_INT:          gl.glUniform1iv,
-        gl.GL_BOOL:         gl.glUniform1iv,
-        gl.GL_FLOAT_MAT2:   gl.glUniformMatrix2fv,
-        gl.GL_FLOAT_MAT3:   gl.glUniformMatrix3fv,
-        gl.GL_FLOAT_MAT4:   gl.glUniformMatrix4fv,
-        gl.GL_SAMPLER_1D:   gl.glUniform1i,
-        gl.GL_SAMPLER_2D:   gl.glUniform1i,
+        gl.GL_FLOAT:        'glUniform1fv',
+        gl.GL_FLOAT_VEC2:   'glUniform2fv',
+        gl.GL_FLOAT_VEC3:   'glUniform3fv',
+        gl.GL_FLOAT_VEC4:   'glUniform4fv',
+        gl.GL_INT:          'glUniform1iv',
+        gl.GL_BOOL:         'glUniform1iv',
+        gl.GL_FLOAT_MAT2:   'glUniformMatrix2fv',
+        gl.GL_FLOAT_MAT3:   'glUniformMatrix3fv',
+        gl.GL_FLOAT_MAT4:   'glUniformMatrix4fv',
+        gl.GL_SAMPLER_1D:   'glUniform1i',
+        gl.GL_SAMPLER_2D:   'glUniform1i',
     }
 
 
@@ -149,6 +155,9 @@ class Uniform(Variable):
         self._ufunction = Uniform._ufunctions[self._gtype]
         self._unit = -1
 
+        # Last uploaded value (bytes)
+        self._shadow = None
+
 
     def set_data(self, data):
         """ Set data (no upload) """
@@ -190,7 +199,8 @@ class Uniform(Variable):
         if self._gtype in (gl.GL_SAMPLER_1D, gl.GL_SAMPLER_2D):
             if self.data is not None:
                 log("GPU: Active texture is %d" % self._unit)
-                gl.glActiveTexture(gl.GL_TEXTURE0 + self._unit)
+                if state.active_texture(self._unit):
+                    gl.glActiveTexture(gl.GL_TEXTURE0 + self._unit)
                 self.data.activate()
 
     def _update(self):
@@ -205,11 +215,22 @@ class Uniform(Variable):
         #           every machine, we can expect nasty bugs from this early
         #           return
 
+        # Skip upload if value is unchanged
+        if self._gtype in (gl.GL_SAMPLER_1D, gl.GL_SAMPLER_2D):
+            shadow = self._unit
+        else:
+            shadow = self._data.tostring()
+        if shadow == self._shadow:
+            self._skips += 1
+            return
+        self._shadow = shadow
+        self._uploads += 1
+
         # Matrices (need a transpose argument)
         if self._gtype in (gl.GL_FLOAT_MAT2, gl.GL_FLOAT_MAT3, gl.GL_FLOAT_MAT4):
             # OpenGL ES 2.0 does not support transpose
             transpose = False
-            self._ufunction(self._handle, 1, transpose, self._data)
+            getattr(gl, self._ufunction)(self._handle, 1, transpose, self._data)
 
         # Textures (need to get texture count)
         elif self._gtype in (gl.GL_SAMPLER_1D, gl.GL_SAMPLER_2D):
@@ -221,13 +242,14 @@ class Uniform(Variable):
 
         # Regular uniform
         else:
-            self._ufunction(self._handle, 1, self._data)
+            getattr(gl, self._ufunction)(self._handle, 1, self._data)
 
 
     def _create(self):
         """ Create uniform on GPU (get handle) """
 
         self._handle = gl.glGetUniformLocation(self._program.handle, self._name)
+        self._shadow = None
 
 
 
@@ -237,10 +259,10 @@ class Attribute(Variable):
     """ An Attribute represents a program attribute variable """
 
     _afunctions = {
-        gl.GL_FLOAT:      gl.glVertexAttrib1f,
-        gl.GL_FLOAT_VEC2: gl.glVertexAttrib2f,
-        gl.GL_FLOAT_VEC3: gl.glVertexAttrib3f,
-        gl.GL_FLOAT_VEC4: gl.glVertexAttrib4f
+        gl.GL_FLOAT:      'glVertexAttrib1f',
+        gl.GL_FLOAT_VEC2: 'glVertexAttrib2f',
+        gl.GL_FLOAT_VEC3: 'glVertexAttrib3f',
+        gl.GL_FLOAT_VEC4: 'glVertexAttrib4f'
     }
 
     def __init__(self, program, name, gtype):
@@ -271,6 +293,10 @@ class Attribute(Variable):
             self._afunction = Attribute._afunctions[self._gtype]
             return
 
+        # A (new) VertexBuffer replaces current one
+        elif isinstance(data, VertexBuffer):
+            self._data = data
+
         # If we already have a VertexBuffer
         elif isinstance(self._data, VertexBuffer):
             self._data[...] = data
@@ -279,20 +305,71 @@ class Attribute(Variable):
         # upload it later to GPU memory.
         elif not isinstance(data, VertexBuffer):
             name,base,count = self.dtype
-            data = np.array(data,dtype=base,copy=False)
-            data = data.ravel().view([self.dtype])
+            data = array(data,dtype=base,copy=False)
+            if not data.flags["C_CONTIGUOUS"]:
+                data = array(data,copy=True)
+            data = data.reshape(-1).view([self.dtype])
             # WARNING : transform data with the right type
             # data = np.array(data,copy=False)
             self._data = VertexBuffer(data)
-        else:
-            self._data = data
         self._generic = False
 
 
     def _activate(self):
+        if self._handle < 0:
+            return
+
+        # Generic value may have been replaced (by another program)
+        if self._generic:
+            if state.disable_attribute(self._handle):
+                gl.glDisableVertexAttribArray(self._handle)
+            if state.vertex_value(self._handle, self._pointer()):
+                self._need_update = True
+            return
+
         if isinstance(self.data,VertexBuffer):
             self.data.activate()
 
+            # Skip pointer setup if the context already points to the same
+            # data (data may have moved within buffer (stream buffer), buffer
+            # may have been recreated (eviction) or location may have been
+            # used by another program)
+            if not state.vertex_attribute(self._handle, self._pointer()):
+                self._skips += 1
+                return
+            self._uploads += 1
+
+            # Get relevant information from gl_typeinfo
+            size, gtype, dtype = gl_typeinfo[self._gtype]
+            stride = self.data.stride
+
+            # Make offset a pointer, or it will be interpreted as a small array
+            offset = ctypes.c_void_p(self.data.gpu_offset)
+
+            if state.enable_attribute(self.handle):
+                gl.glEnableVertexAttribArray(self.handle)
+            if state.bind_buffer(gl.GL_ARRAY_BUFFER, self.data.handle):
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.data.handle)
+            gl.glVertexAttribPointer(self.handle, size, gtype,  gl.GL_FALSE, stride, offset)
+
+            # Instanced attribute (GL default divisor being 0, it is only
+            # issued for instanced attributes and when resetting them)
+            divisor = self.data.divisor
+            if (state.vertex_divisor(self.handle, divisor) and
+                (divisor or gl.glVertexAttribDivisor)):
+                gl.glVertexAttribDivisor(self.handle, divisor)
+
+
+    def _pointer(self):
+        """ Vertex attribute state required by this attribute """
+
+        if self._generic:
+            return tuple(self._data.ravel())
+        base = self.data if self.data.base is None else self.data.base
+        return (base._id, base._generation, self.data.gpu_offset,
+                self.data.stride, self._gtype, self.data.divisor)
+
+
     def _update(self):
         """ Actual upload of data to GPU memory  """
 
@@ -301,8 +378,7 @@ class Attribute(Variable):
         # Generic vertex attribute (all vertices receive the same value)
         if self._generic:
             if self._handle >= 0:
-                gl.glDisableVertexAttribArray(self._handle)
-                self._afunction(self._handle, *self._data)
+                getattr(gl, self._afunction)(self._handle, *self._data)
 
         # Direct upload
         #elif isinstance(self._data, ClientVertexBuffer):
@@ -325,22 +401,6 @@ class Attribute(Variable):
             # Apply (first disable any previous VertexBuffer)
             #gl.glVertexAttribPointer(self._loc, size, gtype, False, stride, data)
 
-        # Regular vertex buffer
-        elif self._handle >= 0:
-            if self._need_update:
-                self.data.update()
-
-            # Get relevant information from gl_typeinfo
-            size, gtype, dtype = gl_typeinfo[self._gtype]
-            stride = self.data.stride
-
-            # Make offset a pointer, or it will be interpreted as a small array
-            offset = ctypes.c_void_p(self.data.offset)
-
-            gl.glEnableVertexAttribArray(self.handle)
-            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.data.handle)
-            gl.glVertexAttribPointer(self.handle, size, gtype,  gl.GL_FALSE, stride, offset)
-
 
     def _create(self):
         """ Create attribute on GPU (get handle) """
@@ -4,10 +4,17 @@
 # Copyright (c) 2014, Nicolas P. Rougier
 # Distributed under the (new) BSD License. See LICENSE.txt for more info.
 # -----------------------------------------------------------------------------
+import os
 import re
+import sys
 import numpy as np
 import OpenGL.GL as gl
 
+# Declarations are parsed by the gloo GLSL parser (cached)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'nr_gloo', 'gloo'))
+import glsl
+
 
 def remove_comments(code):
     """ Remove C-style comment from GLSL code string """
@@ -74,64 +81,48 @@ def get_declarations(code, qualifier = ""):
                     variables.append((iname, vtype))
     return variables
 
+def _expand(declarations):
+    """ Expand (name, type, size) declarations into (name[i], type) items """
+
+    for name, vtype, size in declarations:
+        if size == 0:
+            raise RuntimeError("Size of a variable array cannot be zero")
+    return glsl.expand(declarations)
+
 def get_hooks(code):
-    hooks = []
-    re_hooks = re.compile("\<(?P<hook>\w+)\>", re.VERBOSE)
-    for match in re.finditer(re_hooks, code):
-        hooks.append(match.group('hook'))
-    return hooks
+    return list(glsl.parse(code)['hooks'])
 
 def get_args(code):
     return get_declarations(code, qualifier = "")
 
 def get_externs(code):
-    return get_declarations(code, qualifier = "extern")
+    return _expand(glsl.parse(code)['externs'])
 
 def get_consts(code):
-    return get_declarations(code, qualifier = "const")
+    return _expand(glsl.parse(code)['consts'])
 
 def get_uniforms(code):
-    return get_declarations(code, qualifier = "uniform")
+    return _expand(glsl.parse(code)['uniforms'])
 
 def get_attributes(code):
-    return get_declarations(code, qualifier = "attribute")
+    return _expand(glsl.parse(code)['attributes'])
 
 def get_varyings(code):
-    return get_declarations(code, qualifier = "varying")
+    return _expand(glsl.parse(code)['varyings'])
 
 def get_functions(code):
-    functions = []
-    regex = re.compile("""
-                       \s*(?P<type>\w+)    # Function return type
-                       \s+(?P<name>[\w]+)   # Function name
-                       \s*\((?P<args>.*?)\) # Function arguments
-                       \s*\{(?P<code>.*?)\} # Function content
-                       """, re.VERBOSE | re.DOTALL)
-
-    for match in re.finditer(regex, code):
-        rtype = match.group('type')
-        name = match.group('name')
-        args = match.group('args')
-        fcode = match.group('code')
-        functions.append( (rtype, name, args, fcode) )
-
-    return functions
+    return list(glsl.parse(code)['functions'])
 
 def parse(code):
-    if code:
-        code = remove_comments(code)
-    externs   = get_externs(code) if code else []
-    consts    = get_consts(code) if code else []
-    uniforms  = get_uniforms(code) if code else []
-    attributes= get_attributes(code) if code else []
-    varyings  = get_varyings(code) if code else []
-    hooks     = get_hooks(code) if code else []
-    functions = get_functions(code) if code else []
-
-    return { 'externs'   : externs,   'consts'    : consts,
-             'uniforms'  : uniforms,  'attributes': attributes,
-             'varyings'  : varyings,  'hooks'     : hooks,
-             'functions' : functions }
+    declarations = glsl.parse(code)
+
+    return { 'externs'   : _expand(declarations['externs']),
+             'consts'    : _expand(declarations['consts']),
+             'uniforms'  : _expand(declarations['uniforms']),
+             'attributes': _expand(declarations['attributes']),
+             'varyings'  : _expand(declarations['varyings']),
+             'hooks'     : list(declarations['hooks']),
+             'functions' : list(declarations['functions']) }
 
 
 # -----------------------------------------------------------------------------